@@ -1,2 +1,7 @@
 from lineus.lineus import LineUs
+from lineus.async_lineus import AsyncLineUs
+from lineus.cache import CompileCache, DiscoveryCache, SlotManifest
 from lineus.diagnostics import Diagnostics
+from lineus.pool import LineUsPool
+
+__version__ = '1.0.2'
@@ -0,0 +1,213 @@
+import asyncio
+import time
+import statistics
+from lineus.lineus import LineUs
+
+
+class AsyncLineUs:
+    """
+    An asyncio version of the LineUs class. It speaks the same TCP API but every call that talks to Line-us is a
+    coroutine, so many Line-us machines can be controlled from one event loop without a thread per connection.
+    ``AsyncLineUs`` does not search for machines itself, so use the name or ip address of your Line-us (or an
+    entry from ``LineUs.get_line_us_list()``) to connect::
+
+        >>> my_line_us = AsyncLineUs()
+        >>> await my_line_us.connect('line-us.local')
+        >>> await my_line_us.g01(1000, 0, 1000)
+
+    Each call takes an optional ``timeout`` in seconds. If a call times out or is cancelled while waiting for a
+    reply, the late reply is discarded before the next command is sent so replies stay matched to commands.
+    """
+
+    _default_port = 1337
+    _default_connect_timeout = 5
+
+    def __init__(self):
+        self._reader = None
+        self._writer = None
+        self._connected = False
+        self._hello_message = None
+        self._lock = None
+        self._pending_replies = 0
+        self.line_us_name = None
+        self.timeout = None
+
+    async def connect(self, line_us_name, timeout=None):
+        """
+        Connect to a Line-us using its name, ip address or an entry from ``LineUs.get_line_us_list()``. The
+        ``timeout`` is used for the TCP connection and the hello message, and defaults to 5 seconds::
+
+            >>> await my_line_us.connect('line-us.local')
+
+        Returns ``True`` if the connection was successful.
+        """
+        if self._writer is not None:
+            await self.disconnect()
+        line_us_port = self._default_port
+        if isinstance(line_us_name, (list, tuple)):
+            line_us_ip = line_us_name[2]
+            if len(line_us_name) > 3:
+                line_us_port = line_us_name[3]
+            line_us_name = line_us_name[0]
+        else:
+            line_us_ip = line_us_name
+        if timeout is None:
+            timeout = self._default_connect_timeout
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(line_us_ip, line_us_port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        self._lock = asyncio.Lock()
+        self._pending_replies = 1
+        self._connected = True
+        self.line_us_name = line_us_name
+        try:
+            self._hello_message = await self._read_response(timeout)
+        except (OSError, asyncio.TimeoutError):
+            await self.disconnect()
+            return False
+        return True
+
+    def set_timeout(self, timeout):
+        """
+        Set the default timeout in seconds for calls that wait for a reply from Line-us. ``None`` waits forever.
+
+        Returns ``True`` if the timeout was successfully set.
+        """
+        if timeout is None:
+            self.timeout = None
+            return True
+        try:
+            self.timeout = float(timeout)
+            return True
+        except ValueError:
+            return False
+
+    def connected(self):
+        """
+        Returns ``True`` if a Line-us is connected
+        """
+        return self._connected
+
+    def get_name(self):
+        """
+        Returns the name of the Line-us that you are connected to, or ``None`` if you are not connected.
+        """
+        return self.line_us_name
+
+    def get_hello_string(self):
+        """
+        Returns the hello string sent by Line-us when you connected as a ``dict``, or ``None`` if no Line-us is
+        connected. See ``LineUs.get_hello_string()`` for the format.
+        """
+        if self._connected:
+            return LineUs._parse_hello(self._hello_message)
+        else:
+            return None
+
+    async def disconnect(self):
+        """Close the connection to the Line-us. Returns True."""
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = None
+        self._writer = None
+        self._connected = False
+        self._hello_message = None
+        self._pending_replies = 0
+        self.line_us_name = None
+        return True
+
+    async def g01(self, x=None, y=None, z=None, timeout=None):
+        """
+        Send a G01 (interpolated move) and wait for the reply. One or more of x, y and z must be specified::
+
+            >>> await my_line_us.g01(1000, 0, 1000)
+            'ok X:1000.00 Y:0.00 Z:1000.00'
+
+        """
+        if x is None and y is None and z is None:
+            return False
+        return await self._command(LineUs._g01_command(x, y, z), timeout)
+
+    async def send_gcode(self, gcode, parameters='', timeout=None):
+        """
+        Send an arbitrary GCode to Line-us and return the reply::
+
+            >>> await my_line_us.send_gcode('G28')
+
+        """
+        cmd = gcode.encode()
+        cmd += b' '
+        cmd += parameters.encode()
+        return await self._command(cmd, timeout)
+
+    async def send_raw_gcode(self, gcode, timeout=None):
+        """
+        Send a raw GCode to Line-us and return the reply. It is your responsibility to construct a valid GCode.
+        """
+        return await self._command(gcode.encode(), timeout)
+
+    async def get_info(self, timeout=None):
+        """
+        Returns a dictionary with information about the connected Line-us. See ``LineUs.get_info()`` for details.
+        """
+        return LineUs._parse_info(await self.send_gcode('M122', '', timeout=timeout))
+
+    async def list_lineus_files(self, timeout=None):
+        """
+        Returns a list of the files stored on your Line-us as tuples of ``(file_number, size, file_name)``.
+        """
+        return LineUs._parse_file_list(await self.send_gcode('M20', timeout=timeout))
+
+    async def ping(self, line_us_name=None, count=5, timeout=None):
+        """
+        Test the speed of the connection to a Line-us in the same way as ``LineUs.ping()``. If ``line_us_name`` is
+        given the function connects, measures and disconnects, otherwise it uses the current connection. It
+        returns a ``dict`` with ``mean``, ``min``, ``max`` and ``stdev`` in milliseconds.
+        """
+        if line_us_name is not None:
+            if not await self.connect(line_us_name, timeout=timeout):
+                return None
+        ping_times = []
+        try:
+            # First M114 is a little slow
+            await self.send_gcode('M114', timeout=timeout)
+            for i in range(0, count):
+                start = time.perf_counter()
+                await self.send_gcode('M114', timeout=timeout)
+                ping_times.append((time.perf_counter() - start) * 1000)
+        finally:
+            if line_us_name is not None:
+                await self.disconnect()
+        return {'mean': statistics.mean(ping_times), 'min': min(ping_times), 'max': max(ping_times),
+                'stdev': statistics.stdev(ping_times)}
+
+    async def _command(self, command, timeout=None):
+        """Send a command and wait for its reply, one command at a time"""
+        if not self._connected:
+            raise ConnectionError('Not connected to a Line-us')
+        if timeout is None:
+            timeout = self.timeout
+        async with self._lock:
+            # Throw away replies to commands that timed out or were cancelled
+            while self._pending_replies > 0:
+                await self._read_response(timeout)
+            # Count the reply first, in case we are cancelled after the command has gone but before drain() returns
+            self._pending_replies += 1
+            self._writer.write(command + b'\x00')
+            await self._writer.drain()
+            return await self._read_response(timeout)
+
+    async def _read_response(self, timeout=None):
+        """Read the next null terminated reply from Line-us"""
+        try:
+            line = await asyncio.wait_for(self._reader.readuntil(b'\x00'), timeout)
+        except asyncio.IncompleteReadError:
+            raise ConnectionError('Line-us closed the connection')
+        self._pending_replies -= 1
+        return line[:-1].rstrip(b'\r\n').decode('utf-8')
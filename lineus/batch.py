@@ -0,0 +1,202 @@
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import shutil
+import sys
+import time
+from lineus.cache import CompileCache
+from lineus.svg import SvgImporter
+
+
+def compile_file(source, output, settings=None):
+    """
+    Compile an SVG file to a file of GCode lines for ``save_to_lineus()``. ``settings`` is a ``dict`` of
+    ``SvgImporter`` arguments plus ``pen_up`` and ``pen_down``. The lines are written to disk as they are made,
+    and the file only appears under its own name once it is complete. Returns the number of lines.
+    """
+    settings = dict(settings or {})
+    pen_up = settings.pop('pen_up', 1000)
+    pen_down = settings.pop('pen_down', 0)
+    importer = SvgImporter(**settings)
+    lines = 0
+    temp_path = f'{output}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'w') as output_file:
+            for line in importer.gcode(source, pen_up, pen_down):
+                output_file.write(line)
+                output_file.write('\n')
+                lines += 1
+        os.replace(temp_path, output)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return lines
+
+
+class BatchCompiler:
+    """
+    Compile many SVG files to GCode files in parallel with a pool of processes. Each output file is named after
+    its source with a ``.gcode`` extension and written to ``output_dir``. If two sources in one run have the same
+    name (``a/flower.svg`` and ``b/flower.svg``) the later one gets a hash of its path added to the name, for
+    example ``flower-3f2a9c1e.gcode``. Sources whose contents and settings match an entry in the compile cache are
+    copied from the cache instead of being compiled::
+
+        >>> compiler = BatchCompiler('gcode', settings={'tolerance': 2, 'margin': 50})
+        >>> for result in compiler.compile(glob.glob('artwork/*.svg')):
+        ...     print(result)
+        {'source': 'artwork/flower.svg', 'output': 'gcode/flower.gcode', 'cached': False, 'lines': 5120}
+
+    ``settings`` must be JSON serialisable as it is part of the cache key (see ``compile_file()``). ``cache`` can
+    be ``True`` for the default ``CompileCache``, a directory or a ``CompileCache``, and ``workers`` is the number
+    of processes (default: one per CPU). It can also be run from the command line, see
+    ``python -m lineus.batch --help``.
+    """
+
+    def __init__(self, output_dir, settings=None, cache=True, workers=None):
+        self.output_dir = output_dir
+        self.settings = dict(settings or {})
+        if cache is True:
+            cache = CompileCache()
+        elif isinstance(cache, str):
+            cache = CompileCache(cache)
+        self.cache = cache or None
+        self.workers = workers or os.cpu_count() or 1
+
+    def compile(self, sources):
+        """
+        A generator of a result ``dict`` for each source file, in the order they finish. The result has the
+        ``source``, ``output``, whether it came from the cache and the number of ``lines``, or an ``error``
+        message if the source could not be compiled. Only a few sources per worker are queued at once, so
+        ``sources`` can be a long iterator.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        sources = iter(sources)
+        pending = {}
+        claimed = {}
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+                exhausted = False
+                while True:
+                    while not exhausted and len(pending) < self.workers * 2:
+                        source = next(sources, None)
+                        if source is None:
+                            exhausted = True
+                            break
+                        output = self._output_path(source, claimed)
+                        if self.cache is None:
+                            future = executor.submit(compile_file, source, output, self.settings)
+                            pending[future] = ('compile', source, output, None)
+                        else:
+                            # Hash the source in a worker too, and only compile it if it is not in the cache
+                            future = executor.submit(CompileCache.key, source, self.settings)
+                            pending[future] = ('key', source, output, None)
+                    if len(pending) == 0:
+                        break
+                    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        stage, source, output, key = pending.pop(future)
+                        if stage == 'compile':
+                            yield self._result(future, source, output, key)
+                            continue
+                        result, key = self._from_cache(future, source, output)
+                        if result is not None:
+                            yield result
+                            continue
+                        future = executor.submit(compile_file, source, output, self.settings)
+                        pending[future] = ('compile', source, output, key)
+        finally:
+            if self.cache is not None:
+                self.cache.save()
+
+    def run(self, sources, on_result=None):
+        """
+        Compile all of ``sources``, calling ``on_result(result)`` for each one, and return a summary ``dict`` of
+        how many were compiled, came from the cache and failed, and how long it took.
+        """
+        summary = {'compiled': 0, 'cached': 0, 'failed': 0}
+        start = time.perf_counter()
+        for result in self.compile(sources):
+            if 'error' in result:
+                summary['failed'] += 1
+            elif result['cached']:
+                summary['cached'] += 1
+            else:
+                summary['compiled'] += 1
+            if on_result is not None:
+                on_result(result)
+        summary['seconds'] = time.perf_counter() - start
+        return summary
+
+    def _from_cache(self, future, source, output):
+        """The result for a hashed source that is already in the cache, or None, and its cache key"""
+        try:
+            key = future.result()
+        except Exception as error:
+            return {'source': source, 'output': None, 'cached': False, 'error': str(error)}, None
+        cached = self.cache.get(key)
+        if cached is None:
+            return None, key
+        try:
+            shutil.copyfile(cached[0], output)
+        except OSError:
+            # Compile it again if the cached copy cannot be used
+            return None, key
+        return {'source': source, 'output': output, 'cached': True, 'lines': cached[1]}, key
+
+    def _result(self, future, source, output, key):
+        """The result of a finished compile, adding it to the cache"""
+        try:
+            lines = future.result()
+        except Exception as error:
+            return {'source': source, 'output': None, 'cached': False, 'error': f'{type(error).__name__}: {error}'}
+        if self.cache is not None and key is not None:
+            self.cache.put(key, output, lines)
+        return {'source': source, 'output': output, 'cached': False, 'lines': lines}
+
+    def _output_path(self, source, claimed):
+        """The output file for source, adding a hash of its path if another source has already claimed the name"""
+        name = os.path.splitext(os.path.basename(source))[0]
+        output = os.path.join(self.output_dir, f'{name}.gcode')
+        source_path = os.path.abspath(source)
+        if claimed.setdefault(output, source_path) != source_path:
+            digest = hashlib.sha1(source_path.encode()).hexdigest()[:8]
+            output = os.path.join(self.output_dir, f'{name}-{digest}.gcode')
+            claimed[output] = source_path
+        return output
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Compile SVG files to Line-us GCode files')
+    parser.add_argument('sources', nargs='+', help='SVG files to compile')
+    parser.add_argument('--output', default='.', help='directory for the GCode files (default: current directory)')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: one per CPU)')
+    parser.add_argument('--tolerance', type=float, default=1, help='curve flattening tolerance in Line-us units')
+    parser.add_argument('--margin', type=float, default=0, help='margin inside the drawing area in Line-us units')
+    parser.add_argument('--clip', default='clip', choices=('clip', 'drop', 'error'),
+                        help='how to deal with lines outside the drawing area')
+    parser.add_argument('--cache', default=None, help='compile cache directory (default: ~/.lineus/compiled)')
+    parser.add_argument('--cache-size', type=int, default=None, help='compile cache size limit in MB')
+    parser.add_argument('--no-cache', action='store_true', help='compile everything without using the cache')
+    args = parser.parse_args()
+
+    if args.no_cache:
+        compile_cache = None
+    else:
+        compile_cache = CompileCache(args.cache, args.cache_size * 1024 * 1024 if args.cache_size else None)
+    compiler = BatchCompiler(args.output, settings={'tolerance': args.tolerance, 'margin': args.margin,
+                                                    'clip': args.clip},
+                             cache=compile_cache, workers=args.workers)
+
+    def report(result):
+        if 'error' in result:
+            sys.stderr.write(f'{result["source"]}: {result["error"]}\n')
+        else:
+            sys.stdout.write(f'{result["source"]} -> {result["output"]} ({result["lines"]} lines'
+                             f'{", cached" if result["cached"] else ""})\n')
+
+    totals = compiler.run(args.sources, on_result=report)
+    sys.stdout.write(f'{totals["compiled"]} compiled, {totals["cached"]} from the cache, {totals["failed"]} failed '
+                     f'in {totals["seconds"]:.1f}s\n')
+    sys.exit(1 if totals['failed'] > 0 else 0)
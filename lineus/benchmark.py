@@ -0,0 +1,197 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from lineus.lineus import LineUs, DiscoveryService, numpy
+from lineus.emulator import LineUsEmulator
+
+
+class LineUsBenchmark:
+    """
+    Measures the performance of the Line-us module against a Line-us or a ``LineUsEmulator``. Each ``run_*()``
+    function returns a ``dict`` of results, and ``run_all()`` collects them together::
+
+        >>> benchmark = LineUsBenchmark(('line-us', 'line-us.local', '192.168.27.223', 1337), count=200)
+        >>> benchmark.run_g01()
+        {'commands': 200, 'seconds': 1.92, 'commands_per_second': 104.1, 'p50_ms': 9.4, 'p95_ms': 12.1, ...}
+
+    It can also be run from the command line, see ``python -m lineus.benchmark --help``.
+    """
+
+    _default_count = 200
+    _default_windows = (1, 2, 4, 8)
+
+    def __init__(self, target, count=None, windows=None):
+        self.target = target
+        self.count = count if count is not None else self._default_count
+        self.windows = windows if windows is not None else self._default_windows
+
+    def run_g01(self):
+        """Time ``g01()`` one move at a time"""
+        my_line_us = self._connect()
+        moves = self._moves()
+        try:
+            return self._time_each(lambda i: my_line_us.g01(*moves[i]))
+        finally:
+            my_line_us.close()
+
+    def run_send_gcode(self):
+        """Time ``send_gcode('M114')`` one command at a time"""
+        my_line_us = self._connect()
+        try:
+            return self._time_each(lambda i: my_line_us.send_gcode('M114'))
+        finally:
+            my_line_us.close()
+
+    def run_stream(self, window):
+        """Time ``stream_gcode()`` with an in-flight window of ``window`` commands"""
+        my_line_us = self._connect()
+        gcode = [LineUs._g01_command(*move).decode() for move in self._moves()]
+        try:
+            start = time.perf_counter()
+            result = my_line_us.stream_gcode(gcode, window=window)
+            seconds = time.perf_counter() - start
+        finally:
+            my_line_us.close()
+        return {'window': window, 'commands': result['sent'], 'errors': result['errors'], 'seconds': seconds,
+                'commands_per_second': result['sent'] / seconds}
+
+    def run_g01_path(self, window):
+        """Time ``g01_path()`` with an in-flight window of ``window`` moves"""
+        my_line_us = self._connect()
+        try:
+            start = time.perf_counter()
+            result = my_line_us.g01_path(self._moves(), window=window)
+            seconds = time.perf_counter() - start
+        finally:
+            my_line_us.close()
+        return {'window': window, 'commands': result['sent'], 'errors': result['errors'], 'seconds': seconds,
+                'commands_per_second': result['sent'] / seconds}
+
+    @staticmethod
+    def run_mdns(timeout=10):
+        """
+        Time from starting a fresh Bonjour search to the first Line-us being found. The search is a new one of its
+        own, not the one shared by ``LineUs()`` objects, so machines that have already been found do not count.
+        """
+        start = time.perf_counter()
+        discovery = DiscoveryService()
+        try:
+            line_us = discovery.listener.wait_for(timeout=timeout)
+            seconds = time.perf_counter() - start
+        finally:
+            discovery.close()
+        return {'found': line_us is not None, 'seconds': seconds if line_us is not None else None}
+
+    @staticmethod
+    def run_slow_search(network=None, timeout=None):
+        """Time from starting a ``slow_search()`` to the first Line-us being found, and to the end of the search"""
+        found = []
+        start = time.perf_counter()
+
+        def on_found(line_us):
+            found.append(time.perf_counter() - start)
+
+        LineUs().slow_search(network=network, return_first=False, timeout=timeout, callback=on_found)
+        return {'found': len(found), 'first_seconds': found[0] if len(found) > 0 else None,
+                'total_seconds': time.perf_counter() - start}
+
+    def run_all(self, mdns=False, slow_search=False):
+        """Run the command benchmarks, and the discovery benchmarks if asked, returning all the results"""
+        results = {'g01': self.run_g01(),
+                   'send_gcode': self.run_send_gcode(),
+                   'stream_gcode': [self.run_stream(window) for window in self.windows]}
+        if numpy is not None:
+            results['g01_path'] = [self.run_g01_path(window) for window in self.windows]
+        if mdns:
+            results['mdns'] = self.run_mdns()
+        if slow_search:
+            results['slow_search'] = self.run_slow_search()
+        return results
+
+    def _connect(self):
+        my_line_us = LineUs()
+        if not my_line_us.connect(self.target):
+            raise ConnectionError(f'Could not connect to {self.target}')
+        # First command is a little slow
+        my_line_us.send_gcode('M114')
+        return my_line_us
+
+    def _moves(self):
+        """A list of count moves back and forth across the drawing area with the pen up"""
+        return [(1000 + (i % 2) * 500, -500 + (i % 3) * 500, 1000) for i in range(0, self.count)]
+
+    def _time_each(self, command):
+        """Run command(i) count times, returning the throughput and reply latency percentiles"""
+        times = []
+        start = time.perf_counter()
+        for i in range(0, self.count):
+            command_start = time.perf_counter()
+            command(i)
+            times.append((time.perf_counter() - command_start) * 1000)
+        seconds = time.perf_counter() - start
+        result = {'commands': self.count, 'seconds': seconds, 'commands_per_second': self.count / seconds}
+        result.update(self.latency_summary(times))
+        return result
+
+    @staticmethod
+    def latency_summary(times):
+        """Summarise a list of latencies in milliseconds as mean, min, max, p50, p95 and p99"""
+        if len(times) < 2:
+            return {'mean_ms': times[0] if times else None}
+        ordered = sorted(times)
+
+        def percentile(fraction):
+            # Linear interpolation between the closest ranks, as statistics.quantiles(method='inclusive') in 3.8
+            position = (len(ordered) - 1) * fraction
+            lower = int(position)
+            upper = min(lower + 1, len(ordered) - 1)
+            return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+        return {'mean_ms': statistics.mean(times), 'min_ms': min(times), 'max_ms': max(times),
+                'p50_ms': percentile(.5), 'p95_ms': percentile(.95), 'p99_ms': percentile(.99)}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the Line-us module')
+    parser.add_argument('target', nargs='?', default=None,
+                        help='name or ip address of a Line-us (default: run against a local emulator)')
+    parser.add_argument('--count', type=int, default=LineUsBenchmark._default_count, help='commands per test')
+    parser.add_argument('--windows', default=','.join(str(w) for w in LineUsBenchmark._default_windows),
+                        help='comma separated stream_gcode windows to test')
+    parser.add_argument('--latency', type=float, default=0.005, help='emulator one way latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.001, help='emulator jitter in seconds')
+    parser.add_argument('--processing', type=float, default=0.001, help='emulator time per command in seconds')
+    parser.add_argument('--seed', type=int, default=1, help='emulator random seed')
+    parser.add_argument('--mdns', action='store_true', help='also time Bonjour discovery')
+    parser.add_argument('--slow-search', action='store_true', help='also time slow_search')
+    parser.add_argument('--output', default=None, help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    emulator = None
+    if args.target is None:
+        emulator = LineUsEmulator(latency=args.latency, jitter=args.jitter, processing=args.processing,
+                                  seed=args.seed).start()
+        target = emulator.get_line_us()
+        target_description = {'emulator': True, 'latency': args.latency, 'jitter': args.jitter,
+                              'processing': args.processing, 'seed': args.seed}
+    else:
+        target = args.target
+        target_description = {'emulator': False, 'name': args.target}
+    try:
+        benchmark = LineUsBenchmark(target, count=args.count, windows=[int(w) for w in args.windows.split(',')])
+        report = {'timestamp': time.time(), 'python': platform.python_version(), 'platform': platform.platform(),
+                  'target': target_description, 'count': args.count,
+                  'results': benchmark.run_all(mdns=args.mdns, slow_search=args.slow_search)}
+    finally:
+        if emulator is not None:
+            emulator.stop()
+    output = json.dumps(report, indent=4)
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        sys.stdout.write(output + '\n')
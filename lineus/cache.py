@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import lineus
+
+
+class JsonStore:
+    """A dict kept in a JSON file, written atomically and shared safely between threads"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def save(self):
+        """Write the store to disk, replacing the old file in one step"""
+        with self._lock:
+            data = json.dumps(self._entries, indent=2)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_path = f'{self.path}.tmp'
+            with open(temp_path, 'w') as store_file:
+                store_file.write(data)
+            os.replace(temp_path, self.path)
+        except OSError:
+            # The store is only an optimisation so carry on without it
+            pass
+
+    def _load(self):
+        """Read the store from disk, starting empty if it is missing or unreadable"""
+        try:
+            with open(self.path) as store_file:
+                entries = json.load(store_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(entries, dict):
+            return {}
+        return {key: entry for key, entry in entries.items() if self._valid(entry)}
+
+    @staticmethod
+    def _valid(entry):
+        return isinstance(entry, dict)
+
+
+class DiscoveryCache(JsonStore):
+    """
+    An on-disk cache of the Line-us machines you have connected to, so a new program can try the last known
+    address straight away instead of waiting for the Bonjour search or a ``slow_search()``. Each entry holds
+    the name, Bonjour name, ip address, port, hello message and the time it was last seen. Entries older than
+    ``ttl`` seconds (default 7 days) are ignored and removed. Pass a cache to ``LineUs()`` to use it::
+
+        >>> my_line_us = LineUs(cache=DiscoveryCache())
+        >>> my_line_us.connect('line-us')
+
+    The default location is ``~/.lineus/discovery.json``.
+    """
+
+    _default_path = os.path.join(os.path.expanduser('~'), '.lineus', 'discovery.json')
+    _default_ttl = 7 * 24 * 60 * 60
+    _fields = ('name', 'server', 'address', 'port', 'hello', 'last_seen')
+
+    def __init__(self, path=None, ttl=None):
+        JsonStore.__init__(self, path if path is not None else self._default_path)
+        self.ttl = ttl if ttl is not None else self._default_ttl
+
+    def get(self, line_us_name):
+        """Returns the fresh entry for a Line-us by name, Bonjour name or ip address, or ``None``"""
+        for entry in self.get_all():
+            if line_us_name in (entry['name'], entry['server'], entry['server'].rstrip('.'), entry['address']):
+                return entry
+        return None
+
+    def get_all(self):
+        """Returns a list of the fresh entries, most recently seen first"""
+        self.expire()
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values()]
+        return sorted(entries, key=lambda entry: entry['last_seen'], reverse=True)
+
+    def add(self, line_us, hello=None):
+        """Add or refresh a Line-us from its ``(name, bonjour_name, ip_address, port)`` tuple and save the cache"""
+        with self._lock:
+            self._entries[line_us[0]] = {'name': line_us[0], 'server': line_us[1], 'address': line_us[2],
+                                         'port': line_us[3], 'hello': hello, 'last_seen': time.time()}
+        self.save()
+
+    def remove(self, line_us_name):
+        """Remove a Line-us from the cache and save it"""
+        with self._lock:
+            removed = self._entries.pop(line_us_name, None)
+        if removed is not None:
+            self.save()
+
+    def expire(self):
+        """Remove the entries that have not been seen within the ttl"""
+        oldest = time.time() - self.ttl
+        with self._lock:
+            stale = [name for name, entry in self._entries.items() if entry['last_seen'] < oldest]
+            for name in stale:
+                del self._entries[name]
+        if len(stale) > 0:
+            self.save()
+
+    @classmethod
+    def _valid(cls, entry):
+        return isinstance(entry, dict) and all(key in entry for key in cls._fields)
+
+
+class SlotManifest(JsonStore):
+    """
+    A record on disk of the drawings saved in each Line-us file slot, keyed by the serial number of the machine.
+    Each slot holds the SHA-256 hash and size of the GCode that was saved, so ``LineUs.sync_drawings()`` can skip
+    slots that have not changed. The default location is ``~/.lineus/manifest.json``.
+    """
+
+    _default_path = os.path.join(os.path.expanduser('~'), '.lineus', 'manifest.json')
+
+    def __init__(self, path=None):
+        JsonStore.__init__(self, path if path is not None else self._default_path)
+
+    def get(self, machine_id, slot):
+        """Returns the ``{'hash', 'size', 'saved'}`` entry for a slot, or ``None`` if nothing is recorded"""
+        with self._lock:
+            entry = self._entries.get(str(machine_id), {}).get(str(slot))
+            return dict(entry) if entry is not None else None
+
+    def set(self, machine_id, slot, digest, size):
+        """Record the hash and size of the drawing saved in a slot. Call ``save()`` to write it to disk."""
+        with self._lock:
+            self._entries.setdefault(str(machine_id), {})[str(slot)] = {'hash': digest, 'size': size,
+                                                                        'saved': time.time()}
+
+    def forget(self, machine_id, slot=None):
+        """Forget one slot, or every slot if ``slot`` is ``None``, for a machine"""
+        with self._lock:
+            if slot is None:
+                self._entries.pop(str(machine_id), None)
+            else:
+                self._entries.get(str(machine_id), {}).pop(str(slot), None)
+
+
+class CompileCache(JsonStore):
+    """
+    A size limited cache on disk of compiled GCode files, keyed by the SHA-256 hash of the source file, the
+    settings it was compiled with and the version of the module (see ``key()``). When the files add up to more
+    than ``max_size`` bytes (default 512MB) the least recently used ones are removed. The default location is
+    ``~/.lineus/compiled``::
+
+        >>> cache = CompileCache(max_size=100 * 1024 * 1024)
+        >>> key = cache.key('flower.svg', {'tolerance': 1})
+        >>> if cache.get(key) is None:
+        ...     cache.put(key, 'flower.gcode')
+
+    Call ``save()`` to write the index to disk after a batch of ``get()`` calls.
+    """
+
+    _default_path = os.path.join(os.path.expanduser('~'), '.lineus', 'compiled')
+    _default_max_size = 512 * 1024 * 1024
+    _read_size = 1024 * 1024
+
+    def __init__(self, path=None, max_size=None):
+        self.directory = path if path is not None else self._default_path
+        self.max_size = max_size if max_size is not None else self._default_max_size
+        JsonStore.__init__(self, os.path.join(self.directory, 'index.json'))
+
+    @classmethod
+    def key(cls, source_path, settings=None):
+        """The cache key for a source file compiled with a JSON serialisable ``dict`` of settings"""
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as source_file:
+            for chunk in iter(lambda: source_file.read(cls._read_size), b''):
+                digest.update(chunk)
+        digest.update(json.dumps(settings or {}, sort_keys=True).encode())
+        # A new version of the module may compile the same source differently
+        digest.update(lineus.__version__.encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns ``(path, lines)`` for a cached file, or ``None`` if it is not in the cache"""
+        path = self._file_path(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and os.path.isfile(path):
+                entry['used'] = time.time()
+                return path, entry['lines']
+            self._entries.pop(key, None)
+        return None
+
+    def put(self, key, path, lines=None):
+        """Copy a compiled file into the cache, removing old files if it is over size, and save the index"""
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f'{self._file_path(key)}.tmp'
+        shutil.copyfile(path, temp_path)
+        os.replace(temp_path, self._file_path(key))
+        with self._lock:
+            self._entries[key] = {'size': os.path.getsize(path), 'lines': lines, 'used': time.time()}
+        self.evict()
+        self.save()
+
+    def evict(self):
+        """Remove the least recently used files until the cache is no bigger than ``max_size``"""
+        with self._lock:
+            total = sum(entry['size'] for entry in self._entries.values())
+            for key in sorted(self._entries, key=lambda name: self._entries[name]['used']):
+                if total <= self.max_size:
+                    break
+                total -= self._entries.pop(key)['size']
+                try:
+                    os.remove(self._file_path(key))
+                except OSError:
+                    pass
+
+    def _file_path(self, key):
+        return os.path.join(self.directory, f'{key}.gcode')
+
+    @staticmethod
+    def _valid(entry):
+        return isinstance(entry, dict) and all(key in entry for key in ('size', 'lines', 'used'))
@@ -0,0 +1,98 @@
+import math
+import numpy
+
+
+def flatten_quadratic(curves, tolerance=1):
+    """
+    Flatten quadratic Bézier curves into polylines that are never more than ``tolerance`` Line-us units from the
+    curve. ``curves`` is an ``(M, 3, 2)`` array (or anything NumPy can convert) of the start point, control point
+    and end point of each curve. See ``flatten_cubic()`` for how the number of segments is chosen.
+    """
+    return _flatten_bezier(curves, tolerance, 2)
+
+
+def flatten_cubic(curves, tolerance=1):
+    """
+    Flatten cubic Bézier curves into polylines that are never more than ``tolerance`` Line-us units from the
+    curve. ``curves`` is an ``(M, 4, 2)`` array (or anything NumPy can convert) of the start point, the two control
+    points and the end point of each curve. The number of segments for each curve comes from Wang's formula, so
+    gentle curves get a few segments and tight ones get more, and all of the curves are flattened together with
+    NumPy::
+
+        >>> paths = flatten_cubic([[(700, 0), (700, 500), (1200, 500), (1200, 0)]], tolerance=2)
+        >>> [len(path) for path in paths]
+        [18]
+        >>> my_line_us.g01_path(paths[0], z=0)
+        {'sent': 18, 'errors': 0}
+
+    Returns a list of ``(N, 2)`` ``float64`` arrays, one for each curve, that start and end on the curve's end
+    points and can be passed to ``LineUs.g01_path()`` or ``Drawing.from_strokes()``.
+    """
+    return _flatten_bezier(curves, tolerance, 3)
+
+
+def flatten_arcs(arcs, tolerance=1):
+    """
+    Flatten circular arcs into polylines that are never more than ``tolerance`` Line-us units from the arc.
+    ``arcs`` is an ``(M, 5)`` array (or anything NumPy can convert) with a row of ``(centre_x, centre_y, radius,
+    start_angle, sweep_angle)`` for each arc, with the angles in degrees and positive sweeps anticlockwise. The
+    segments are as long as they can be while the gap between each chord and the arc (its sagitta) is within
+    ``tolerance``::
+
+        >>> paths = flatten_arcs([(1200, 0, 300, 0, 360)], tolerance=1)
+        >>> [len(path) for path in paths]
+        [40]
+
+    Returns a list of ``(N, 2)`` ``float64`` arrays, one for each arc, as for ``flatten_cubic()``.
+    """
+    arcs = numpy.asarray(arcs, dtype=numpy.float64).reshape(-1, 5)
+    if len(arcs) == 0:
+        return []
+    _check_tolerance(tolerance)
+    radius = numpy.abs(arcs[:, 2])
+    sweep = numpy.radians(arcs[:, 4])
+    # The sagitta of a chord across angle a is r * (1 - cos(a / 2))
+    with numpy.errstate(divide='ignore'):
+        largest_angle = 2 * numpy.arccos(numpy.clip(1 - tolerance / radius, -1, 1))
+    segments = numpy.maximum(1, numpy.ceil(numpy.abs(sweep) / largest_angle)).astype(numpy.int64)
+    arc, fraction = _fractions(segments)
+    angle = numpy.radians(arcs[arc, 3]) + sweep[arc] * fraction
+    points = numpy.column_stack((arcs[arc, 0] + radius[arc] * numpy.cos(angle),
+                                 arcs[arc, 1] + radius[arc] * numpy.sin(angle)))
+    return _split(points, segments)
+
+
+def _flatten_bezier(curves, tolerance, degree):
+    """Flatten (M, degree + 1, 2) Bézier curves with Wang's formula for the number of segments"""
+    curves = numpy.asarray(curves, dtype=numpy.float64).reshape(-1, degree + 1, 2)
+    if len(curves) == 0:
+        return []
+    _check_tolerance(tolerance)
+    second_difference = curves[:, :-2] - 2 * curves[:, 1:-1] + curves[:, 2:]
+    largest = numpy.hypot(second_difference[..., 0], second_difference[..., 1]).max(axis=1)
+    segments = numpy.ceil(numpy.sqrt(degree * (degree - 1) * largest / (8 * tolerance)))
+    segments = numpy.maximum(1, segments).astype(numpy.int64)
+    curve, t = _fractions(segments)
+    weights = numpy.stack([math.comb(degree, k) * t ** k * (1 - t) ** (degree - k) for k in range(0, degree + 1)],
+                          axis=1)
+    points = numpy.einsum('ik,ikj->ij', weights, curves[curve])
+    return _split(points, segments)
+
+
+def _check_tolerance(tolerance):
+    if not tolerance > 0:
+        raise ValueError('tolerance must be greater than 0')
+
+
+def _fractions(segments):
+    """For curves split into segments, the curve number and 0 to 1 parameter of every point along all of them"""
+    counts = segments + 1
+    first = numpy.cumsum(counts) - counts
+    curve = numpy.repeat(numpy.arange(len(segments)), counts)
+    step = numpy.arange(counts.sum()) - first[curve]
+    return curve, step / segments[curve]
+
+
+def _split(points, segments):
+    """Split the points of all the curves into one array per curve"""
+    return numpy.split(points, numpy.cumsum(segments + 1)[:-1])
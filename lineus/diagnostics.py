@@ -9,6 +9,8 @@ class Diagnostics(threading.Thread):
     def __init__(self):
         threading.Thread.__init__(self)
         self.my_line_us = lineus.LineUs()
+        # Start the Bonjour search now so it has found the machines by the time the slow scan is done
+        self.my_line_us.start_discovery()
         self.diags = {}
         self.status_callback = None
         self.complete_callback = None
@@ -25,6 +27,12 @@ class Diagnostics(threading.Thread):
         self.cancelled_callback = callback
 
     def run(self):
+        try:
+            self.diagnose()
+        finally:
+            self.my_line_us.close()
+
+    def diagnose(self):
         self.status('Finding networks')
         self.diags['networks'] = self.my_line_us.get_network_list()
         if self.cancelled():
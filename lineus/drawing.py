@@ -0,0 +1,185 @@
+import struct
+import numpy
+
+
+class Drawing:
+    """
+    A drawing held as one contiguous array of ``(x, y)`` points plus an index of where each stroke starts, so a
+    large drawing costs a few bytes per point rather than a Python object per point. Points are stored as
+    ``int16`` when they are whole numbers in range and ``float32`` otherwise::
+
+        >>> drawing = Drawing.from_strokes([[(900, 300), (900, -300)], [(1200, 300), (1200, -300)]])
+        >>> len(drawing), drawing.point_count()
+        (2, 4)
+        >>> drawing.save('drawing.lus')
+        >>> drawing = Drawing.load('drawing.lus')          # memory mapped, nothing is read yet
+        >>> drawing.draw(my_line_us)
+
+    ``points`` is an ``(N, 2)`` array and ``offsets`` has one more entry than there are strokes, with stroke
+    ``i`` being ``points[offsets[i]:offsets[i + 1]]``.
+    """
+
+    __slots__ = ('points', 'offsets')
+
+    _magic = b'LINEUS1\x00'
+    _header = struct.Struct('<8s1s7xQQ')
+    _dtypes = {b'h': numpy.dtype('<i2'), b'f': numpy.dtype('<f4')}
+    _default_chunk_points = 8192
+
+    def __init__(self, points, offsets):
+        self.points = points
+        self.offsets = offsets
+
+    @classmethod
+    def from_strokes(cls, strokes, dtype=None):
+        """
+        Build a drawing from an iterable of strokes, each a sequence or array of ``(x, y)`` points. Empty strokes
+        are dropped. ``dtype`` can be ``numpy.int16`` or ``numpy.float32`` and is chosen from the data if not set.
+        """
+        arrays = []
+        for stroke in strokes:
+            array = numpy.asarray(stroke)
+            if len(array) > 0:
+                arrays.append(array.reshape(len(array), -1)[:, :2])
+        if len(arrays) == 0:
+            return cls(numpy.empty((0, 2), dtype=dtype or numpy.int16), numpy.zeros(1, dtype=numpy.int64))
+        points = numpy.concatenate(arrays)
+        if dtype is None:
+            dtype = cls._choose_dtype(points)
+        offsets = numpy.zeros(len(arrays) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(array) for array in arrays], out=offsets[1:])
+        return cls(points.astype(dtype), offsets)
+
+    @staticmethod
+    def _choose_dtype(points):
+        """int16 if every coordinate is a whole number that fits, otherwise float32"""
+        if len(points) == 0:
+            return numpy.int16
+        if numpy.issubdtype(points.dtype, numpy.integer) or numpy.array_equal(points, numpy.round(points)):
+            if points.min() >= numpy.iinfo(numpy.int16).min and points.max() <= numpy.iinfo(numpy.int16).max:
+                return numpy.int16
+        return numpy.float32
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for index in range(0, len(self)):
+            yield self.stroke(index)
+
+    def point_count(self):
+        """The total number of points in all of the strokes"""
+        return int(self.offsets[-1])
+
+    def stroke(self, index):
+        """Returns stroke ``index`` as a view of the points array"""
+        return self.points[self.offsets[index]:self.offsets[index + 1]]
+
+    def bounds(self):
+        """Returns ``(min_x, min_y, max_x, max_y)``, or ``None`` for an empty drawing"""
+        if self.point_count() == 0:
+            return None
+        low = self.points.min(axis=0)
+        high = self.points.max(axis=0)
+        return float(low[0]), float(low[1]), float(high[0]), float(high[1])
+
+    def save(self, path):
+        """
+        Write the drawing to a compact binary file: a 32 byte header followed by the offsets as little endian
+        ``int64`` and the points as little endian ``int16`` or ``float32``.
+        """
+        code = b'h' if self.points.dtype.kind in 'iu' else b'f'
+        with open(path, 'wb') as drawing_file:
+            drawing_file.write(self._header.pack(self._magic, code, self.point_count(), len(self)))
+            drawing_file.write(numpy.ascontiguousarray(self.offsets, dtype='<i8').tobytes())
+            drawing_file.write(numpy.ascontiguousarray(self.points, dtype=self._dtypes[code]).tobytes())
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Read a drawing saved with ``save()``. With ``mmap`` the arrays are memory mapped, so points are only
+        read from disk as they are used.
+        """
+        with open(path, 'rb') as drawing_file:
+            header = drawing_file.read(cls._header.size)
+        if len(header) != cls._header.size:
+            raise ValueError(f'{path} is not a Line-us drawing')
+        magic, code, point_count, stroke_count = cls._header.unpack(header)
+        if magic != cls._magic or code not in cls._dtypes:
+            raise ValueError(f'{path} is not a Line-us drawing')
+        offsets_at = cls._header.size
+        points_at = offsets_at + (stroke_count + 1) * 8
+        if mmap:
+            offsets = numpy.memmap(path, dtype='<i8', mode='r', offset=offsets_at, shape=(stroke_count + 1, ))
+            if point_count > 0:
+                points = numpy.memmap(path, dtype=cls._dtypes[code], mode='r', offset=points_at,
+                                      shape=(point_count, 2))
+            else:
+                points = numpy.empty((0, 2), dtype=cls._dtypes[code])
+        else:
+            offsets = numpy.fromfile(path, dtype='<i8', count=stroke_count + 1, offset=offsets_at)
+            points = numpy.fromfile(path, dtype=cls._dtypes[code], count=point_count * 2,
+                                    offset=points_at).reshape(point_count, 2)
+        return cls(points, offsets)
+
+    def moves(self, pen_up=1000, pen_down=0, chunk_points=None):
+        """
+        A generator of ``(M, 3)`` arrays of ``(x, y, z)`` moves that draw the strokes in order, a chunk of about
+        ``chunk_points`` points at a time. Each stroke is a pen up move to its first point, the points with the
+        pen down, and a pen up at its last point.
+        """
+        for first, last in self._chunks(chunk_points):
+            yield self._moves(first, last, pen_up, pen_down)
+
+    def _chunks(self, chunk_points=None):
+        """Split the strokes into runs of about chunk_points points, yielding (first, last) stroke numbers"""
+        if chunk_points is None:
+            chunk_points = self._default_chunk_points
+        first = 0
+        while first < len(self):
+            last = int(numpy.searchsorted(self.offsets, self.offsets[first] + chunk_points, side='right')) - 1
+            last = min(max(last, first + 1), len(self))
+            yield first, last
+            first = last
+
+    def _moves(self, first, last, pen_up, pen_down):
+        """The moves for strokes first to last - 1 as one array"""
+        offsets = numpy.asarray(self.offsets[first:last + 1])
+        lengths = numpy.diff(offsets)
+        lengths = lengths[lengths > 0]
+        points = numpy.asarray(self.points[offsets[0]:offsets[-1]])
+        dtype = numpy.result_type(points.dtype, pen_up, pen_down)
+        moves = numpy.empty((len(points) + 2 * len(lengths), 3), dtype=dtype)
+        point_starts = numpy.cumsum(lengths) - lengths
+        stroke = numpy.repeat(numpy.arange(len(lengths)), lengths)
+        rows = numpy.arange(len(points)) + 2 * stroke + 1
+        moves[rows, :2] = points
+        moves[rows, 2] = pen_down
+        travel = point_starts + 2 * numpy.arange(len(lengths))
+        moves[travel, :2] = points[point_starts]
+        moves[travel, 2] = pen_up
+        lift = travel + lengths + 1
+        moves[lift, :2] = points[point_starts + lengths - 1]
+        moves[lift, 2] = pen_up
+        return moves
+
+    def draw(self, line_us, pen_up=1000, pen_down=0, window=None, progress=None):
+        """
+        Draw the drawing on a connected ``LineUs`` by streaming each chunk of moves with ``g01_path()``.
+        ``progress(strokes_drawn, total_strokes)`` is called after each chunk. Returns the number of error replies.
+        """
+        errors = 0
+        for first, last in self._chunks():
+            result = line_us.g01_path(self._moves(first, last, pen_up, pen_down), window=window)
+            errors += result['errors']
+            if progress is not None:
+                progress(last, len(self))
+        return errors
+
+    def gcode(self, pen_up=1000, pen_down=0):
+        """A generator of the ``G01`` lines that draw the drawing, for ``stream_gcode()`` or ``save_to_lineus()``"""
+        for moves in self.moves(pen_up, pen_down):
+            number = '%d' if numpy.issubdtype(moves.dtype, numpy.integer) else '%.2f'
+            line = f'G01 X{number} Y{number} Z{number}'
+            for move in moves.tolist():
+                yield line % tuple(move)
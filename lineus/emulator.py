@@ -0,0 +1,279 @@
+import argparse
+import collections
+import random
+import re
+import socket
+import threading
+import time
+
+
+class LineUsEmulator:
+    """
+    A stand-in for a Line-us that speaks the TCP API, so you can test and benchmark your code without a machine.
+    It sends the ``hello`` message on connection, keeps a virtual pen position and answers ``G01``, ``G28``,
+    ``M114``, ``M122``, ``M20``, ``M28`` and ``M29`` in the same formats as Line-us. Run it in your program::
+
+        >>> emulator = LineUsEmulator(latency=0.01).start()
+        >>> my_line_us = LineUs()
+        >>> my_line_us.connect(emulator.get_line_us())
+        >>> emulator.stop()
+
+    or from the command line with ``python -m lineus.emulator``.
+
+    ``latency`` is the one way network delay in seconds, ``jitter`` adds a random extra delay of up to that many
+    seconds and ``processing`` is the time Line-us spends on each command. ``split`` sends each reply in pieces
+    of that many bytes. ``drop_rate`` is the chance that a reply is never sent and ``disconnect_after`` closes
+    the connection after that many commands. Set ``seed`` to make the random behaviour repeatable.
+
+    ``arrivals`` holds the ``(time, command)`` of the most recent commands, where ``time`` is when the command
+    reached the virtual Line-us (including ``latency``) on the ``time.perf_counter()`` clock.
+    """
+
+    _default_port = 1337
+    _home = (1000.0, 1000.0, 1000.0)
+    _read_size = 4096
+    _arrival_history = 10000
+
+    def __init__(self, name='line-us-emulator', host='127.0.0.1', port=0, latency=0, jitter=0, processing=0,
+                 split=None, drop_rate=0, disconnect_after=None, seed=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.processing = processing
+        self.split = split
+        self.drop_rate = drop_rate
+        self.disconnect_after = disconnect_after
+        self.serial = '1575520'
+        self.version = '3.2.0 Nov 22 2019 11:28:36'
+        self.position = self._home
+        self.files = {}
+        self.command_count = 0
+        self.arrivals = collections.deque(maxlen=self._arrival_history)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._connections = []
+        self._running = False
+
+    def start(self):
+        """Start listening for connections in the background. Returns the emulator."""
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen(16)
+        self.port = self._server.getsockname()[1]
+        self._running = True
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop listening and close any open connections"""
+        self._running = False
+        if self._server is not None:
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._server.close()
+            self._server = None
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            self._close(connection)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_line_us(self):
+        """Returns a ``(name, bonjour_name, ip_address, port)`` tuple that can be passed to ``connect()``"""
+        return self.name, f'{self.name}.local', self.host, self.port
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _accept(self):
+        """Accept connections until stopped"""
+        while self._running:
+            try:
+                connection, address = self._server.accept()
+            except OSError:
+                return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._connections.append(connection)
+            threading.Thread(target=self._serve, args=(connection, ), daemon=True).start()
+
+    def _serve(self, connection):
+        """Read commands from one connection and schedule the replies"""
+        replies = collections.deque()
+        ready = threading.Condition()
+        writer = threading.Thread(target=self._write_replies, args=(connection, replies, ready), daemon=True)
+        writer.start()
+        device_free = time.perf_counter()
+        self._queue_reply(replies, ready, device_free + self.latency,
+                          f'hello VERSION:"{self.version}" NAME:{self.name} SERIAL:{self.serial}')
+        session = {'saving': None, 'commands': 0}
+        buffer = b''
+        try:
+            while True:
+                data = connection.recv(self._read_size)
+                if not data:
+                    break
+                buffer += data
+                while b'\x00' in buffer:
+                    command, buffer = buffer.split(b'\x00', 1)
+                    arrival = time.perf_counter() + self.latency
+                    self.arrivals.append((arrival, command.decode('utf-8', 'replace').strip()))
+                    device_free = max(device_free, arrival) + self.processing
+                    reply = self._reply(command.decode('utf-8', 'replace').strip(), session)
+                    session['commands'] += 1
+                    if self._random.random() >= self.drop_rate:
+                        send_at = device_free + self.latency + self._random.uniform(0, self.jitter)
+                        self._queue_reply(replies, ready, send_at, reply)
+                    if self.disconnect_after is not None and session['commands'] >= self.disconnect_after:
+                        raise ConnectionAbortedError()
+        except OSError:
+            pass
+        finally:
+            self._queue_reply(replies, ready, None, None)
+            writer.join()
+            self._close(connection)
+
+    @staticmethod
+    def _queue_reply(replies, ready, send_at, reply):
+        """Hand a reply to the writer thread, keeping replies in order"""
+        with ready:
+            if send_at is not None and len(replies) > 0 and replies[-1][0] is not None:
+                send_at = max(send_at, replies[-1][0])
+            replies.append((send_at, reply))
+            ready.notify()
+
+    def _write_replies(self, connection, replies, ready):
+        """Send each reply when it is due, in pieces if split is set"""
+        while True:
+            with ready:
+                while len(replies) == 0:
+                    ready.wait()
+                send_at, reply = replies.popleft()
+            if reply is None:
+                return
+            delay = send_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            data = reply.encode() + b'\r\n\x00'
+            step = self.split or len(data)
+            try:
+                for start in range(0, len(data), step):
+                    connection.sendall(data[start:start + step])
+            except OSError:
+                return
+
+    def _close(self, connection):
+        """Close a connection and forget it"""
+        with self._lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        connection.close()
+
+    def _reply(self, command, session):
+        """Act on a command and return the reply Line-us would send"""
+        with self._lock:
+            self.command_count += 1
+        fields = command.split()
+        code = fields[0].upper() if len(fields) > 0 else ''
+        if session['saving'] is not None:
+            if code == 'M29':
+                self.files[session['saving'][0]] = '\n'.join(session['saving'][1]) + '\n'
+                session['saving'] = None
+            else:
+                session['saving'][1].append(command)
+            return 'ok'
+        if code in ('G01', 'G1'):
+            self.position = self._move(fields[1:])
+            return self._position_reply()
+        if code == 'G28':
+            self.position = self._home
+            return self._position_reply()
+        if code == 'M114':
+            return self._position_reply()
+        if code == 'M122':
+            return self._info_reply()
+        if code == 'M20':
+            return f'ok FS:{self._file_system()}'
+        if code == 'M28':
+            match = re.search(r'S(\d+)', command)
+            if match is None or not 1 <= int(match.group(1)) <= 32:
+                return 'error M28 needs a file number S1 to S32'
+            session['saving'] = (int(match.group(1)), [])
+            return 'ok'
+        if code.startswith(('G', 'M')):
+            return 'ok'
+        return f'error Unknown command {command}'
+
+    def _move(self, parameters):
+        """Return the new pen position after a G01 with parameters"""
+        position = list(self.position)
+        for parameter in parameters:
+            axis = 'XYZ'.find(parameter[:1].upper())
+            if axis != -1:
+                try:
+                    position[axis] = float(parameter[1:])
+                except ValueError:
+                    pass
+        return tuple(position)
+
+    def _position_reply(self):
+        x, y, z = self.position
+        return f'ok X:{x:.2f} Y:{y:.2f} Z:{z:.2f}'
+
+    def _file_system(self):
+        """The file list in the format used by M20 and M122"""
+        return ''.join(f'/{number:07d}.txt-{len(content.encode())};'
+                       for number, content in sorted(self.files.items()))
+
+    def _info_reply(self):
+        used = sum(len(content.encode()) for content in self.files.values())
+        return (f'ok ChipID:{self.serial} WifiMode:1 WifiModeSet:0 WifisConfigured:1 MemDraw:0 Gestures:0 '
+                f'ContinuousDrawing:0 DrawingCount:{len(self.files)} name:{self.name} mac:5C:3A:E8:18:0A:60 '
+                f'FlashChipID:0x1640ef FlashChipMode:0 FlashChipSpeed:40000000 FreeHeap:25728 '
+                f'ResetReason:"External System" Uptime:0d0h0m0s FSUsed:{used} FSTotal:1953282 '
+                f'FSFree:{1953282 - used} FSPercent:{used * 100 // 1953282} FS:"{self._file_system()}" '
+                f'Serial:ikdBW+ Cal:10.79735,-1.902405,9.900639 ZMap:0;100;300;200 ServoReverse:0,0,1')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Run a Line-us emulator')
+    parser.add_argument('--name', default='line-us-emulator')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=LineUsEmulator._default_port)
+    parser.add_argument('--latency', type=float, default=0, help='one way network delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0, help='maximum extra random delay in seconds')
+    parser.add_argument('--processing', type=float, default=0, help='time spent on each command in seconds')
+    parser.add_argument('--split', type=int, default=None, help='send replies in pieces of this many bytes')
+    parser.add_argument('--drop-rate', type=float, default=0, help='chance that a reply is not sent')
+    parser.add_argument('--disconnect-after', type=int, default=None, help='close after this many commands')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    emulator = LineUsEmulator(name=args.name, host=args.host, port=args.port, latency=args.latency,
+                              jitter=args.jitter, processing=args.processing, split=args.split,
+                              drop_rate=args.drop_rate, disconnect_after=args.disconnect_after, seed=args.seed)
+    emulator.start()
+    print(f'Line-us emulator {args.name} listening on {args.host}:{emulator.port}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emulator.stop()
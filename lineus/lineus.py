@@ -1,12 +1,27 @@
 import socket
+import selectors
+import errno
 import shlex
 import re
 import zeroconf
 import netifaces
 import ipaddress
-import threading
 import time
 import statistics
+import collections
+import threading
+import hashlib
+from lineus.cache import DiscoveryCache, SlotManifest
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_end_of_gcode = object()
 
 
 class LineUs:
@@ -16,69 +31,194 @@ class LineUs:
 
         >>> my_line_us = LineUs()
 
-    It is worth creating the ``LineUs()`` object as early as possible in your code as the search for
-    machines begins as soon as the objet is created.
+    The Bonjour search for machines starts the first time it is needed (for example ``connect()`` without a
+    name) and is shared by every ``LineUs()`` object in your program. If you want to give it a head start call
+    ``start_discovery()`` as early as possible in your code. Connecting to a known name or ip address never
+    starts the search. Call ``close()`` when you have finished with the object to release the search.
+
+    Set ``cache`` to ``True``, a file path or a ``DiscoveryCache`` to remember the machines you connect to on
+    disk. ``connect()`` and ``slow_search()`` then try the last known addresses first.
+
+    The module keeps track of the pen position from the replies to ``G01``, ``G28`` and ``M114`` (see
+    ``get_position()``). Set ``skip_redundant`` to ``True`` to use it to avoid sending moves that would not
+    change anything. ``commands_saved`` counts the commands that were not sent.
     """
 
     _default_port = 1337
     _default_slow_search_timeout = .5
     _default_connect_timeout = 5
-    _default_thread_count = 20
-
-    def __init__(self):
+    _default_read_size = 4096
+    _default_stream_window = 4
+    _default_cache_timeout = 1
+    _home_position = (1000.0, 1000.0, 1000.0)
+    _pen_up_height = 500
+    _position_pattern = re.compile(r'X:(-?[\d.]+) Y:(-?[\d.]+) Z:(-?[\d.]+)')
+    _axis_pattern = re.compile(r'([XYZ])\s*(\S+)', re.IGNORECASE)
+
+    def __init__(self, cache=None, skip_redundant=False):
         self._line_us = None
         self._connected = False
         self._hello_message = None
+        self._read_buffer = bytearray()
+        self._read_offset = 0
         self.on_found_line_us_callback = None
-        self.zeroconf = zeroconf.Zeroconf()
-        self.listener = None
-        self.browser = None
+        self._discovery = None
+        self._last_connection = None
         self.line_us_name = None
         self.slow_line_us_list = []
         self.info = {}
         self.timeout = 0
-        self.listener = LineUsListener()
-        self.browser = zeroconf.ServiceBrowser(self.zeroconf, "_lineus._tcp.local.", self.listener)
+        self.position = None
+        self.skip_redundant = skip_redundant
+        self.commands_saved = 0
+        if cache is True:
+            cache = DiscoveryCache()
+        elif isinstance(cache, str):
+            cache = DiscoveryCache(cache)
+        self.cache = cache or None
+
+    @property
+    def listener(self):
+        """The shared ``LineUsListener``, starting the Bonjour search if it is not already running"""
+        self.start_discovery()
+        return self._discovery.listener
+
+    def start_discovery(self):
+        """
+        Start the Bonjour search for Line-us machines if it is not already running. The search is shared by
+        all ``LineUs()`` objects, so only the first call in your program does any work::
+
+            >>> my_line_us.start_discovery()
+
+        """
+        if self._discovery is None:
+            self._discovery = DiscoveryService.acquire()
+
+    def close(self):
+        """
+        Disconnect from the Line-us and release the Bonjour search. The search is shut down when the last
+        ``LineUs()`` object using it is closed. Returns ``True``.
+        """
+        self.disconnect()
+        if self._discovery is not None:
+            if self.on_found_line_us_callback is not None:
+                self._discovery.listener.remove_on_found_line_us(self.on_found_line_us_callback)
+                self.on_found_line_us_callback = None
+            self._discovery.release()
+            self._discovery = None
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
     def connect(self, line_us_name=None, wait=2, timeout=None):
         """
         Connect to a Line-us. If ``line_us_name`` is not specified then the module will connect to the first
-        Line-us that it finds. The Bonjour search starts when the LineUs object is created and it may take some
+        Line-us that it finds, starting the Bonjour search if it is not already running. It may take some
         time to discover the Line-us machines so the ``connect()`` function allows you to set a wait time (default 2s)
-        to allow discovery. A timeout for the TCP connection can also be set. The default is ``None``, so the connection
-        will wait forever. The simplest form of connect is::
+        to allow discovery. A timeout for the TCP connection can also be set. The default is ``None``, which uses a
+        5 second timeout. If the object has a discovery cache, the last known address of the Line-us (or, with no
+        name, of the most recently used Line-us) is tried first and checked against its hello message. The
+        simplest form of connect is::
 
             >>> my_line_us.connect()
 
         Returns ``True`` if the connection was successful.
         """
-        start_time = time.perf_counter()
+        if self.cache is not None and not isinstance(line_us_name, (list, tuple)):
+            if line_us_name is None:
+                # Only the most recent machine, so stale entries cannot hold up the Bonjour search
+                cached_line_us = self.cache.get_all()[:1]
+            else:
+                cached_line_us = [entry for entry in [self.cache.get(line_us_name)] if entry is not None]
+            for entry in cached_line_us:
+                if self._connect_cached(entry, line_us_name, timeout):
+                    return True
         if line_us_name is None:
-            while line_us_name is None:
-                line_us_name = self.listener.get_first_line_us()
-                if line_us_name is None and time.perf_counter() - start_time > wait:
-                    return False
+            line_us_name = self.listener.wait_for(timeout=wait)
+            if line_us_name is None:
+                return False
+        line_us_port = self._default_port
         if isinstance(line_us_name, (list, tuple)):
             line_us_ip = line_us_name[2]
+            if len(line_us_name) > 3:
+                line_us_port = line_us_name[3]
             line_us_name = line_us_name[0]
         else:
+            # A name is always looked up as given, so connecting by name really tests the name
             line_us_ip = line_us_name
+        if timeout is None:
+            timeout = self._default_connect_timeout
+        if not self._open(line_us_ip, line_us_port, line_us_name, timeout):
+            return False
+        self._remember()
+        return True
+
+    def _open(self, line_us_ip, line_us_port, line_us_name, timeout):
+        """Open the TCP connection and read the hello message"""
         self._line_us = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        if timeout is not None:
-            self._line_us.settimeout(timeout)
-        else:
-            self._line_us.settimeout(self._default_connect_timeout)
+        self._line_us.settimeout(timeout)
         try:
-            self._line_us.connect((line_us_ip, self._default_port))
+            self._line_us.connect((line_us_ip, line_us_port))
         except OSError:
             # print(error)
             self._line_us.close()
+            self._line_us = None
             return False
         self._connected = True
         self.line_us_name = line_us_name
-        self._hello_message = self._read_response()
+        self._last_connection = (line_us_ip, line_us_port, line_us_name)
+        self._read_buffer.clear()
+        self._read_offset = 0
+        self.position = None
+        try:
+            self._hello_message = self._read_response()
+        except OSError:
+            self.disconnect()
+            return False
         return True
 
+    def _connect_cached(self, entry, line_us_name, timeout):
+        """Try the cached address of a Line-us, checking that the hello message comes from the same machine"""
+        if not self._open(entry['address'], entry['port'], line_us_name or entry['name'],
+                          self._default_cache_timeout):
+            return False
+        hello = self.get_hello_string()
+        if hello is None or hello.get('NAME') != entry['name']:
+            self.disconnect()
+            return False
+        self._line_us.settimeout(timeout if timeout is not None else self._default_connect_timeout)
+        self._remember()
+        return True
+
+    def _remember(self):
+        """Record the connected Line-us in the discovery cache"""
+        if self.cache is None:
+            return
+        try:
+            hello = self.get_hello_string()
+        except (ValueError, IndexError):
+            return
+        if hello is not None and 'NAME' in hello:
+            line_us_ip, line_us_port = self._line_us.getpeername()[:2]
+            self.cache.add((hello['NAME'], f'{hello["NAME"]}.local', line_us_ip, line_us_port), self._hello_message)
+
+    def wait_for(self, line_us_name=None, timeout=2):
+        """
+        Wait up to ``timeout`` seconds for the Bonjour search to find a Line-us called ``line_us_name`` (its name,
+        Bonjour name or ip address), or any Line-us if no name is given. The function returns as soon as the
+        Line-us is announced::
+
+            >>> my_line_us.wait_for('line-us-dev', timeout=5)
+            ('line-us-dev', 'line-us-dev.local.', '192.168.27.223', 1337)
+
+        Returns the Line-us as a tuple that can be passed to ``connect()``, or ``None`` if it was not found in time.
+        """
+        return self.listener.wait_for(line_us_name, timeout)
+
     def set_timeout(self, timeout):
         """
         This function sets the TCP timeout in seconds for the TCP connection to your Line-us.
@@ -116,7 +256,8 @@ class LineUs:
         Returns an list with an element for each of the Line-us that the module has discovered. Each element
         in the list is a tuple of: ``(name, bonjour_name, ip_address)``. You can use either the bonjour_name or the
         ip_address in the ``connect()`` function to connect, although in most circumstances ip_address is a better
-        option as it saves a name lookup. You do not need to be connected to a Line-us to use this function::
+        option as it saves a name lookup. You do not need to be connected to a Line-us to use this function, but
+        the first call starts the Bonjour search so it may take a moment for machines to appear::
 
             >>> my_line_us = LineUs()
             >>> my_line_us.get_line_us_list()
@@ -158,19 +299,7 @@ class LineUs:
              'ServoReverse': '0,0,1'}
 
         """
-        info = {}
-        raw_info = self.send_gcode('M122', '')
-        fields = shlex.split(raw_info)
-        if fields.pop(0) != 'ok':
-            return None
-        else:
-            for field in fields:
-                if field.split(':')[0] == 'mac':
-                    info['mac'] = field[5:]
-                else:
-                    item = field.split(':')
-                    info[item[0]] = item[1]
-        return info
+        return self._parse_info(self.send_gcode('M122', ''))
 
     def get_hello_string(self):
         """
@@ -181,15 +310,8 @@ class LineUs:
             {'VERSION': '3.2.0 Nov 22 2019 11:28:36', 'NAME': 'line-us', 'SERIAL': '1575520'}
 
         """
-        hello_message = {}
         if self._connected:
-            fields = shlex.split(self._hello_message)
-            if fields.pop(0) != 'hello':
-                return None
-            for field in fields:
-                split_fields = field.split(':', 1)
-                hello_message[split_fields[0]] = split_fields[1]
-            return hello_message
+            return self._parse_hello(self._hello_message)
         else:
             return None
 
@@ -200,11 +322,36 @@ class LineUs:
         self._connected = False
         self._line_us = None
         self._hello_message = None
+        self._read_buffer.clear()
+        self._read_offset = 0
         self.line_us_name = None
         self.info = {}
         self.timeout = 0
+        self.position = None
         return True
 
+    def get_position(self):
+        """
+        Returns the pen position ``(x, y, z)`` from the last reply that reported it, or ``None`` if it is not
+        known, for example straight after connecting or after a GCode that moves the pen without reporting where
+        it went. Send ``M114`` to find out::
+
+            >>> my_line_us.send_gcode('M114')
+            'ok X:1000.00 Y:1000.00 Z:1000.00'
+            >>> my_line_us.get_position()
+            (1000.0, 1000.0, 1000.0)
+
+        """
+        return self.position
+
+    def _track(self, reply, gcode=''):
+        """Update the pen position from a reply, forgetting it if a G code moved the pen without saying where"""
+        match = self._position_pattern.search(reply) if reply.startswith('ok') else None
+        if match is not None:
+            self.position = (float(match.group(1)), float(match.group(2)), float(match.group(3)))
+        elif gcode.lstrip()[:1].upper() == 'G':
+            self.position = None
+
     def g01(self, x=None, y=None, z=None):
         """
         Send a G01 (interpolated move), and wait for the response before returning. One or more of x, y and z
@@ -218,21 +365,20 @@ class LineUs:
 
             ok X:1000.00 Y:0.00 Z:1000.00
 
+        With ``skip_redundant`` set a move to where the pen already is is not sent, and the reply is made up from
+        the known position.
         """
         if x is None and y is None and z is None:
             return False
-        cmd = b'G01 '
-        if x is not None:
-            cmd += b' X'
-            cmd += str(x).encode()
-        if y is not None:
-            cmd += b' Y'
-            cmd += str(y).encode()
-        if z is not None:
-            cmd += b' Z'
-            cmd += str(z).encode()
+        if self.skip_redundant and self.position is not None:
+            if all(value is None or float(value) == current for value, current in zip((x, y, z), self.position)):
+                self.commands_saved += 1
+                return 'ok X:%.2f Y:%.2f Z:%.2f' % self.position
+        cmd = self._g01_command(x, y, z)
         self._send_command(cmd)
-        return self._read_response()
+        reply = self._read_response()
+        self._track(reply, 'G01')
+        return reply
 
     def send_gcode(self, gcode, parameters=''):
         """
@@ -248,7 +394,9 @@ class LineUs:
         cmd += b' '
         cmd += parameters.encode()
         self._send_command(cmd)
-        return self._read_response()
+        reply = self._read_response()
+        self._track(reply, gcode)
+        return reply
 
     def send_raw_gcode(self, gcode):
         """
@@ -260,9 +408,290 @@ class LineUs:
         """
         cmd = gcode.encode()
         self._send_command(cmd)
-        return self._read_response()
+        reply = self._read_response()
+        self._track(reply, gcode)
+        return reply
 
-    def save_to_lineus(self, gcode, position):
+    def stream_gcode(self, gcode, window=None, on_result=None, on_error=None, skip_redundant=None, on_start=None):
+        """
+        Stream a sequence of GCodes to Line-us without waiting for each reply before sending the next one. Up to
+        ``window`` commands (default 4) are kept in flight at once, which hides most of the network round trip on
+        long drawings. ``gcode`` can be any iterable of GCode strings, such as a list or a generator, or a single
+        string with each GCode separated by ``\\n``::
+
+            >>> my_line_us.stream_gcode(['G28', 'G01 X1000 Y0 Z0', 'G01 X1000 Y500 Z0'], window=8)
+            {'sent': 3, 'errors': 0}
+
+        Replies are matched to commands in the order they were sent. For each command ``on_result(gcode, reply)``
+        is called if the reply starts with ``ok`` and ``on_error(gcode, reply)`` is called otherwise. All of the
+        replies are read before the function returns, so the connection can be used normally afterwards.
+
+        If ``skip_redundant`` is ``True`` (default: the ``skip_redundant`` setting of the object) the commands are
+        checked against the pen position as they are sent. ``G01`` moves that would not move the pen are dropped,
+        and a run of moves with the pen up is replaced by a single move to where the run ends::
+
+            >>> my_line_us.stream_gcode(['G01 X1000 Y0 Z1000', 'G01 X1200 Y0', 'G01 X1200 Y300', 'G01 Z0',
+            ...                          'G01 Z0', 'G01 X1300 Y300'], skip_redundant=True)
+            {'sent': 4, 'errors': 0, 'saved': 2}
+
+        ``on_start()`` is called once the first ``window`` commands are encoded and just before they are written
+        (or before returning if there is nothing to send). It can block to time the start of the stream, as
+        ``SyncCoordinator`` does to start several machines together.
+
+        The function returns a ``dict`` with the number of commands sent and the number of error replies, and
+        with ``skip_redundant`` the number of commands that were not sent.
+        """
+        if window is None:
+            window = self._default_stream_window
+        window = max(1, int(window))
+        if skip_redundant is None:
+            skip_redundant = self.skip_redundant
+        if isinstance(gcode, str):
+            gcode = gcode.splitlines()
+        commands = self._checked_gcode(gcode)
+        skipped = {'commands': 0}
+        if skip_redundant:
+            commands = self._without_redundant(commands, skipped)
+        in_flight = collections.deque()
+        sent = 0
+        errors = 0
+        exhausted = False
+        started = on_start is None
+        try:
+            while True:
+                batch = []
+                while not exhausted and len(in_flight) + len(batch) < window:
+                    command = next(commands, _end_of_gcode)
+                    if command is _end_of_gcode:
+                        exhausted = True
+                    elif command.strip() != '':
+                        batch.append(command)
+                encoded = [command.encode() for command in batch]
+                if not started:
+                    started = True
+                    on_start()
+                if len(batch) > 0:
+                    self._send_commands(encoded)
+                    # Only commands that have been written are waiting for a reply
+                    in_flight.extend(batch)
+                    sent += len(batch)
+                if len(in_flight) == 0:
+                    break
+                reply = self._read_response()
+                command = in_flight.popleft()
+                self._track(reply, command)
+                if reply.startswith('ok'):
+                    if on_result is not None:
+                        on_result(command, reply)
+                else:
+                    errors += 1
+                    if on_error is not None:
+                        on_error(command, reply)
+        except OSError:
+            raise
+        except BaseException:
+            # Keep the replies in step with the commands if we stop early
+            for _ in range(0, len(in_flight)):
+                self._read_response()
+            self.position = None
+            raise
+        if not skip_redundant:
+            return {'sent': sent, 'errors': errors}
+        self.commands_saved += skipped['commands']
+        return {'sent': sent, 'errors': errors, 'saved': skipped['commands']}
+
+    @staticmethod
+    def _checked_gcode(gcode):
+        """Iterate over gcode, raising TypeError for anything that is not a string"""
+        for command in gcode:
+            if not isinstance(command, str):
+                raise TypeError(f'GCode must be a string, not {type(command).__name__}')
+            yield command
+
+    def _without_redundant(self, commands, skipped):
+        """Drop G01 moves that go nowhere and all but the last of each run of pen up moves, counting them"""
+        position = self.position
+        held = None
+        for command in commands:
+            move = self._parse_move(command)
+            if move is None:
+                if held is not None:
+                    yield self._held_move(*held)
+                    held = None
+                yield command
+                code = command.split()[0].upper() if command.strip() != '' else ''
+                if code == 'G28':
+                    position = self._home_position
+                elif code.startswith('G'):
+                    position = None
+                continue
+            target = tuple(move.get(axis, position[i] if position is not None else None)
+                           for i, axis in enumerate('XYZ'))
+            if None in target:
+                target = None
+            elif target == position:
+                skipped['commands'] += 1
+                continue
+            elif position is not None and min(position[2], target[2]) >= self._pen_up_height:
+                if held is not None:
+                    skipped['commands'] += 1
+                    held = (command, target, held[2] + 1)
+                else:
+                    held = (command, target, 1)
+                position = target
+                continue
+            if held is not None:
+                yield self._held_move(*held)
+                held = None
+            yield command
+            position = target
+        if held is not None:
+            yield self._held_move(*held)
+
+    def _held_move(self, command, target, count):
+        """The move to send for a run of count pen up moves ending with command"""
+        if count == 1:
+            return command
+        return self._g01_command(*[int(value) if value.is_integer() else value for value in target]).decode()
+
+    @classmethod
+    def _parse_move(cls, command):
+        """The axes of a G01 command as a dict, or None if it is not a G01 that can be understood"""
+        fields = command.split(None, 1)
+        if len(fields) == 0 or fields[0].upper() not in ('G01', 'G1'):
+            return None
+        move = {}
+        parameters = fields[1] if len(fields) > 1 else ''
+        for axis, value in cls._axis_pattern.findall(parameters):
+            try:
+                move[axis.upper()] = float(value)
+            except ValueError:
+                return None
+        if len(cls._axis_pattern.sub('', parameters).strip()) > 0:
+            return None
+        return move
+
+    def g01_path(self, points, z=None, window=None, on_result=None, on_error=None, skip_redundant=None):
+        """
+        Send a whole path of G01 moves from an ``(N, 2)`` or ``(N, 3)`` array of points (a NumPy array or anything
+        NumPy can convert). If ``z`` is given every move uses that z. The path is encoded into a single buffer,
+        with ``%d`` formatting for integer arrays and two decimal places otherwise, and streamed like
+        ``stream_gcode()`` with up to ``window`` moves in flight::
+
+            >>> path = numpy.array([(900, 300), (900, -300), (1200, -300)])
+            >>> my_line_us.g01_path(path, z=0)
+            {'sent': 3, 'errors': 0}
+
+        Each write sends every move that the window has room for, and all replies are read before the function
+        returns. ``on_result(gcode, reply)`` and ``on_error(gcode, reply)`` and ``skip_redundant`` work as for
+        ``stream_gcode()``, with redundant rows removed from the array before it is encoded. This function needs
+        NumPy.
+        """
+        if numpy is None:
+            raise ImportError('g01_path needs NumPy, install it with pip install lineus[numpy]')
+        if skip_redundant is None:
+            skip_redundant = self.skip_redundant
+        saved = 0
+        if skip_redundant:
+            rows = numpy.asarray(points)
+            if z is not None and rows.ndim == 2:
+                rows = numpy.column_stack((rows[:, :2], numpy.full(len(rows), z, dtype=numpy.result_type(rows, z))))
+                z = None
+            points = self._without_redundant_rows(rows)
+            saved = len(rows) - len(points)
+            self.commands_saved += saved
+        buffer, ends = self._encode_path(points, z)
+        if window is None:
+            window = self._default_stream_window
+        window = max(1, int(window))
+        count = len(ends)
+        starts = [0] + ends[:-1]
+        sent = 0
+        received = 0
+        errors = 0
+        reply = None
+        view = memoryview(buffer)
+        try:
+            while received < count:
+                if sent < count and sent - received < window:
+                    last = min(count, received + window)
+                    self._line_us.sendall(view[starts[sent]:ends[last - 1]])
+                    sent = last
+                # Read every reply that has already arrived before sending more
+                while True:
+                    reply = self._read_response()
+                    if on_result is not None or on_error is not None:
+                        gcode = bytes(view[starts[received]:ends[received] - 1]).decode()
+                    else:
+                        gcode = None
+                    received += 1
+                    if reply.startswith('ok'):
+                        if on_result is not None:
+                            on_result(gcode, reply)
+                    else:
+                        errors += 1
+                        if on_error is not None:
+                            on_error(gcode, reply)
+                    if received == sent or not self._response_waiting():
+                        break
+        except OSError:
+            raise
+        except BaseException:
+            # Keep the replies in step with the commands if we stop early
+            for _ in range(received, sent):
+                self._read_response()
+            self.position = None
+            raise
+        if reply is not None:
+            self._track(reply, 'G01')
+        if not skip_redundant:
+            return {'sent': count, 'errors': errors}
+        return {'sent': count, 'errors': errors, 'saved': saved}
+
+    def _without_redundant_rows(self, rows):
+        """The rows of a path without the moves that _without_redundant() would drop"""
+        if rows.ndim != 2 or rows.shape[1] not in (2, 3) or len(rows) == 0:
+            return rows
+        start = numpy.full((1, rows.shape[1]), numpy.nan)
+        if self.position is not None:
+            start[0] = self.position[:rows.shape[1]]
+        previous = numpy.concatenate((start, rows[:-1]))
+        rows = rows[numpy.any(rows != previous, axis=1)]
+        if rows.shape[1] == 2 or len(rows) == 0:
+            return rows
+        with numpy.errstate(invalid='ignore'):
+            up = numpy.concatenate(([start[0, 2]], rows[:, 2])) >= self._pen_up_height
+        # A pen up move can go if the move after it is also a pen up move
+        travel = up[1:] & up[:-1]
+        keep = numpy.ones(len(rows), dtype=bool)
+        keep[:-1] = ~(travel[:-1] & travel[1:])
+        return rows[keep]
+
+    @staticmethod
+    def _encode_path(points, z=None):
+        """Encode an array of points as null terminated G01 commands, returning the buffer and command end offsets"""
+        rows = numpy.asarray(points)
+        if rows.ndim != 2 or rows.shape[1] not in (2, 3):
+            raise ValueError('points must be an (N, 2) or (N, 3) array')
+        if z is not None:
+            rows = numpy.column_stack((rows[:, :2], numpy.full(len(rows), z, dtype=numpy.result_type(rows, z))))
+        if numpy.issubdtype(rows.dtype, numpy.integer):
+            number = b'%d'
+        else:
+            number = b'%.2f'
+        command = b'G01 X' + number + b' Y' + number
+        if rows.shape[1] == 3:
+            command += b' Z' + number
+        command += b'\x00'
+        buffer = bytearray((command * len(rows)) % tuple(rows.ravel().tolist()))
+        ends = (numpy.flatnonzero(numpy.frombuffer(buffer, dtype=numpy.uint8) == 0) + 1).tolist()
+        return buffer, ends
+
+    def _response_waiting(self):
+        """True if a complete reply is already in the receive buffer"""
+        return self._read_buffer.find(b'\x00', self._read_offset) != -1
+
+    def save_to_lineus(self, gcode, position, window=None, progress=None, verify=False, retries=0):
         """
         Save a drawing to the Line-us internal memory. The ``position`` parameter is the file numebr to save to
         and must be between 1 and 32. The ``gcode`` parameter is a string with the entrie gcode
@@ -271,13 +700,132 @@ class LineUs:
             >>> gcode = 'G28\\nG01 X1000 Y0\\nG01 X1000  Y1000\\n'
             >>> my_line_us.save_to_lineus(gcode, 2)
 
-        The function returns ``ok``
+        ``gcode`` can also be a list or any other iterable of GCode lines. The lines are streamed to Line-us with
+        up to ``window`` lines in flight (see ``stream_gcode()``) and ``progress(lines_saved, total_lines)`` is
+        called as each line is saved with an ``ok`` reply (``total_lines`` is ``None`` if ``gcode`` is an
+        iterator). If ``verify`` is ``True`` the size of the saved file is checked with ``list_lineus_files()``
+        afterwards.
+
+        If the connection drops, the function reconnects and saves the drawing again up to ``retries`` times.
+        Line-us starts the file afresh on ``M28``, so the upload restarts from the first line. Retries need
+        ``gcode`` to be a string or a list.
+
+        The function returns ``ok``, or ``None`` if Line-us sent an error reply to any line or the saved file did
+        not verify.
         """
+        if isinstance(gcode, str):
+            gcode = gcode.splitlines()
+        if isinstance(gcode, (list, tuple)):
+            total = sum(1 for line in gcode if line.strip() != '')
+        else:
+            total = None
+            retries = 0
+        attempt = 0
+        while True:
+            try:
+                size, errors = self._save_lines(gcode, position, window, progress, total)
+                break
+            except OSError:
+                if attempt >= retries or not self._reconnect():
+                    raise
+                attempt += 1
+        if errors > 0:
+            return None
+        if verify:
+            for file_number, file_size, file_name in self.list_lineus_files() or []:
+                if file_number == str(position):
+                    return 'ok' if int(file_size) == size else None
+            return None
+        return 'ok'
+
+    def _save_lines(self, lines, position, window, progress, total):
+        """Stream lines into file position, returning the expected size of the file and the number of errors"""
+        saved = {'lines': 0, 'size': 0, 'errors': 0}
+
+        def on_result(line, reply):
+            saved['lines'] += 1
+            saved['size'] += len(line.encode()) + 1
+            if progress is not None:
+                progress(saved['lines'], total)
+
+        def on_error(line, reply):
+            saved['errors'] += 1
+
         self.send_gcode('M28', f'S{position}')
-        for line in gcode.splitlines():
-            self.send_raw_gcode(line)
+        try:
+            self.stream_gcode(lines, window=window, on_result=on_result, on_error=on_error, skip_redundant=False)
+        except OSError:
+            raise
+        except BaseException:
+            # The connection still works, so leave save mode or every later command goes into the file
+            self.send_gcode('M29')
+            raise
         self.send_gcode('M29')
-        return 'ok'
+        return saved['size'], saved['errors']
+
+    def _reconnect(self):
+        """Open a new connection to the Line-us we were last connected to"""
+        if self._last_connection is None:
+            return False
+        timeout = self._line_us.gettimeout() if self._line_us is not None else self._default_connect_timeout
+        self.disconnect()
+        return self._open(*self._last_connection, timeout)
+
+    def sync_drawings(self, drawings, manifest=None, window=None, verify=False, progress=None):
+        """
+        Make the drawings saved on the connected Line-us match ``drawings``, a ``dict`` of file number to GCode (a
+        string or list of lines as for ``save_to_lineus()``). A manifest of the SHA-256 hash of the drawing saved
+        in each slot is kept on disk for each machine, and only slots whose drawing has changed, or whose size on
+        Line-us no longer matches, are saved. If nothing has changed the only command sent is ``M20``::
+
+            >>> my_line_us.sync_drawings({1: open('flower.gcode').read(), 2: open('house.gcode').read()})
+            {'saved': [2], 'unchanged': [1]}
+
+        ``manifest`` can be a ``SlotManifest`` or a file path (default ``~/.lineus/manifest.json``).
+        ``progress(file_number, lines_saved, total_lines)`` is called as each saved drawing is uploaded.
+        """
+        if manifest is None or isinstance(manifest, str):
+            manifest = SlotManifest(manifest)
+        machine_id = self._machine_id()
+        stored_sizes = {}
+        for file_number, file_size, file_name in self.list_lineus_files() or []:
+            stored_sizes[file_number] = int(file_size)
+        result = {'saved': [], 'unchanged': []}
+        for position, gcode in sorted(drawings.items()):
+            lines = [line for line in (gcode.splitlines() if isinstance(gcode, str) else gcode) if line.strip() != '']
+            digest, size = self._digest(lines)
+            entry = manifest.get(machine_id, position)
+            if entry is not None and entry['hash'] == digest and stored_sizes.get(str(position)) == size:
+                result['unchanged'].append(position)
+                continue
+            manifest.forget(machine_id, position)
+            file_progress = None
+            if progress is not None:
+                file_progress = (lambda saved, total, number=position: progress(number, saved, total))
+            if self.save_to_lineus(lines, position, window=window, verify=verify, progress=file_progress) == 'ok':
+                manifest.set(machine_id, position, digest, size)
+                result['saved'].append(position)
+            manifest.save()
+        return result
+
+    def _machine_id(self):
+        """The serial number of the connected Line-us, from the hello message or M122"""
+        hello = self.get_hello_string()
+        if hello is not None and 'SERIAL' in hello:
+            return hello['SERIAL']
+        info = self.get_info() or {}
+        return info.get('ChipID', info.get('Serial'))
+
+    @staticmethod
+    def _digest(lines):
+        """The SHA-256 hash of lines and the size Line-us stores them in"""
+        digest = hashlib.sha256()
+        size = 0
+        for line in lines:
+            data = line.encode() + b'\n'
+            digest.update(data)
+            size += len(data)
+        return digest.hexdigest(), size
 
     def list_lineus_files(self):
         """
@@ -288,8 +836,55 @@ class LineUs:
             [('1', '109291', '/0000001.txt'), ('2', '51765', '/0000002.txt')]
 
         """
+        return self._parse_file_list(self.send_gcode('M20'))
+
+    @staticmethod
+    def _g01_command(x=None, y=None, z=None):
+        """Build a G01 command from the coordinates that are not None"""
+        cmd = b'G01 '
+        if x is not None:
+            cmd += b' X'
+            cmd += str(x).encode()
+        if y is not None:
+            cmd += b' Y'
+            cmd += str(y).encode()
+        if z is not None:
+            cmd += b' Z'
+            cmd += str(z).encode()
+        return cmd
+
+    @staticmethod
+    def _parse_hello(raw_hello):
+        """Parse the hello message sent by Line-us on connection into a dict"""
+        hello_message = {}
+        fields = shlex.split(raw_hello)
+        if fields.pop(0) != 'hello':
+            return None
+        for field in fields:
+            split_fields = field.split(':', 1)
+            hello_message[split_fields[0]] = split_fields[1]
+        return hello_message
+
+    @staticmethod
+    def _parse_info(raw_info):
+        """Parse the reply to M122 into a dict"""
+        info = {}
+        fields = shlex.split(raw_info)
+        if fields.pop(0) != 'ok':
+            return None
+        else:
+            for field in fields:
+                if field.split(':')[0] == 'mac':
+                    info['mac'] = field[5:]
+                else:
+                    item = field.split(':')
+                    info[item[0]] = item[1]
+        return info
+
+    @staticmethod
+    def _parse_file_list(raw_info):
+        """Parse the reply to M20 into a list of (file_number, size, file_name)"""
         info = []
-        raw_info = self.send_gcode('M20')
         fields = shlex.split(raw_info)
         if fields.pop(0) != 'ok':
             return None
@@ -310,27 +905,47 @@ class LineUs:
         return info
 
     def _read_response(self):
-        """Read from the socket one byte at a time until we get a null"""
-        line = b''
+        """Read the next null terminated reply from Line-us, buffering anything that arrives after it"""
+        buffer = self._read_buffer
         while True:
-            char = self._line_us.recv(1)
-            if char != b'\x00':
-                line += char
-            elif char == b'\x00':
+            end = buffer.find(b'\x00', self._read_offset)
+            if end != -1:
                 break
-        # print(f'R:{line.decode("utf - 8")}')
-        while line[-1] in (10, 13, 0):
-            line = line[:-1]
-        return line.decode('utf-8')
+            chunk = self._line_us.recv(self._default_read_size)
+            if not chunk:
+                raise ConnectionError('Line-us closed the connection')
+            buffer += chunk
+        start = self._read_offset
+        stop = end
+        while stop > start and buffer[stop - 1] in (10, 13):
+            stop -= 1
+        line = buffer[start:stop].decode('utf-8')
+        self._read_offset = end + 1
+        if self._read_offset == len(buffer):
+            buffer.clear()
+            self._read_offset = 0
+        elif self._read_offset > self._default_read_size:
+            del buffer[:self._read_offset]
+            self._read_offset = 0
+        # print(f'R:{line}')
+        return line
 
     def _send_command(self, command):
         """Send the command to Line-us"""
         # print(f'S:{command}')
         command += b'\x00'
-        self._line_us.send(command)
+        self._line_us.sendall(command)
+
+    def _send_commands(self, commands):
+        """Send several commands to Line-us in a single write"""
+        self._line_us.sendall(b'\x00'.join(commands) + b'\x00')
 
     def on_found_line_us(self, callback):
-        self.listener.on_found_line_us(callback)
+        listener = self.listener
+        if self.on_found_line_us_callback is not None:
+            listener.remove_on_found_line_us(self.on_found_line_us_callback)
+        self.on_found_line_us_callback = callback
+        listener.on_found_line_us(callback)
 
     def ping(self, line_us_name, count=5):
         """
@@ -364,114 +979,366 @@ class LineUs:
     def get_network_list():
         return NetFinder().get_network_list()
 
-    def slow_search(self, network=None, return_first=True, timeout=None):
+    def slow_search(self, network=None, return_first=True, timeout=None, callback=None, prefer=None, near=None):
+        """
+        Search for Line-us machines by trying to connect to port 1337 on every address of your local networks.
+        This is much slower than the Bonjour search but will find machines on networks where Bonjour does not
+        work. ``network`` is the index of a network from ``get_network_list()`` (default all networks) and
+        ``timeout`` is the time in seconds to wait for each address to answer. If ``callback`` is set it is called
+        with each Line-us as soon as it is found. Addresses are generated as the search goes, so it starts
+        straight away even on large networks. ``prefer`` is a list of addresses to try first and ``near`` can be
+        ``'gateway'`` or an ip address to search outwards from (see ``NetFinder.get_all_ips()``). Addresses from
+        the discovery cache are always tried first::
+
+            >>> my_line_us.slow_search(return_first=False)
+            [('line-us-dev', 'line-us-dev.local', '192.168.27.223', 1337)]
+
+        Returns a list of the Line-us found, stopping at the first one if ``return_first`` is ``True``.
+        """
         self.slow_line_us_list = []
         if timeout is None:
-            self.timeout = self._default_slow_search_timeout
+            timeout = self._default_slow_search_timeout
         nets = NetFinder()
         if network is not None:
             net_list = nets.get_network_list()
-            if network > len(net_list):
+            if network >= len(net_list):
                 return []
-        thread_count = self._default_thread_count
-        ip_list = []
-        for i in range(0, thread_count):
-            ip_list.append([])
-        counter = 0
-        for ip in nets.get_all_ips(interface=network):
-            ip_list[counter].append(ip)
-            counter += 1
-            if counter == thread_count:
-                counter = 0
-        thread_list = []
-        for thread_id in range(0, thread_count):
-            thread = SlowSearchThread(ip_list[thread_id], return_first=return_first, timeout=timeout)
-            thread_list.append(thread)
-            thread.start()
-        for thread in thread_list:
-            thread.join()
-            if len(thread.get_list()) > 0:
-                self.slow_line_us_list.extend(thread.get_list())
+        if self.cache is not None:
+            prefer = [entry['address'] for entry in self.cache.get_all()] + list(prefer or [])
+        scanner = LineUsScanner(timeout=timeout)
+        for line_us, hello in scanner.scan(nets.get_all_ips(interface=network, prefer=prefer, near=near),
+                                           with_hello=True):
+            self.slow_line_us_list.append(line_us)
+            if self.cache is not None:
+                self.cache.add(line_us, hello)
+            if callback is not None:
+                callback(line_us)
+            if return_first:
+                break
         return self.slow_line_us_list
 
 
-class SlowSearchThread(threading.Thread):
+class LineUsScanner:
+    """
+    Sweeps a list of ip addresses for Line-us using non-blocking sockets. Hundreds of connections are kept in
+    progress at once and the hello message is only read from addresses that accept the connection. Results are
+    yielded as soon as they are found::
+
+        >>> scanner = LineUsScanner(timeout=.5)
+        >>> for line_us in scanner.scan(NetFinder().get_all_ips()):
+        ...     print(line_us)
+        ('line-us-dev', 'line-us-dev.local', '192.168.27.223', 1337)
+
+    ``concurrency`` is capped at half of the process's open file limit. If the process still runs out of file
+    descriptors the scanner waits for some of the connections in progress to finish before starting more.
+    """
 
     _default_port = 1337
+    _default_concurrency = 256
+    _default_read_size = 256
 
-    def __init__(self, search_list, timeout, return_first=True):
-        threading.Thread.__init__(self)
-        self.search_list = search_list
-        self.return_first = return_first
+    def __init__(self, timeout=.5, concurrency=None, port=None):
         self.timeout = timeout
-        self.found_line_us = []
+        self.concurrency = concurrency if concurrency is not None else self._default_concurrency
+        if resource is not None:
+            # Leave room for the files and sockets the rest of the program has open
+            soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+            if soft_limit != resource.RLIM_INFINITY:
+                self.concurrency = max(1, min(self.concurrency, soft_limit // 2))
+        self.port = port if port is not None else self._default_port
+
+    def scan(self, ips, with_hello=False):
+        """
+        A generator that yields a ``(name, bonjour_name, ip_address, port)`` tuple for each Line-us found in
+        ``ips``, or a ``(line_us, hello_message)`` pair if ``with_hello`` is ``True``. Addresses are taken from
+        ``ips`` only as connection slots become free, so the number of addresses held at once is bounded by
+        ``concurrency`` and ``ips`` can be a lazy generator.
+        """
+        selector = selectors.DefaultSelector()
+        ips = iter(ips)
+        exhausted = False
+        held = None
+        try:
+            while True:
+                while (held is not None or not exhausted) and len(selector.get_map()) < self.concurrency:
+                    ip = held if held is not None else next(ips, None)
+                    held = None
+                    if ip is None:
+                        exhausted = True
+                        continue
+                    try:
+                        self._start_probe(selector, str(ip))
+                    except OSError as error:
+                        if error.errno not in (errno.EMFILE, errno.ENFILE) or len(selector.get_map()) == 0:
+                            raise
+                        # Out of file descriptors, so try again once some of the probes in progress finish
+                        held = ip
+                        break
+                if len(selector.get_map()) == 0:
+                    break
+                now = time.perf_counter()
+                deadline = min(key.data['deadline'] for key in selector.get_map().values())
+                for key, mask in selector.select(max(0, deadline - now)):
+                    found = self._service_probe(selector, key)
+                    if found is not None:
+                        yield found if with_hello else found[0]
+                now = time.perf_counter()
+                for key in list(selector.get_map().values()):
+                    if key.data['deadline'] <= now:
+                        self._end_probe(selector, key.fileobj)
+        finally:
+            for key in list(selector.get_map().values()):
+                self._end_probe(selector, key.fileobj)
+            selector.close()
+
+    def _start_probe(self, selector, ip):
+        """Begin a non-blocking connection to ip"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        result = sock.connect_ex((ip, self.port))
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            sock.close()
+            return
+        probe = {'ip': ip, 'connected': False, 'buffer': b'', 'deadline': time.perf_counter() + self.timeout}
+        selector.register(sock, selectors.EVENT_WRITE, probe)
+
+    def _service_probe(self, selector, key):
+        """Advance a probe that is ready, returning the Line-us and its hello message once they are complete"""
+        sock = key.fileobj
+        probe = key.data
+        if not probe['connected']:
+            if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+                self._end_probe(selector, sock)
+                return None
+            probe['connected'] = True
+            probe['deadline'] = time.perf_counter() + self.timeout
+            selector.modify(sock, selectors.EVENT_READ, probe)
+            return None
+        try:
+            data = sock.recv(self._default_read_size)
+        except BlockingIOError:
+            return None
+        except OSError:
+            data = b''
+        if not data:
+            self._end_probe(selector, sock)
+            return None
+        probe['buffer'] += data
+        if b'\x00' not in probe['buffer']:
+            return None
+        self._end_probe(selector, sock)
+        raw_hello = probe['buffer'].split(b'\x00', 1)[0].rstrip(b'\r\n').decode('utf-8', 'replace')
+        try:
+            hello = LineUs._parse_hello(raw_hello)
+        except (ValueError, IndexError):
+            return None
+        if hello is None or 'NAME' not in hello:
+            return None
+        return (hello['NAME'], f'{hello["NAME"]}.local', probe['ip'], self.port), raw_hello
+
+    @staticmethod
+    def _end_probe(selector, sock):
+        """Stop watching and close a probe socket"""
+        selector.unregister(sock)
+        sock.close()
+
 
-    def run(self):
-        line_us_object = LineUs()
-        for ip in self.search_list:
-            # print(ip)
-            if line_us_object.connect(str(ip), timeout=self.timeout):
-                hello = line_us_object.get_hello_string()
-                line_us_object.disconnect()
-                line_us = (hello['NAME'], f'{hello["NAME"]}.local', str(ip), self._default_port)
-                self.found_line_us.append(line_us)
-                if self.return_first:
-                    return
+class DiscoveryService:
+    """
+    The Bonjour search for Line-us machines, shared by every ``LineUs()`` object in the process. Use
+    ``DiscoveryService.acquire()`` to get the running search, starting it if needed, and ``release()`` when you
+    have finished with it. The Zeroconf browser is closed when the last reference is released. Creating a
+    ``DiscoveryService()`` directly starts a separate search of its own, which is stopped with ``close()``.
+    """
 
-    def get_list(self):
-        return self.found_line_us
+    _service_type = '_lineus._tcp.local.'
+    _lock = threading.Lock()
+    _instance = None
+
+    def __init__(self):
+        self._references = 0
+        self.listener = LineUsListener()
+        self.zeroconf = zeroconf.Zeroconf()
+        self.browser = zeroconf.ServiceBrowser(self.zeroconf, self._service_type, self.listener)
+
+    @classmethod
+    def acquire(cls):
+        """Return the shared search, starting it if it is not running, and take a reference to it"""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            cls._instance._references += 1
+            return cls._instance
+
+    def release(self):
+        """Drop a reference to the search, shutting it down if this was the last one"""
+        with self._lock:
+            self._references -= 1
+            if self._references > 0:
+                return
+            if DiscoveryService._instance is self:
+                DiscoveryService._instance = None
+        self.close()
+
+    def close(self):
+        """Shut down the search. Use this instead of ``release()`` for a search made with ``DiscoveryService()``."""
+        self.browser.cancel()
+        self.zeroconf.close()
 
 
 class LineUsListener:
+    """
+    Keeps track of the Line-us machines announced by Bonjour. Machines are indexed by Bonjour service, name,
+    Bonjour name and ip address so lookups do not scan a list, and all access is protected by a lock because
+    Zeroconf calls ``add_service()``, ``update_service()`` and ``remove_service()`` from its own thread.
+    """
 
     def __init__(self):
-        self.on_found_line_us_callback = None
-        self.line_us_list = []
+        self.on_found_line_us_callbacks = []
+        self.on_updated_line_us_callbacks = []
+        self._lock = threading.RLock()
+        self._found = threading.Condition(self._lock)
+        self._services = {}
+        self._index = {}
 
     def remove_service(self, zconf, service_type, name):
-        info = zconf.get_service_info(service_type, name)
-        line_us_name = info.server.split('.')[0]
-        line_us = (line_us_name, info.server, socket.inet_ntoa(info.address), info.port)
-        self.line_us_list.remove(line_us)
-        print(f'Service {name} removed')
+        with self._lock:
+            record = self._services.pop(name, None)
+            if record is not None:
+                self._unindex(name, record)
+        # print(f'Service {name} removed')
 
     def add_service(self, zconf, service_type, name):
         info = zconf.get_service_info(service_type, name)
-        line_us_name = info.server.split('.')[0]
+        if info is None:
+            return
+        with self._found:
+            is_new = name not in self._services
+            line_us = self._store(name, info)
+            self._found.notify_all()
+        # print(f'Found Line-us: {line_us[0]} at: {line_us[2]} port {line_us[3]}')
+        if is_new:
+            for callback in list(self.on_found_line_us_callbacks):
+                callback(line_us)
 
+    def update_service(self, zconf, service_type, name):
+        info = zconf.get_service_info(service_type, name)
+        if info is None:
+            return
+        with self._found:
+            line_us = self._store(name, info)
+            self._found.notify_all()
+        for callback in list(self.on_updated_line_us_callbacks):
+            callback(line_us)
+
+    def _store(self, service, info):
+        """Add or replace the record for service, re-indexing it if the name or address changed"""
+        line_us_name = info.server.split('.')[0]
         if hasattr(info, 'address'):
             address = socket.inet_ntoa(info.address)
         else:
             address = socket.inet_ntoa(info.addresses[0])
         line_us = (line_us_name, info.server, address, info.port)
-        # print(f'Found Line-us: {line_us[0]} at: {line_us[2]} port {line_us[3]}')
-        self.line_us_list.append(line_us)
-        if self.on_found_line_us_callback is not None:
-            self.on_found_line_us_callback(line_us)
+        old_record = self._services.get(service)
+        if old_record is not None:
+            self._unindex(service, old_record)
+        self._services[service] = {'line_us': line_us, 'last_seen': time.time()}
+        for key in self._keys(line_us):
+            self._index[key] = service
+        return line_us
+
+    def _unindex(self, service, record):
+        """Remove the index entries that point at service"""
+        for key in self._keys(record['line_us']):
+            if self._index.get(key) == service:
+                del self._index[key]
 
-    def update_service(self, *args):
-        pass
+    @staticmethod
+    def _keys(line_us):
+        """The names a Line-us can be looked up by"""
+        return {line_us[0], line_us[1], line_us[1].rstrip('.'), line_us[2]}
 
     def on_found_line_us(self, callback):
-        self.on_found_line_us_callback = callback
+        self.on_found_line_us_callbacks.append(callback)
+
+    def remove_on_found_line_us(self, callback):
+        if callback in self.on_found_line_us_callbacks:
+            self.on_found_line_us_callbacks.remove(callback)
+
+    def on_updated_line_us(self, callback):
+        """Call ``callback(line_us)`` each time a Line-us that is already known is announced again"""
+        self.on_updated_line_us_callbacks.append(callback)
+
+    def remove_on_updated_line_us(self, callback):
+        if callback in self.on_updated_line_us_callbacks:
+            self.on_updated_line_us_callbacks.remove(callback)
 
     def get_first_line_us(self):
-        if len(self.line_us_list) > 0:
-            return self.line_us_list[0]
-        else:
+        with self._lock:
+            for record in self._services.values():
+                return record['line_us']
             return None
 
-    def get_line_us(self, number):
-        return self.line_us_list[number]
+    def get_line_us(self, line_us_name):
+        """
+        Look up a Line-us by name, Bonjour name or ip address, returning its tuple or ``None``. For backwards
+        compatibility an integer returns the Line-us at that position in ``get_line_us_list()``.
+        """
+        if isinstance(line_us_name, int):
+            return self.get_line_us_list()[line_us_name]
+        with self._lock:
+            service = self._index.get(line_us_name)
+            if service is None:
+                return None
+            return self._services[service]['line_us']
+
+    def get_last_seen(self, line_us_name):
+        """Returns the time.time() at which a Line-us was last announced, or None if it is not known"""
+        with self._lock:
+            service = self._index.get(line_us_name)
+            if service is None:
+                return None
+            return self._services[service]['last_seen']
 
     def get_line_us_list(self):
-        return self.line_us_list
+        with self._lock:
+            return [record['line_us'] for record in self._services.values()]
+
+    @property
+    def line_us_list(self):
+        """A copy of ``get_line_us_list()``, kept for backwards compatibility. Use ``get_line_us_list()`` instead."""
+        return self.get_line_us_list()
+
+    def snapshot(self):
+        """
+        Returns a consistent copy of the registry as a list of dicts with ``name``, ``server``, ``address``,
+        ``port`` and ``last_seen`` for each Line-us, in the order they were found.
+        """
+        with self._lock:
+            return [{'name': record['line_us'][0], 'server': record['line_us'][1], 'address': record['line_us'][2],
+                     'port': record['line_us'][3], 'last_seen': record['last_seen']}
+                    for record in self._services.values()]
+
+    def wait_for(self, line_us_name=None, timeout=None):
+        """Block until a matching Line-us is found or timeout expires, returning it or None"""
+        with self._found:
+            line_us = self._found.wait_for(lambda: self._find(line_us_name), timeout)
+        return line_us or None
+
+    def _find(self, line_us_name=None):
+        """Return the first Line-us, or the one matching line_us_name"""
+        if line_us_name is None:
+            return self.get_first_line_us()
+        return self.get_line_us(line_us_name)
 
 
 class NetFinder:
 
     def __init__(self):
         self.network_list = []
+        gateways = {}
+        for gateway in netifaces.gateways().get(netifaces.AF_INET, []):
+            gateways.setdefault(gateway[1], gateway[0])
         interfaces = netifaces.interfaces()
         for interface in interfaces:
             if netifaces.ifaddresses(interface) is not None and netifaces.AF_INET in netifaces.ifaddresses(interface):
@@ -480,6 +1347,8 @@ class NetFinder:
                 for field in ('addr', 'netmask', 'broadcast'):
                     if field in this_interface:
                         this_interface_detail[field] = this_interface[field]
+                if interface in gateways:
+                    this_interface_detail['gateway'] = gateways[interface]
                 if 'addr' in this_interface_detail and 'netmask' in this_interface_detail:
                     if 'broadcast' in this_interface_detail:
                         if not this_interface_detail['addr'].startswith('127'):
@@ -488,20 +1357,60 @@ class NetFinder:
     def get_network_list(self):
         return self.network_list
 
-    def get_all_ips(self, interface=None):
-        ips = []
+    def get_all_ips(self, interface=None, prefer=None, near=None):
+        """
+        A generator of the host addresses on each network, or just network number ``interface``. Addresses are
+        produced one at a time so nothing is built up front, however large the network. Any addresses in
+        ``prefer`` (for example recently seen Line-us) that are on the networks come first. Then, if ``near`` is
+        ``'gateway'`` or an ip address, hosts are ordered outwards from it, otherwise in address order.
+        """
         if interface is None:
             interface_list = self.network_list
         else:
             interface_list = [self.network_list[interface]]
+        networks = []
         for interface in interface_list:
             addr = interface['addr']
             netmask_bits = self.netmask_to_cidr(interface['netmask'])
             # print(f'{addr} - {netmask_bits}')
-            network = ipaddress.ip_network(f'{addr}/{netmask_bits}', strict=False)
-            for host in network.hosts():
-                ips.append(host)
-        return ips
+            networks.append((interface, ipaddress.ip_network(f'{addr}/{netmask_bits}', strict=False)))
+        preferred = set()
+        for ip in prefer or []:
+            try:
+                ip = ipaddress.ip_address(str(ip))
+            except ValueError:
+                continue
+            if ip not in preferred and any(ip in network for interface, network in networks):
+                preferred.add(ip)
+                yield ip
+        for interface, network in networks:
+            if near == 'gateway':
+                anchor = interface.get('gateway', interface['addr'])
+            else:
+                anchor = near
+            for host in self._ordered_hosts(network, anchor):
+                if host not in preferred:
+                    yield host
+
+    @staticmethod
+    def _ordered_hosts(network, anchor=None):
+        """Yield the hosts of network, alternating outwards from anchor if it is on the network"""
+        if anchor is not None:
+            anchor = ipaddress.ip_address(str(anchor))
+        if anchor is None or anchor not in network or network.num_addresses <= 2:
+            yield from network.hosts()
+            return
+        first = int(network.network_address) + 1
+        last = int(network.broadcast_address) - 1
+        centre = min(max(int(anchor), first), last)
+        yield ipaddress.ip_address(centre)
+        for offset in range(1, last - first + 1):
+            if centre + offset <= last:
+                yield ipaddress.ip_address(centre + offset)
+            if centre - offset >= first:
+                yield ipaddress.ip_address(centre - offset)
+            if centre + offset > last and centre - offset < first:
+                break
 
     @staticmethod
     def netmask_to_cidr(netmask):
@@ -0,0 +1,239 @@
+import math
+import time
+from lineus.lineus import LineUs
+
+
+class StrokeOptimiser:
+    """
+    Re-orders the strokes of a drawing to cut down the time Line-us spends moving between them with the pen up.
+    A stroke is a sequence of ``(x, y)`` points (a list, tuple or NumPy array). The optimiser builds a k-d tree
+    of the stroke end points, orders the strokes greedily by always drawing the nearest one next, and then
+    improves the order with a 2-opt pass. ``time_budget`` bounds the 2-opt pass only; its clock starts once the
+    greedy order is ready::
+
+        >>> optimiser = StrokeOptimiser(reverse=True, time_budget=1)
+        >>> strokes = optimiser.optimise(strokes)
+        >>> my_line_us.stream_gcode(strokes_to_gcode(strokes))
+
+    If ``reverse`` is ``True`` strokes may be drawn backwards when that is shorter. The 2-opt pass reverses runs
+    of strokes, so it is only used when ``reverse`` is ``True``. ``start`` is where the pen is before drawing.
+    """
+
+    _default_start = (1000, 1000)
+    _default_time_budget = 1.0
+    _two_opt_window = 30
+
+    def __init__(self, reverse=True, start=None, time_budget=None):
+        self.reverse = reverse
+        self.start = start if start is not None else self._default_start
+        self.time_budget = time_budget if time_budget is not None else self._default_time_budget
+        self.stats = {}
+
+    def optimise(self, strokes):
+        """
+        Returns a new list of the strokes in drawing order, with any reversed strokes reversed. The pen up travel
+        before and after optimising is stored in ``stats``.
+        """
+        strokes = [stroke for stroke in strokes if len(stroke) > 0]
+        began = time.perf_counter()
+        starts = [(float(stroke[0][0]), float(stroke[0][1])) for stroke in strokes]
+        ends = [(float(stroke[-1][0]), float(stroke[-1][1])) for stroke in strokes]
+        travel_before = self._travel(starts, ends, [(i, False) for i in range(0, len(strokes))])
+        order = self._nearest_neighbour(starts, ends)
+        greedy_travel = self._travel(starts, ends, order)
+        if self.reverse:
+            order = self._two_opt(starts, ends, order, time.perf_counter() + self.time_budget)
+        travel_after = self._travel(starts, ends, order)
+        self.stats = {'strokes': len(strokes), 'travel_before': travel_before, 'travel_greedy': greedy_travel,
+                      'travel_after': travel_after, 'seconds': time.perf_counter() - began}
+        return [strokes[index][::-1] if reversed_stroke else strokes[index] for index, reversed_stroke in order]
+
+    def _nearest_neighbour(self, starts, ends):
+        """Greedy ordering using a k-d tree of the stroke end points"""
+        count = len(starts)
+        if count == 0:
+            return []
+        tree = _PointTree(starts + ends if self.reverse else starts)
+        order = []
+        position = (float(self.start[0]), float(self.start[1]))
+        for step in range(0, count):
+            point = tree.nearest(position)
+            index = point % count
+            reversed_stroke = point >= count
+            tree.remove(index)
+            if self.reverse:
+                tree.remove(index + count)
+            order.append((index, reversed_stroke))
+            position = starts[index] if reversed_stroke else ends[index]
+        return order
+
+    def _two_opt(self, starts, ends, order, deadline):
+        """Reverse runs of strokes while that shortens the travel and there is time left"""
+        count = len(order)
+        window = self._two_opt_window
+
+        def first(k):
+            index, reversed_stroke = order[k]
+            return ends[index] if reversed_stroke else starts[index]
+
+        def last(k):
+            index, reversed_stroke = order[k]
+            return starts[index] if reversed_stroke else ends[index]
+
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for i in range(-1, count - 2):
+                if i % 256 == 0 and time.perf_counter() >= deadline:
+                    break
+                end_i = last(i) if i >= 0 else self.start
+                start_next = first(i + 1)
+                before_i = _distance(end_i, start_next)
+                for j in range(i + 2, min(i + 1 + window, count)):
+                    end_j = last(j)
+                    if j + 1 < count:
+                        start_after = first(j + 1)
+                        change = (_distance(end_i, end_j) + _distance(start_next, start_after)
+                                  - before_i - _distance(end_j, start_after))
+                    else:
+                        change = _distance(end_i, end_j) - before_i
+                    if change < -1e-9:
+                        order[i + 1:j + 1] = [(index, not reversed_stroke)
+                                              for index, reversed_stroke in reversed(order[i + 1:j + 1])]
+                        start_next = first(i + 1)
+                        before_i = _distance(end_i, start_next)
+                        improved = True
+        return order
+
+    def _travel(self, starts, ends, order):
+        """The total pen up distance for an order"""
+        travel = 0.0
+        position = self.start
+        for index, reversed_stroke in order:
+            travel += _distance(position, ends[index] if reversed_stroke else starts[index])
+            position = starts[index] if reversed_stroke else ends[index]
+        return travel
+
+
+def _distance(a, b):
+    """The distance between two points (math.dist needs Python 3.8)"""
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+class _PointTree:
+    """
+    A bucketed k-d tree over a fixed list of ``(x, y)`` points. Points can be removed, and ``nearest()`` finds
+    the closest point that has not been. Splits are made at the median of the points themselves, so clustered
+    or otherwise uneven drawings still give a balanced tree. Removed points are skipped lazily in their leaf,
+    and each node counts the points left below it so that emptied branches are never searched again.
+    """
+
+    _leaf_size = 16
+
+    def __init__(self, points):
+        self.xs = [float(point[0]) for point in points]
+        self.ys = [float(point[1]) for point in points]
+        self.alive = [True] * len(points)
+        self.leaf_of = [0] * len(points)
+        self.parent = []
+        self.remaining = []
+        self.bounds = []
+        self.children = []
+        self.entries = []
+        if len(points) > 0:
+            self._build(list(range(0, len(points))), -1)
+
+    def _build(self, indices, parent):
+        node = len(self.parent)
+        xs = list(map(self.xs.__getitem__, indices))
+        ys = list(map(self.ys.__getitem__, indices))
+        bounds = (min(xs), min(ys), max(xs), max(ys))
+        self.parent.append(parent)
+        self.remaining.append(len(indices))
+        self.bounds.append(bounds)
+        self.children.append(None)
+        self.entries.append(None)
+        if len(indices) <= self._leaf_size:
+            self.entries[node] = indices
+            for index in indices:
+                self.leaf_of[index] = node
+            return node
+        axis = self.xs if bounds[2] - bounds[0] >= bounds[3] - bounds[1] else self.ys
+        indices.sort(key=axis.__getitem__)
+        half = len(indices) // 2
+        left = self._build(indices[:half], node)
+        right = self._build(indices[half:], node)
+        self.children[node] = (left, right)
+        return node
+
+    def remove(self, index):
+        """Remove a point so that it is no longer returned by ``nearest()``"""
+        if not self.alive[index]:
+            return
+        self.alive[index] = False
+        node = self.leaf_of[index]
+        while node >= 0:
+            self.remaining[node] -= 1
+            node = self.parent[node]
+
+    def nearest(self, position):
+        """The index of the remaining point closest to position, or None if every point has been removed"""
+        x, y = position
+        xs, ys, alive, remaining, bounds, children, entries = (self.xs, self.ys, self.alive, self.remaining,
+                                                               self.bounds, self.children, self.entries)
+        best = None
+        best_distance = math.inf
+        stack = [(0.0, 0)] if len(self.parent) > 0 else []
+        while stack:
+            distance, node = stack.pop()
+            if distance >= best_distance or remaining[node] == 0:
+                continue
+            if children[node] is None:
+                for index in entries[node]:
+                    if alive[index]:
+                        distance = (xs[index] - x) ** 2 + (ys[index] - y) ** 2
+                        if distance < best_distance:
+                            best_distance = distance
+                            best = index
+                continue
+            near = []
+            for child in children[node]:
+                # The squared distance from (x, y) to the child's bounding box
+                min_x, min_y, max_x, max_y = bounds[child]
+                dx = min_x - x if x < min_x else x - max_x if x > max_x else 0.0
+                dy = min_y - y if y < min_y else y - max_y if y > max_y else 0.0
+                near.append((dx * dx + dy * dy, child))
+            # Push the nearer child last so that it is searched first
+            if near[0][0] <= near[1][0]:
+                near.reverse()
+            stack.extend(near)
+        return best
+
+
+def optimise_strokes(strokes, reverse=True, start=None, time_budget=None):
+    """
+    Re-order ``strokes`` to minimise pen up travel and return the new list. See ``StrokeOptimiser`` for details::
+
+        >>> strokes = optimise_strokes(strokes, time_budget=2)
+
+    """
+    return StrokeOptimiser(reverse=reverse, start=start, time_budget=time_budget).optimise(strokes)
+
+
+def strokes_to_gcode(strokes, pen_up=1000, pen_down=0):
+    """
+    A generator of the ``G01`` commands that draw ``strokes`` in order. The pen is lifted to ``pen_up`` before
+    each move between strokes and lowered to ``pen_down`` at the start of each stroke, so the output can be
+    passed straight to ``stream_gcode()`` or ``save_to_lineus()``::
+
+        >>> my_line_us.stream_gcode(strokes_to_gcode(optimise_strokes(strokes)))
+
+    """
+    for stroke in strokes:
+        if len(stroke) == 0:
+            continue
+        yield LineUs._g01_command(stroke[0][0], stroke[0][1], pen_up).decode()
+        yield LineUs._g01_command(z=pen_down).decode()
+        for point in stroke[1:]:
+            yield LineUs._g01_command(point[0], point[1]).decode()
+        yield LineUs._g01_command(z=pen_up).decode()
@@ -0,0 +1,324 @@
+import concurrent.futures
+import errno
+import heapq
+import itertools
+import socket
+import threading
+import time
+from lineus.lineus import LineUs, DiscoveryService
+
+
+class LineUsPool:
+    """
+    Share out jobs between many Line-us machines. The pool keeps a connection open to each machine, with a
+    thread for each one that takes the next job from a shared priority queue whenever the machine is idle. A job
+    is any function that takes a connected ``LineUs``, and ``submit()`` returns a ``concurrent.futures.Future``
+    for its result::
+
+        >>> pool = LineUsPool()
+        >>> future = pool.submit_gcode(open('flower.gcode').read(), priority=1)
+        >>> pool.submit(lambda line_us: line_us.g01(1000, 0, 1000), priority=0)
+        >>> future.result()
+        {'sent': 5120, 'errors': 0}
+        >>> pool.stats()
+        {'line-us-dev': {'state': 'idle', 'jobs': 1, 'busy_seconds': 51.9, 'utilisation': 0.98, ...}, ...}
+        >>> pool.close()
+
+    Jobs with lower ``priority`` numbers run first, and jobs with the same priority run in the order they were
+    submitted. Machines found by the Bonjour search are added as they appear if ``discover`` is ``True``, and a
+    ``slow_search()`` of ``network`` is run in the background if ``slow_search`` is ``True``. ``machines`` is a
+    list of names or ``(name, bonjour_name, ip_address, port)`` tuples to add straight away.
+
+    If a machine drops off while it is running a job the job goes back on the queue, in the same place, for
+    another machine to pick up (up to ``retries`` times). Only connection errors count as a machine dropping
+    off; any other exception from a job, including an ``OSError`` such as a missing file, fails that job. The
+    machine is retried a few times and then removed from the pool until it is announced again, or until the
+    next ``submit()`` finds it still listed by the Bonjour search. If the last machine is removed while neither
+    the Bonjour search nor a ``slow_search()`` can add another, the queued jobs fail with ``ConnectionError``
+    instead of waiting forever. Leaving a ``with`` block waits for the jobs to finish, but cancels the queued
+    jobs and closes the pool once it has had no machines for 10 seconds.
+    """
+
+    _default_reconnect_attempts = 3
+    _default_reconnect_interval = 2
+    _default_exit_wait = 10
+    _lost_connection_errors = (errno.EHOSTUNREACH, errno.ENETUNREACH, errno.ENETDOWN, errno.EHOSTDOWN)
+
+    def __init__(self, machines=None, discover=True, slow_search=False, network=None, connect_timeout=None):
+        self.connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._machines = {}
+        self._outstanding = 0
+        self._closing = False
+        self._discovery = None
+        self._searching = slow_search
+        for machine in machines or []:
+            self.add_machine(machine)
+        if discover:
+            self._discovery = DiscoveryService.acquire()
+            self._discovery.listener.on_found_line_us(self.add_machine)
+            self._discovery.listener.on_updated_line_us(self.add_machine)
+            for machine in self._discovery.listener.get_line_us_list():
+                self.add_machine(machine)
+        if slow_search:
+            threading.Thread(target=self._slow_search, args=(network, ), daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        with self._changed:
+            empty_since = None
+            while self._outstanding > 0:
+                now = time.perf_counter()
+                if len(self._machines) > 0:
+                    empty_since = None
+                elif empty_since is None:
+                    empty_since = now
+                elif now - empty_since >= self._default_exit_wait:
+                    # Nothing has been able to run the queued jobs for a while, so cancel them
+                    break
+                self._changed.wait(self._default_exit_wait if empty_since is None
+                                   else empty_since + self._default_exit_wait - now)
+        self.close()
+
+    def add_machine(self, line_us):
+        """
+        Add a Line-us to the pool from its name or ``(name, bonjour_name, ip_address, port)`` tuple. Nothing
+        happens if a machine with the same name is already in the pool.
+        """
+        name = line_us[0] if isinstance(line_us, (list, tuple)) else line_us
+        with self._changed:
+            if self._closing or name in self._machines:
+                return
+            machine = {'line_us': line_us, 'state': 'connecting', 'jobs': 0, 'failed_jobs': 0, 'busy_seconds': 0.0,
+                       'added': time.perf_counter(), 'busy_since': None, 'thread': None}
+            self._machines[name] = machine
+            machine['thread'] = threading.Thread(target=self._work, args=(name, machine), daemon=True)
+            self._changed.notify_all()
+        machine['thread'].start()
+
+    def submit(self, job, priority=0, retries=1):
+        """
+        Queue ``job(line_us)`` to run on the next idle machine. Returns a ``concurrent.futures.Future`` for the
+        value the job returns, or the exception it raises.
+        """
+        if self._discovery is not None:
+            # Machines that dropped off are only announced again as updates, if at all, so look for them here
+            for line_us in self._discovery.listener.get_line_us_list():
+                self.add_machine(line_us)
+        future = concurrent.futures.Future()
+        with self._changed:
+            if self._closing:
+                raise RuntimeError('The pool has been closed')
+            heapq.heappush(self._queue, (priority, next(self._sequence), job, future, retries, False))
+            self._outstanding += 1
+            self._changed.notify_all()
+            stranded = self._take_stranded()
+        self._fail(stranded)
+        return future
+
+    def submit_gcode(self, gcode, priority=0, window=None, retries=1):
+        """Queue a GCode string or list of lines to be streamed with ``stream_gcode()``"""
+        if isinstance(gcode, str):
+            gcode = gcode.splitlines()
+        return self.submit(lambda line_us: line_us.stream_gcode(gcode, window=window), priority, retries)
+
+    def submit_drawing(self, drawing, priority=0, window=None, retries=1):
+        """Queue a ``Drawing`` to be drawn, returning a future for the number of error replies"""
+        return self.submit(lambda line_us: drawing.draw(line_us, window=window), priority, retries)
+
+    def join(self, timeout=None):
+        """Wait until every job submitted so far has finished. Returns ``False`` if ``timeout`` expired first."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def pending(self):
+        """The number of jobs waiting for a machine"""
+        with self._lock:
+            return len(self._queue)
+
+    def stats(self):
+        """
+        Returns a ``dict`` for each machine by name with its ``state`` (``connecting``, ``idle``, ``busy`` or
+        ``offline``), the number of ``jobs`` it has finished and ``failed_jobs``, the ``busy_seconds`` spent on
+        jobs and its ``utilisation``, the fraction of the time since it joined the pool that it has been busy.
+        """
+        now = time.perf_counter()
+        stats = {}
+        with self._lock:
+            for name, machine in self._machines.items():
+                busy = machine['busy_seconds']
+                if machine['busy_since'] is not None:
+                    busy += now - machine['busy_since']
+                elapsed = now - machine['added']
+                stats[name] = {'state': machine['state'], 'jobs': machine['jobs'],
+                               'failed_jobs': machine['failed_jobs'], 'busy_seconds': busy,
+                               'utilisation': busy / elapsed if elapsed > 0 else 0.0}
+        return stats
+
+    def close(self):
+        """
+        Stop the pool. Jobs that are running are allowed to finish, queued jobs are cancelled and every
+        connection is closed.
+        """
+        with self._changed:
+            self._closing = True
+            queue = self._queue
+            self._queue = []
+            self._outstanding -= len(queue)
+            self._changed.notify_all()
+            threads = [machine['thread'] for machine in self._machines.values()]
+        for priority, sequence, job, future, retries, started in queue:
+            if started:
+                future.set_exception(concurrent.futures.CancelledError())
+            else:
+                future.cancel()
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        if self._discovery is not None:
+            self._discovery.listener.remove_on_found_line_us(self.add_machine)
+            self._discovery.listener.remove_on_updated_line_us(self.add_machine)
+            self._discovery.release()
+            self._discovery = None
+
+    def _work(self, name, machine):
+        """Run jobs on one machine until the pool is closed or the machine drops off"""
+        line_us = LineUs()
+        try:
+            while self._connect(line_us, machine):
+                self._set_state(machine, 'idle')
+                while True:
+                    entry = self._next_job()
+                    if entry is None:
+                        return
+                    if not self._run(line_us, machine, entry):
+                        break
+                line_us.disconnect()
+                self._set_state(machine, 'offline')
+        finally:
+            line_us.close()
+            with self._changed:
+                machine['state'] = 'offline'
+                if not self._closing and self._machines.get(name) is machine:
+                    # Let the machine back in if it is announced again
+                    del self._machines[name]
+                self._changed.notify_all()
+                stranded = self._take_stranded()
+            self._fail(stranded)
+
+    def _take_stranded(self):
+        """
+        Empty the queue and return what was in it if there are no machines left to run the jobs and none can be
+        added. Call with the lock held.
+        """
+        if self._closing or len(self._machines) > 0 or self._discovery is not None or self._searching:
+            return []
+        queue = self._queue
+        self._queue = []
+        self._outstanding -= len(queue)
+        self._changed.notify_all()
+        return queue
+
+    @staticmethod
+    def _fail(queue):
+        """Fail the futures of jobs taken off the queue because no machine can run them"""
+        for priority, sequence, job, future, retries, started in queue:
+            if started or future.set_running_or_notify_cancel():
+                future.set_exception(ConnectionError('There are no Line-us machines left in the pool'))
+
+    def _connect(self, line_us, machine):
+        """Connect to the machine, trying a few times. Returns False if it could not be reached or we are closing."""
+        for attempt in range(0, self._default_reconnect_attempts):
+            if attempt > 0:
+                with self._changed:
+                    if self._changed.wait_for(lambda: self._closing, self._default_reconnect_interval):
+                        return False
+            if self._closing:
+                return False
+            self._set_state(machine, 'connecting')
+            if line_us.connect(machine['line_us'], timeout=self.connect_timeout):
+                return True
+        return False
+
+    def _next_job(self):
+        """Wait for the highest priority job, returning None when the pool is closing"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._closing or len(self._queue) > 0)
+            if self._closing:
+                return None
+            return heapq.heappop(self._queue)
+
+    def _run(self, line_us, machine, entry):
+        """Run a job, returning False if the connection was lost and the machine needs reconnecting"""
+        priority, sequence, job, future, retries, started = entry
+        if not started and not future.set_running_or_notify_cancel():
+            self._finish_job()
+            return True
+        start = time.perf_counter()
+        with self._lock:
+            machine['state'] = 'busy'
+            machine['busy_since'] = start
+        try:
+            result = job(line_us)
+        except OSError as error:
+            if not self._connection_lost(error):
+                self._end_busy(machine, start, failed=True)
+                future.set_exception(error)
+                self._finish_job()
+                return True
+            self._end_busy(machine, start, failed=True)
+            with self._changed:
+                if retries > 0 and not self._closing:
+                    # Put it back in its place in the queue, for any machine to pick up
+                    heapq.heappush(self._queue, (priority, sequence, job, future, retries - 1, True))
+                    self._changed.notify_all()
+                    return False
+            future.set_exception(error)
+            self._finish_job()
+            return False
+        except BaseException as error:
+            self._end_busy(machine, start, failed=True)
+            future.set_exception(error)
+            self._finish_job()
+            return True
+        self._end_busy(machine, start)
+        future.set_result(result)
+        self._finish_job()
+        return True
+
+    @classmethod
+    def _connection_lost(cls, error):
+        """True if an error from a job means the connection to the machine has gone"""
+        return isinstance(error, (ConnectionError, socket.timeout)) or error.errno in cls._lost_connection_errors
+
+    def _end_busy(self, machine, start, failed=False):
+        with self._lock:
+            machine['busy_seconds'] += time.perf_counter() - start
+            machine['busy_since'] = None
+            machine['state'] = 'idle'
+            machine['failed_jobs' if failed else 'jobs'] += 1
+
+    def _finish_job(self):
+        with self._changed:
+            self._outstanding -= 1
+            self._changed.notify_all()
+
+    def _set_state(self, machine, state):
+        with self._lock:
+            machine['state'] = state
+
+    def _slow_search(self, network):
+        """Add the machines found by a slow_search"""
+        try:
+            with LineUs() as line_us:
+                line_us.slow_search(network=network, return_first=False, callback=self.add_machine)
+        finally:
+            with self._changed:
+                self._searching = False
+                stranded = self._take_stranded()
+            self._fail(stranded)
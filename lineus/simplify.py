@@ -0,0 +1,91 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def simplify_polylines(polylines, tolerance):
+    """
+    Simplify polylines with the Ramer-Douglas-Peucker algorithm, removing points that are within ``tolerance``
+    Line-us units of the simplified line. Each polyline is an ``(N, 2)`` or ``(N, 3)`` array of points (any
+    sequence that NumPy can convert), and the two shapes can be mixed. All of the polylines are processed
+    together with NumPy, so there is no Python loop over points. Only x and y are used for the distances, and any
+    z values are kept. Points where z changes (where the pen goes down or comes up) are always kept, so the
+    simplification never joins a pen up move to a pen down one::
+
+        >>> simplified, stats = simplify_polylines(polylines, tolerance=2)
+        >>> stats
+        {'polylines': 120, 'points_before': 48211, 'points_after': 3104, 'points_removed': 45107}
+
+    Returns a list of the simplified polylines as NumPy arrays of the original type, in the same order, and a
+    ``dict`` of statistics.
+    The first and last points of each polyline are always kept. This function needs NumPy.
+    """
+    if numpy is None:
+        raise ImportError('simplify_polylines needs NumPy, install it with pip install lineus[numpy]')
+    originals = [numpy.asarray(polyline) for polyline in polylines]
+    arrays = [original.astype(numpy.float64) for original in originals]
+    if len(arrays) == 0:
+        return [], {'polylines': 0, 'points_before': 0, 'points_after': 0, 'points_removed': 0}
+    for array in arrays:
+        if array.size > 0 and (array.ndim != 2 or array.shape[1] not in (2, 3)):
+            raise ValueError(f'Polylines must be (N, 2) or (N, 3) arrays of points, not {array.shape}')
+    # Polylines without z can be mixed with ones that have it, as only x and y are used for the distances
+    dimensions = max(array.shape[1] if array.ndim == 2 else 2 for array in arrays)
+    arrays = [numpy.empty((0, dimensions)) if array.size == 0 else
+              numpy.pad(array, ((0, 0), (0, dimensions - array.shape[1]))) for array in arrays]
+    lengths = numpy.array([len(array) for array in arrays], dtype=numpy.int64)
+    points = numpy.concatenate(arrays)
+    ends = numpy.cumsum(lengths)
+    starts = ends - lengths
+    keep = numpy.zeros(len(points), dtype=bool)
+    non_empty = lengths > 0
+    keep[starts[non_empty]] = True
+    keep[ends[non_empty] - 1] = True
+    if dimensions == 3:
+        z_changes = numpy.flatnonzero(points[1:, 2] != points[:-1, 2])
+        keep[z_changes] = True
+        keep[z_changes + 1] = True
+
+    # Start with a segment between each pair of kept points in the same polyline that has points between them
+    kept = numpy.flatnonzero(keep)
+    polyline = numpy.searchsorted(ends, kept, side='right')
+    is_segment = (polyline[:-1] == polyline[1:]) & (kept[1:] - kept[:-1] > 1)
+    segment_start = kept[:-1][is_segment]
+    segment_end = kept[1:][is_segment]
+
+    # Each pass finds the furthest point from every open segment and splits the segments where it is too far
+    xy = points[:, :2]
+    while len(segment_start) > 0:
+        counts = segment_end - segment_start - 1
+        first = numpy.cumsum(counts) - counts
+        segment = numpy.repeat(numpy.arange(len(counts)), counts)
+        index = numpy.arange(counts.sum()) - first[segment] + segment_start[segment] + 1
+        a = xy[segment_start][segment]
+        b = xy[segment_end][segment]
+        p = xy[index]
+        chord = b - a
+        chord_length = numpy.hypot(chord[:, 0], chord[:, 1])
+        cross = numpy.abs(chord[:, 0] * (p[:, 1] - a[:, 1]) - chord[:, 1] * (p[:, 0] - a[:, 0]))
+        point_distance = numpy.hypot(p[:, 0] - a[:, 0], p[:, 1] - a[:, 1])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            distance = numpy.where(chord_length > 0, cross / chord_length, point_distance)
+        furthest = numpy.maximum.reduceat(distance, first)
+        is_furthest = numpy.flatnonzero(distance == furthest[segment])
+        found_segments, position = numpy.unique(segment[is_furthest], return_index=True)
+        split_point = numpy.empty(len(counts), dtype=numpy.int64)
+        split_point[found_segments] = index[is_furthest[position]]
+        split = furthest > tolerance
+        split_point = split_point[split]
+        keep[split_point] = True
+        new_start = numpy.concatenate([segment_start[split], split_point])
+        new_end = numpy.concatenate([split_point, segment_end[split]])
+        still_open = new_end - new_start > 1
+        segment_start = new_start[still_open]
+        segment_end = new_end[still_open]
+
+    simplified = [original[keep[start:end]] for original, start, end in zip(originals, starts, ends)]
+    points_after = int(keep.sum())
+    stats = {'polylines': len(arrays), 'points_before': int(len(points)), 'points_after': points_after,
+             'points_removed': int(len(points)) - points_after}
+    return simplified, stats
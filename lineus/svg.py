@@ -0,0 +1,398 @@
+import math
+import re
+import xml.etree.ElementTree as ElementTree
+import numpy
+from lineus.curves import flatten_arcs, flatten_cubic, flatten_quadratic
+from lineus.drawing import Drawing
+from lineus.transform import Transform, WORKSPACE, clip_drawing
+
+
+class SvgImporter:
+    """
+    Import SVG files as a pipeline of generators. The document is parsed incrementally, and each shape is
+    flattened to straight lines, transformed to Line-us coordinates and clipped on its own as soon as its
+    element has been read, so drawing can start while the rest of the file is still being parsed and memory use
+    depends on the largest element rather than the whole document::
+
+        >>> importer = SvgImporter(tolerance=1, margin=50)
+        >>> importer.draw(my_line_us, 'flower.svg')
+        0
+        >>> my_line_us.save_to_lineus(importer.gcode('flower.svg'), 3)
+        'ok'
+
+    The drawing is fitted to ``workspace`` (see ``Transform.fit()``) using the viewBox of the root element, or
+    its width and height, with the SVG y axis flipped to point up. ``transform`` is applied to the document
+    coordinates before fitting, and with ``fit=False`` it is the only transform, so it must map the document into
+    Line-us coordinates itself. ``clip`` is passed to ``clip_drawing()``, or ``None`` to send the lines unchecked.
+
+    ``path``, ``line``, ``polyline``, ``polygon``, ``rect``, ``circle`` and ``ellipse`` elements and the
+    ``transform`` attribute are supported. Anything inside ``defs`` and other elements that are not drawn
+    directly is skipped, as is anything with ``display="none"``.
+    """
+
+    _shapes = ('path', 'line', 'polyline', 'polygon', 'rect', 'circle', 'ellipse')
+    _hidden = ('defs', 'clipPath', 'mask', 'symbol', 'pattern', 'marker', 'metadata', 'style', 'title', 'desc')
+    _parameter_counts = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+    _command_pattern = re.compile(r'[\s,]*([MmZzLlHhVvCcSsQqTtAa])')
+    _number_pattern = re.compile(r'[\s,]*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+    _flag_pattern = re.compile(r'[\s,]*([01])')
+    _transform_pattern = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+
+    def __init__(self, tolerance=1, workspace=WORKSPACE, margin=0, transform=None, fit=True, clip='clip'):
+        self.tolerance = tolerance
+        self.workspace = workspace
+        self.margin = margin
+        self.transform = transform
+        self.fit = fit
+        self.clip = clip
+
+    def drawings(self, source):
+        """
+        A generator of a ``Drawing`` in Line-us coordinates for each shape in ``source``, a file name or file
+        object. Shapes that are empty or clipped away completely are skipped.
+        """
+        page = None
+        stack = []
+        hidden = 0
+        for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+            tag = element.tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                if page is None:
+                    page = self._page_transform(element)
+                    parent = Transform()
+                else:
+                    parent = stack[-1][1]
+                local = self._parse_transform(element.get('transform', ''))
+                stack.append((element, parent if local is None else local.then(parent)))
+                if tag in self._hidden or self._is_hidden(element):
+                    hidden += 1
+                continue
+            element, transform = stack.pop()
+            if tag in self._hidden or self._is_hidden(element):
+                hidden -= 1
+            elif hidden == 0 and tag in self._shapes:
+                drawing = self._element_drawing(tag, element, transform.then(page))
+                if drawing is not None and len(drawing) > 0:
+                    yield drawing
+            # Nothing is kept once an element has been dealt with
+            element.clear()
+            if len(stack) > 0:
+                stack[-1][0].remove(element)
+
+    def strokes(self, source):
+        """A generator of every stroke in ``source`` as an ``(N, 2)`` array of Line-us coordinates"""
+        for drawing in self.drawings(source):
+            yield from drawing
+
+    def gcode(self, source, pen_up=1000, pen_down=0):
+        """A generator of the ``G01`` lines for ``source``, for ``stream_gcode()`` or ``save_to_lineus()``"""
+        for drawing in self.drawings(source):
+            yield from drawing.gcode(pen_up, pen_down)
+
+    def draw(self, line_us, source, pen_up=1000, pen_down=0, window=None):
+        """
+        Draw ``source`` on a connected ``LineUs``, sending each shape with ``g01_path()`` as soon as it has been
+        read. Returns the number of error replies.
+        """
+        errors = 0
+        for drawing in self.drawings(source):
+            errors += drawing.draw(line_us, pen_up, pen_down, window)
+        return errors
+
+    def _page_transform(self, root):
+        """The transform from document coordinates to Line-us coordinates, from the root svg element"""
+        transform = self.transform if self.transform is not None else Transform()
+        if not self.fit:
+            return transform
+        view_box = [float(number) for number in self._numbers(root.get('viewBox', ''))]
+        if len(view_box) == 4:
+            min_x, min_y, width, height = view_box
+        else:
+            width = self._length(root.get('width'))
+            height = self._length(root.get('height'))
+            if width is None or height is None:
+                raise ValueError('The SVG has no viewBox or width and height to fit to the workspace')
+            min_x = min_y = 0
+        corners = transform.then(Transform().flip_y()).apply(
+            [(min_x, min_y), (min_x + width, min_y), (min_x, min_y + height), (min_x + width, min_y + height)])
+        bounds = (corners[:, 0].min(), corners[:, 1].min(), corners[:, 0].max(), corners[:, 1].max())
+        return transform.flip_y().then(Transform.fit(bounds, self.workspace, self.margin))
+
+    def _element_drawing(self, tag, element, transform):
+        """Flatten one shape element into a Drawing in Line-us coordinates"""
+        path_data = self._shape_path(tag, element)
+        if path_data is None:
+            return None
+        # The flattening tolerance is in Line-us units so it is scaled back to document units
+        scale = numpy.linalg.norm(transform.matrix[:2, :2], 2)
+        if scale == 0:
+            return None
+        strokes = self._flatten_path(path_data, self.tolerance / scale)
+        if len(strokes) == 0:
+            return None
+        drawing = transform.apply_drawing(Drawing.from_strokes(strokes, dtype=numpy.float64))
+        if self.clip is not None:
+            drawing = clip_drawing(drawing, self.workspace, self.clip)
+        return drawing
+
+    def _shape_path(self, tag, element):
+        """The path data for a shape element, or None if it has nothing to draw"""
+        if tag == 'path':
+            return element.get('d')
+        if tag == 'line':
+            x1, y1, x2, y2 = (self._length(element.get(name), 0) for name in ('x1', 'y1', 'x2', 'y2'))
+            return f'M{x1},{y1} L{x2},{y2}'
+        if tag in ('polyline', 'polygon'):
+            numbers = self._numbers(element.get('points', ''))
+            if len(numbers) < 2:
+                return None
+            return 'M' + ' '.join(numbers[:len(numbers) // 2 * 2]) + (' Z' if tag == 'polygon' else '')
+        if tag == 'rect':
+            x, y, width, height = (self._length(element.get(name), 0) for name in ('x', 'y', 'width', 'height'))
+            rx = self._length(element.get('rx'))
+            ry = self._length(element.get('ry'))
+            rx = min(rx if rx is not None else ry or 0, width / 2)
+            ry = min(ry if ry is not None else rx, height / 2)
+            if width <= 0 or height <= 0:
+                return None
+            if rx <= 0 or ry <= 0:
+                return f'M{x},{y} h{width} v{height} h{-width} Z'
+            return (f'M{x + rx},{y} h{width - 2 * rx} a{rx},{ry} 0 0 1 {rx},{ry} v{height - 2 * ry} '
+                    f'a{rx},{ry} 0 0 1 {-rx},{ry} h{2 * rx - width} a{rx},{ry} 0 0 1 {-rx},{-ry} '
+                    f'v{2 * ry - height} a{rx},{ry} 0 0 1 {rx},{-ry} Z')
+        cx, cy = (self._length(element.get(name), 0) for name in ('cx', 'cy'))
+        if tag == 'circle':
+            rx = ry = self._length(element.get('r'), 0)
+        else:
+            rx, ry = (self._length(element.get(name), 0) for name in ('rx', 'ry'))
+        if rx <= 0 or ry <= 0:
+            return None
+        return f'M{cx + rx},{cy} A{rx},{ry} 0 1 1 {cx - rx},{cy} A{rx},{ry} 0 1 1 {cx + rx},{cy} Z'
+
+    def _flatten_path(self, path_data, tolerance):
+        """Flatten SVG path data into a list of (N, 2) arrays, flattening all of the curves in the path together"""
+        subpaths, cubics, quadratics, arcs = self._parse_path(path_data)
+        flat = {'C': flatten_cubic(cubics, tolerance) if len(cubics) > 0 else [],
+                'Q': flatten_quadratic(quadratics, tolerance) if len(quadratics) > 0 else [],
+                'A': self._flatten_arcs(arcs, tolerance) if len(arcs) > 0 else []}
+        strokes = []
+        for start, parts in subpaths:
+            if len(parts) == 0:
+                continue
+            points = [numpy.array([start], dtype=numpy.float64)]
+            for kind, value in parts:
+                if kind == 'L':
+                    points.append(numpy.array([value], dtype=numpy.float64))
+                else:
+                    points.append(flat[kind][value][1:])
+            strokes.append(numpy.concatenate(points))
+        return strokes
+
+    @staticmethod
+    def _flatten_arcs(arcs, tolerance):
+        """Flatten elliptical arcs of (cx, cy, rx, ry, rotation, start, sweep) by flattening circles and squashing"""
+        arcs = numpy.asarray(arcs, dtype=numpy.float64)
+        radius = numpy.maximum(arcs[:, 2], arcs[:, 3])
+        circles = numpy.column_stack((numpy.zeros(len(arcs)), numpy.zeros(len(arcs)), radius, arcs[:, 5:7]))
+        flattened = []
+        for arc, points in zip(arcs, flatten_arcs(circles, tolerance)):
+            cx, cy, rx, ry, rotation = arc[:5]
+            flattened.append(Transform().scale(rx / max(rx, ry), ry / max(rx, ry)).rotate(rotation)
+                             .translate(cx, cy).apply(points))
+        return flattened
+
+    def _parse_path(self, path_data):
+        """
+        Parse SVG path data into subpaths of (start, parts), where each part is ('L', point) or a curve type and
+        its index in the returned lists of cubic, quadratic and arc parameters
+        """
+        subpaths = []
+        cubics = []
+        quadratics = []
+        arcs = []
+        x = y = 0.0
+        start = (0.0, 0.0)
+        parts = None
+        control = None
+        previous = None
+        for command, numbers in self._path_commands(path_data):
+            upper = command.upper()
+            relative = command != upper
+            dx, dy = (x, y) if relative else (0.0, 0.0)
+            if upper == 'M':
+                x, y = numbers[0] + dx, numbers[1] + dy
+                start = (x, y)
+                parts = []
+                subpaths.append((start, parts))
+                previous = upper
+                continue
+            if upper == 'Z':
+                if parts is not None and (x, y) != start:
+                    parts.append(('L', start))
+                x, y = start
+                parts = None
+                previous = upper
+                continue
+            if parts is None:
+                # Drawing straight after a close starts a new subpath where the last one started
+                start = (x, y)
+                parts = []
+                subpaths.append((start, parts))
+            if upper == 'L':
+                x, y = numbers[0] + dx, numbers[1] + dy
+                parts.append(('L', (x, y)))
+            elif upper == 'H':
+                x = numbers[0] + dx
+                parts.append(('L', (x, y)))
+            elif upper == 'V':
+                y = numbers[0] + dy
+                parts.append(('L', (x, y)))
+            elif upper in ('C', 'S'):
+                if upper == 'C':
+                    first = (numbers[0] + dx, numbers[1] + dy)
+                    numbers = numbers[2:]
+                elif previous in ('C', 'S'):
+                    first = (2 * x - control[0], 2 * y - control[1])
+                else:
+                    first = (x, y)
+                control = (numbers[0] + dx, numbers[1] + dy)
+                end = (numbers[2] + dx, numbers[3] + dy)
+                parts.append(('C', len(cubics)))
+                cubics.append(((x, y), first, control, end))
+                x, y = end
+            elif upper in ('Q', 'T'):
+                if upper == 'Q':
+                    control = (numbers[0] + dx, numbers[1] + dy)
+                    numbers = numbers[2:]
+                elif previous in ('Q', 'T'):
+                    control = (2 * x - control[0], 2 * y - control[1])
+                else:
+                    control = (x, y)
+                end = (numbers[0] + dx, numbers[1] + dy)
+                parts.append(('Q', len(quadratics)))
+                quadratics.append(((x, y), control, end))
+                x, y = end
+            elif upper == 'A':
+                end = (numbers[5] + dx, numbers[6] + dy)
+                arc = self._centre_arc((x, y), end, *numbers[:5])
+                if arc is None:
+                    if end != (x, y):
+                        parts.append(('L', end))
+                else:
+                    parts.append(('A', len(arcs)))
+                    arcs.append(arc)
+                x, y = end
+            previous = upper
+        return subpaths, cubics, quadratics, arcs
+
+    def _path_commands(self, path_data):
+        """A generator of (command, numbers) for SVG path data, with repeated parameters split into commands"""
+        position = 0
+        while True:
+            match = self._command_pattern.match(path_data, position)
+            if match is None:
+                return
+            command = match.group(1)
+            position = match.end()
+            count = self._parameter_counts[command.upper()]
+            if count == 0:
+                yield command, ()
+                continue
+            first = True
+            while True:
+                numbers = []
+                for index in range(0, count):
+                    pattern = self._flag_pattern if command in 'Aa' and index in (3, 4) else self._number_pattern
+                    number = pattern.match(path_data, position)
+                    if number is None:
+                        break
+                    numbers.append(float(number.group(1)))
+                    position = number.end()
+                if len(numbers) < count:
+                    if first:
+                        # Stop at the first error, as SVG renderers do
+                        return
+                    break
+                yield command, numbers
+                if command in 'Mm':
+                    # Further pairs after a move are lines
+                    command = 'l' if command == 'm' else 'L'
+                first = False
+
+    @staticmethod
+    def _centre_arc(start, end, rx, ry, rotation, large_arc, sweep):
+        """
+        Convert an SVG endpoint arc to (cx, cy, rx, ry, rotation, start_angle, sweep_angle) in degrees, or None
+        if it is a straight line, following the SVG implementation notes
+        """
+        rx = abs(rx)
+        ry = abs(ry)
+        if rx == 0 or ry == 0 or start == end:
+            return None
+        cos = math.cos(math.radians(rotation))
+        sin = math.sin(math.radians(rotation))
+        half_x = (start[0] - end[0]) / 2
+        half_y = (start[1] - end[1]) / 2
+        x1 = cos * half_x + sin * half_y
+        y1 = -sin * half_x + cos * half_y
+        scale = x1 ** 2 / rx ** 2 + y1 ** 2 / ry ** 2
+        if scale > 1:
+            rx *= math.sqrt(scale)
+            ry *= math.sqrt(scale)
+        numerator = rx ** 2 * ry ** 2 - rx ** 2 * y1 ** 2 - ry ** 2 * x1 ** 2
+        denominator = rx ** 2 * y1 ** 2 + ry ** 2 * x1 ** 2
+        coefficient = math.sqrt(max(0.0, numerator / denominator))
+        if large_arc == sweep:
+            coefficient = -coefficient
+        centre_x1 = coefficient * rx * y1 / ry
+        centre_y1 = -coefficient * ry * x1 / rx
+        cx = cos * centre_x1 - sin * centre_y1 + (start[0] + end[0]) / 2
+        cy = sin * centre_x1 + cos * centre_y1 + (start[1] + end[1]) / 2
+        start_angle = math.degrees(math.atan2((y1 - centre_y1) / ry, (x1 - centre_x1) / rx))
+        end_angle = math.degrees(math.atan2((-y1 - centre_y1) / ry, (-x1 - centre_x1) / rx))
+        sweep_angle = end_angle - start_angle
+        if sweep and sweep_angle < 0:
+            sweep_angle += 360
+        elif not sweep and sweep_angle > 0:
+            sweep_angle -= 360
+        return cx, cy, rx, ry, rotation, start_angle, sweep_angle
+
+    @classmethod
+    def _parse_transform(cls, text):
+        """The Transform for an SVG transform attribute, or None if there is not one"""
+        transform = None
+        for name, arguments in cls._transform_pattern.findall(text):
+            values = [float(number) for number in cls._numbers(arguments)]
+            if name == 'matrix' and len(values) == 6:
+                a, b, c, d, e, f = values
+                step = Transform([[a, c, e], [b, d, f], [0, 0, 1]])
+            elif name == 'translate' and len(values) > 0:
+                step = Transform().translate(values[0], values[1] if len(values) > 1 else 0)
+            elif name == 'scale' and len(values) > 0:
+                step = Transform().scale(values[0], values[1] if len(values) > 1 else values[0])
+            elif name == 'rotate' and len(values) > 0:
+                step = Transform().rotate(values[0], tuple(values[1:3]) if len(values) > 2 else (0, 0))
+            elif name == 'skewX' and len(values) > 0:
+                step = Transform([[1, math.tan(math.radians(values[0])), 0], [0, 1, 0], [0, 0, 1]])
+            elif name == 'skewY' and len(values) > 0:
+                step = Transform([[1, 0, 0], [math.tan(math.radians(values[0])), 1, 0], [0, 0, 1]])
+            else:
+                continue
+            # The rightmost transform in the list is applied first
+            transform = step if transform is None else step.then(transform)
+        return transform
+
+    @staticmethod
+    def _is_hidden(element):
+        style = element.get('style', '').replace(' ', '')
+        return element.get('display') == 'none' or 'display:none' in style
+
+    @classmethod
+    def _numbers(cls, text):
+        return [match.group(1) for match in cls._number_pattern.finditer(text or '')]
+
+    @classmethod
+    def _length(cls, text, default=None):
+        """The number at the start of an SVG length, ignoring any units"""
+        match = cls._number_pattern.match(text or '')
+        return float(match.group(1)) if match is not None else default
@@ -0,0 +1,139 @@
+import statistics
+import threading
+import time
+
+
+class SyncCoordinator:
+    """
+    Start several connected ``LineUs`` machines together and keep them in step. Each machine's program is a
+    list of sections of GCode, and every machine must have the same number of sections. The end of each section
+    is a checkpoint: every machine waits there until all of them have finished the section, and then they are
+    released together into the next one::
+
+        >>> coordinator = SyncCoordinator([line_us_1, line_us_2, line_us_3])
+        >>> coordinator.measure_latency()
+        [{'mean': 4.1, 'min': 3.2, 'max': 5.3, 'stdev': 0.8, 'one_way': 2.0}, ...]
+        >>> report = coordinator.run([[intro_1, middle_1], [intro_2, middle_2], [intro_3, middle_3]])
+        >>> [checkpoint['start_skew_ms'] for checkpoint in report['checkpoints']]
+        [0.4, 0.3]
+
+    The round trip to each machine is measured with ``M114`` the way ``ping()`` does it, and half of the median
+    is taken as the one way latency. The first ``window`` commands of each section are encoded before the
+    release, and each machine's first write is made early by its own latency, so the commands reach all of the
+    machines at the same moment. Machines with slower connections no longer start late.
+
+    ``run()`` returns a report with the latency of each machine, the number of error replies from each machine
+    and, for each section, ``start_skew_ms``, the spread of the estimated arrival times of the first commands,
+    and ``finish_skew_ms``, the spread of the estimated times that each machine finished the section.
+    """
+
+    _default_window = 4
+    _default_ping_count = 5
+    _default_lead = 0.05
+    _spin_time = 0.002
+
+    def __init__(self, line_us_list, window=None, lead=None):
+        self.line_us_list = list(line_us_list)
+        self.window = window if window is not None else self._default_window
+        self.lead = lead if lead is not None else self._default_lead
+        self.latency = None
+        self._release_at = None
+
+    def measure_latency(self, count=None):
+        """
+        Measure the round trip time to each machine in milliseconds, returning a list of ``dict`` with the
+        ``mean``, ``min``, ``max`` and ``stdev`` as for ``ping()``, and the ``one_way`` latency that is used to
+        time the releases.
+        """
+        count = max(2, count if count is not None else self._default_ping_count)
+        latency = []
+        for line_us in self.line_us_list:
+            # First M114 is a little slow
+            line_us.send_gcode('M114')
+            ping_times = []
+            for i in range(0, count):
+                start = time.perf_counter()
+                line_us.send_gcode('M114')
+                ping_times.append((time.perf_counter() - start) * 1000)
+            latency.append({'mean': statistics.mean(ping_times), 'min': min(ping_times), 'max': max(ping_times),
+                            'stdev': statistics.stdev(ping_times), 'one_way': statistics.median(ping_times) / 2})
+        self.latency = latency
+        return latency
+
+    def run(self, programs):
+        """
+        Run a program on each machine, where ``programs[i]`` is the list of sections for ``line_us_list[i]`` and
+        each section is a list of GCode lines or a string with one GCode per line. Latency is measured first if
+        ``measure_latency()`` has not been called. Returns the report described above.
+        """
+        if len(programs) != len(self.line_us_list):
+            raise ValueError(f'{len(self.line_us_list)} machines need {len(self.line_us_list)} programs')
+        sections = [[self._lines(section) for section in program] for program in programs]
+        if len(set(len(program) for program in sections)) > 1:
+            raise ValueError('Every program must have the same number of sections')
+        if self.latency is None:
+            self.measure_latency()
+        count = len(self.line_us_list)
+        if count == 0:
+            return {'latency': self.latency, 'errors': [], 'checkpoints': []}
+        section_count = len(sections[0])
+        starts = [[None] * count for _ in range(0, section_count)]
+        finishes = [[None] * count for _ in range(0, section_count)]
+        errors = [0] * count
+        failures = []
+        barrier = threading.Barrier(count, action=self._set_release)
+        threads = [threading.Thread(target=self._run_machine,
+                                    args=(index, sections[index], barrier, starts, finishes, errors, failures),
+                                    daemon=True) for index in range(0, count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if len(failures) > 0:
+            raise failures[0]
+        checkpoints = []
+        for section_starts, section_finishes in zip(starts, finishes):
+            checkpoints.append({'start_skew_ms': (max(section_starts) - min(section_starts)) * 1000,
+                                'finish_skew_ms': (max(section_finishes) - min(section_finishes)) * 1000})
+        return {'latency': self.latency, 'errors': errors, 'checkpoints': checkpoints}
+
+    def _run_machine(self, index, sections, barrier, starts, finishes, errors, failures):
+        """Run one machine's sections, waiting at the barrier before each one"""
+        line_us = self.line_us_list[index]
+        one_way = self.latency[index]['one_way'] / 1000
+        try:
+            for number, commands in enumerate(sections):
+
+                def release():
+                    # The first batch is already encoded, so all that is left after the wait is the write
+                    barrier.wait()
+                    self._wait_until(self._release_at - one_way)
+                    starts[number][index] = time.perf_counter() + one_way
+
+                result = line_us.stream_gcode(commands, window=self.window, skip_redundant=False, on_start=release)
+                errors[index] += result['errors']
+                finishes[number][index] = time.perf_counter() - one_way
+        except BaseException as error:
+            failures.append(error)
+            # Let the other machines stop instead of waiting for this one
+            barrier.abort()
+
+    def _set_release(self):
+        """Called once all of the machines reach the barrier, to pick the time they are all released"""
+        longest = max(latency['one_way'] for latency in self.latency) / 1000
+        self._release_at = time.perf_counter() + longest + self.lead
+
+    def _wait_until(self, moment):
+        """Sleep until moment on the perf_counter clock, spinning for the last few milliseconds to be accurate"""
+        remaining = moment - time.perf_counter()
+        if remaining > self._spin_time:
+            time.sleep(remaining - self._spin_time)
+        while time.perf_counter() < moment:
+            pass
+
+    @staticmethod
+    def _lines(section):
+        """The non blank lines of a section"""
+        if isinstance(section, str):
+            section = section.splitlines()
+        return [line for line in section if line.strip() != '']
@@ -0,0 +1,47 @@
+import unittest
+import asyncio
+import lineus
+from lineus.emulator import LineUsEmulator
+
+
+class TestAsync(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = LineUsEmulator().start()
+
+    def tearDown(self):
+        self.emulator.stop()
+
+    def test_async(self):
+        async def run():
+            my_line_us = lineus.AsyncLineUs()
+            await my_line_us.connect(self.emulator.get_line_us())
+            replies = await asyncio.gather(my_line_us.g01(1100, 0, 0), my_line_us.send_gcode('M114'))
+            files = await my_line_us.list_lineus_files()
+            await my_line_us.disconnect()
+            return replies, files
+        replies, files = asyncio.run(run())
+        self.assertEqual(replies, ['ok X:1100.00 Y:0.00 Z:0.00'] * 2)
+        self.assertEqual(files, [])
+
+    def test_async_late_reply_and_reconnect(self):
+        self.emulator.processing = .2
+
+        async def run():
+            my_line_us = lineus.AsyncLineUs()
+            await my_line_us.connect(self.emulator.get_line_us())
+            first_writer = my_line_us._writer
+            with self.assertRaises(asyncio.TimeoutError):
+                await my_line_us.g01(1100, 0, 0, timeout=.05)
+            reply = await my_line_us.send_gcode('G28')
+            await my_line_us.connect(self.emulator.get_line_us())
+            closed = first_writer.is_closing()
+            await my_line_us.disconnect()
+            return reply, closed
+        reply, closed = asyncio.run(run())
+        self.assertEqual(reply, 'ok X:1000.00 Y:1000.00 Z:1000.00')
+        self.assertTrue(closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+import lineus
+from lineus.batch import BatchCompiler
+from lineus.cache import CompileCache
+
+_svg = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><path d="M10,10 h%d v80 Z"/></svg>'
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.sources = []
+        for i in range(0, 4):
+            self.sources.append(self._path(f'art{i}.svg'))
+            with open(self.sources[-1], 'w') as source_file:
+                source_file.write(_svg % (10 + i))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_compile_and_cache(self):
+        compiler = BatchCompiler(self._path('out'), settings={'tolerance': 2}, cache=self._path('cache'), workers=2)
+        summary = compiler.run(self.sources + [self._path('missing.svg')])
+        self.assertEqual((summary['compiled'], summary['cached'], summary['failed']), (4, 0, 1))
+        with open(self._path('out/art0.gcode')) as gcode_file:
+            self.assertEqual(len(gcode_file.read().splitlines()), 6)
+        with open(self.sources[0], 'w') as source_file:
+            source_file.write(_svg % 50)
+        results = {os.path.basename(result['source']): result for result in compiler.compile(self.sources)}
+        self.assertEqual([results[f'art{i}.svg']['cached'] for i in range(0, 4)], [False, True, True, True])
+        compiler.settings = {'tolerance': 1}
+        self.assertEqual(compiler.run(self.sources)['cached'], 0)
+
+    def test_same_name_in_different_directories(self):
+        sources = []
+        for i, directory in enumerate(('a', 'b')):
+            os.makedirs(self._path(directory))
+            sources.append(self._path(f'{directory}/flower.svg'))
+            with open(sources[-1], 'w') as source_file:
+                source_file.write(_svg % (20 + i * 40))
+        compiler = BatchCompiler(self._path('out'), cache=None, workers=2)
+        results = {result['source']: result for result in compiler.compile(sources)}
+        self.assertEqual(results[sources[0]]['output'], self._path('out/flower.gcode'))
+        self.assertNotEqual(results[sources[1]]['output'], results[sources[0]]['output'])
+        gcode = []
+        for source in sources:
+            with open(results[source]['output']) as gcode_file:
+                gcode.append(gcode_file.read())
+        self.assertNotEqual(gcode[0], gcode[1])
+        self.assertEqual(len(os.listdir(self._path('out'))), 2)
+
+    def test_version_in_key(self):
+        key = CompileCache.key(self.sources[0])
+        with mock.patch.object(lineus, '__version__', '0.0.1'):
+            self.assertNotEqual(CompileCache.key(self.sources[0]), key)
+
+    def test_failed_copy_is_a_miss(self):
+        compiler = BatchCompiler(self._path('out'), cache=self._path('cache'), workers=2)
+        with mock.patch.object(compiler.cache, 'get', return_value=(self._path('gone.gcode'), 6)):
+            summary = compiler.run(self.sources)
+        self.assertEqual((summary['compiled'], summary['cached'], summary['failed']), (4, 0, 0))
+
+    def test_eviction(self):
+        cache = CompileCache(self._path('cache'), max_size=os.path.getsize(self.sources[0]) * 3 // 2)
+        for i, source in enumerate(self.sources):
+            key = cache.key(source)
+            cache.put(key, source, i)
+        self.assertIsNone(cache.get(CompileCache.key(self.sources[0])))
+        self.assertEqual(cache.get(CompileCache.key(self.sources[3]))[1], 3)
+        self.assertEqual(len(os.listdir(self._path('cache'))), 1 + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
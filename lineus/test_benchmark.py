@@ -0,0 +1,47 @@
+import unittest
+import lineus
+from lineus.benchmark import LineUsBenchmark
+from lineus.emulator import LineUsEmulator
+from lineus.lineus import DiscoveryService
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        # Start from no shared search, whatever other tests have left running
+        self.running = DiscoveryService._instance
+        DiscoveryService._instance = None
+
+    def tearDown(self):
+        DiscoveryService._instance = self.running
+
+    def test_run_all(self):
+        emulator = LineUsEmulator().start()
+        try:
+            benchmark = LineUsBenchmark(emulator.get_line_us(), count=10, windows=[4])
+            results = benchmark.run_all()
+        finally:
+            emulator.stop()
+        self.assertEqual(results['g01']['commands'], 10)
+        self.assertIn('p99_ms', results['send_gcode'])
+        self.assertEqual(results['stream_gcode'][0]['errors'], 0)
+
+    def test_latency_summary(self):
+        summary = LineUsBenchmark.latency_summary([float(ms) for ms in range(1, 102)])
+        self.assertEqual(summary, {'mean_ms': 51, 'min_ms': 1, 'max_ms': 101, 'p50_ms': 51, 'p95_ms': 96,
+                                   'p99_ms': 100})
+        self.assertEqual(LineUsBenchmark.latency_summary([1.0, 2.0])['p50_ms'], 1.5)
+
+    def test_mdns_uses_a_fresh_search(self):
+        with lineus.LineUs() as my_line_us:
+            my_line_us.start_discovery()
+            shared = DiscoveryService._instance
+            result = LineUsBenchmark.run_mdns(timeout=.1)
+            self.assertIs(DiscoveryService._instance, shared)
+            self.assertEqual(shared._references, 1)
+            self.assertFalse(shared.zeroconf.done)
+        self.assertIn('found', result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import os
+import tempfile
+import lineus
+from lineus.emulator import LineUsEmulator
+
+
+class TestDiscoveryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = LineUsEmulator().start()
+        self.my_line_us = lineus.LineUs()
+
+    def tearDown(self):
+        self.my_line_us.close()
+        self.emulator.stop()
+
+    def test_expiry(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'discovery.json')
+            cache = lineus.DiscoveryCache(path, ttl=60)
+            cache.add(('old', 'old.local', '192.168.1.20', 1337))
+            cache.add(('new', 'new.local', '192.168.1.21', 1337))
+            cache._entries['old']['last_seen'] -= 120
+            self.assertIsNone(cache.get('old'))
+            self.assertEqual(cache.get('new.local')['address'], '192.168.1.21')
+            self.assertEqual([entry['name'] for entry in lineus.DiscoveryCache(path, ttl=60).get_all()], ['new'])
+
+    def test_connect_from_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = lineus.DiscoveryCache(os.path.join(directory, 'discovery.json'))
+            cache.add(self.emulator.get_line_us())
+            self.my_line_us.cache = cache
+            # The name does not resolve, so this can only connect through the cached address
+            self.assertTrue(self.my_line_us.connect('line-us-emulator'))
+            self.assertIsNone(self.my_line_us._discovery)
+            self.assertEqual(self.my_line_us.send_gcode('M114'), 'ok X:1000.00 Y:1000.00 Z:1000.00')
+            self.my_line_us.disconnect()
+            self.assertTrue(self.my_line_us.connect())
+            self.assertIsNone(self.my_line_us._discovery)
+
+    def test_rejects_other_machine(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = lineus.DiscoveryCache(os.path.join(directory, 'discovery.json'))
+            cache.add(('studio', 'studio.local', self.emulator.host, self.emulator.port))
+            self.my_line_us.cache = cache
+            # The cached address now belongs to line-us-emulator, and nothing listens on 127.0.0.1:1337
+            self.assertFalse(self.my_line_us.connect(self.emulator.host))
+            self.assertFalse(self.my_line_us.connected())
+
+    def test_only_most_recent_without_name(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = lineus.DiscoveryCache(os.path.join(directory, 'discovery.json'))
+            cache.add(self.emulator.get_line_us())
+            stopped = LineUsEmulator(name='line-us-stopped').start()
+            cache.add(stopped.get_line_us())
+            stopped.stop()
+            self.my_line_us.cache = cache
+            tried = []
+            connect_cached = self.my_line_us._connect_cached
+
+            def spy(entry, *args):
+                tried.append(entry['name'])
+                return connect_cached(entry, *args)
+
+            self.my_line_us._connect_cached = spy
+            self.assertFalse(self.my_line_us.connect(wait=0))
+            self.assertEqual(tried, ['line-us-stopped'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import math
+import numpy
+from lineus.curves import flatten_arcs, flatten_cubic, flatten_quadratic
+
+
+def _distance_to_polyline(points, polyline):
+    """The distance from each point to the nearest segment of polyline"""
+    a = polyline[:-1][None]
+    b = polyline[1:][None]
+    p = points[:, None]
+    ab = b - a
+    length = numpy.maximum((ab ** 2).sum(axis=2), 1e-12)
+    t = numpy.clip(((p - a) * ab).sum(axis=2) / length, 0, 1)
+    nearest = a + t[..., None] * ab
+    return numpy.sqrt(((p - nearest) ** 2).sum(axis=2)).min(axis=1)
+
+
+class TestCurves(unittest.TestCase):
+
+    def test_cubic_within_tolerance(self):
+        generator = numpy.random.default_rng(1)
+        curves = generator.uniform(-1000, 1000, (50, 4, 2))
+        paths = flatten_cubic(curves, tolerance=1.5)
+        self.assertEqual(len(paths), 50)
+        t = numpy.linspace(0, 1, 500)[:, None]
+        for curve, path in zip(curves, paths):
+            numpy.testing.assert_allclose(path[[0, -1]], curve[[0, -1]])
+            exact = ((1 - t) ** 3 * curve[0] + 3 * t * (1 - t) ** 2 * curve[1] + 3 * t ** 2 * (1 - t) * curve[2]
+                     + t ** 3 * curve[3])
+            self.assertLessEqual(_distance_to_polyline(exact, path).max(), 1.5)
+
+    def test_straight_lines_are_one_segment(self):
+        self.assertEqual(len(flatten_cubic([[(0, 0), (10, 0), (20, 0), (30, 0)]])[0]), 2)
+        self.assertEqual(len(flatten_quadratic([[(0, 0), (10, 10), (20, 20)]])[0]), 2)
+        self.assertEqual(flatten_cubic(numpy.empty((0, 4, 2))), [])
+
+    def test_arcs(self):
+        paths = flatten_arcs([(1200, 0, 300, 0, 360), (1200, 0, 300, 90, -90), (1000, 0, 10, 0, 180)], tolerance=1)
+        numpy.testing.assert_allclose(paths[0][0], paths[0][-1], atol=1e-9)
+        numpy.testing.assert_allclose(paths[1][[0, -1]], [(1200, 300), (1500, 0)], atol=1e-9)
+        for path, radius in zip(paths, (300, 300, 10)):
+            segment = numpy.hypot(*numpy.diff(path, axis=0).T).max()
+            self.assertLessEqual(radius - math.sqrt(radius ** 2 - (segment / 2) ** 2), 1 + 1e-9)
+        self.assertLess(len(paths[2]), len(paths[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
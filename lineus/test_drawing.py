@@ -0,0 +1,60 @@
+import unittest
+import os
+import tempfile
+import numpy
+import lineus
+from lineus.drawing import Drawing
+from lineus.emulator import LineUsEmulator
+
+
+class TestDrawing(unittest.TestCase):
+
+    strokes = [[(900, 300), (900, -300)], [], [(1200, 300), (1200, -300), (1300, 0)]]
+
+    def test_from_strokes(self):
+        drawing = Drawing.from_strokes(self.strokes)
+        self.assertEqual(len(drawing), 2)
+        self.assertEqual(drawing.point_count(), 5)
+        self.assertEqual(drawing.points.dtype, numpy.int16)
+        self.assertEqual(drawing.stroke(1).tolist(), [[1200, 300], [1200, -300], [1300, 0]])
+        self.assertEqual(drawing.bounds(), (900, -300, 1300, 300))
+
+    def test_float_points(self):
+        drawing = Drawing.from_strokes([[(900.5, 300), (900, -300)]])
+        self.assertEqual(drawing.points.dtype, numpy.float32)
+
+    def test_save_and_load(self):
+        drawing = Drawing.from_strokes(self.strokes)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'drawing.lus')
+            drawing.save(path)
+            for mmap in (True, False):
+                loaded = Drawing.load(path, mmap=mmap)
+                self.assertEqual(loaded.offsets.tolist(), drawing.offsets.tolist())
+                self.assertEqual(loaded.points.tolist(), drawing.points.tolist())
+            del loaded
+
+    def test_moves(self):
+        drawing = Drawing.from_strokes(self.strokes)
+        moves = numpy.concatenate(list(drawing.moves(chunk_points=2)))
+        self.assertEqual(moves.tolist(), [[900, 300, 1000], [900, 300, 0], [900, -300, 0], [900, -300, 1000],
+                                          [1200, 300, 1000], [1200, 300, 0], [1200, -300, 0], [1300, 0, 0],
+                                          [1300, 0, 1000]])
+        self.assertEqual(next(drawing.gcode()), 'G01 X900 Y300 Z1000')
+
+    def test_draw(self):
+        drawing = Drawing.from_strokes(self.strokes)
+        with LineUsEmulator() as emulator:
+            my_line_us = lineus.LineUs()
+            my_line_us.connect(emulator.get_line_us())
+            progress = []
+            errors = drawing.draw(my_line_us, progress=lambda drawn, total: progress.append((drawn, total)))
+            position = my_line_us.send_gcode('M114')
+            my_line_us.close()
+        self.assertEqual(errors, 0)
+        self.assertEqual(progress[-1], (2, 2))
+        self.assertEqual(position, 'ok X:1300.00 Y:0.00 Z:1000.00')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import socket
+import lineus
+from lineus.emulator import LineUsEmulator
+
+
+class TestEmulator(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = LineUsEmulator().start()
+        self.my_line_us = lineus.LineUs()
+
+    def tearDown(self):
+        self.my_line_us.close()
+        self.emulator.stop()
+
+    def test_connect(self):
+        success = self.my_line_us.connect(self.emulator.get_line_us())
+        self.assertTrue(success)
+        self.assertEqual(self.my_line_us.get_hello_string()['NAME'], 'line-us-emulator')
+
+    def test_connect_by_address_does_not_start_discovery(self):
+        self.assertTrue(self.my_line_us.connect(self.emulator.get_line_us()))
+        self.assertIsNone(self.my_line_us._discovery)
+
+    def test_g01(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        reply = self.my_line_us.g01(1200, -300, 0)
+        self.assertEqual(reply, 'ok X:1200.00 Y:-300.00 Z:0.00')
+        self.assertEqual(self.my_line_us.send_gcode('M114'), 'ok X:1200.00 Y:-300.00 Z:0.00')
+        self.assertEqual(self.my_line_us.send_gcode('G28'), 'ok X:1000.00 Y:1000.00 Z:1000.00')
+
+    def test_position(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        self.assertIsNone(self.my_line_us.get_position())
+        self.my_line_us.g01(1200, -300, 0)
+        self.assertEqual(self.my_line_us.get_position(), (1200, -300, 0))
+        self.my_line_us.send_gcode('G28')
+        self.assertEqual(self.my_line_us.get_position(), (1000, 1000, 1000))
+        self.my_line_us.skip_redundant = True
+        count = self.emulator.command_count
+        self.assertEqual(self.my_line_us.g01(z=1000), 'ok X:1000.00 Y:1000.00 Z:1000.00')
+        self.assertEqual(self.emulator.command_count, count)
+        self.assertEqual(self.my_line_us.commands_saved, 1)
+
+    def test_get_info(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        info = self.my_line_us.get_info()
+        self.assertEqual(info['name'], 'line-us-emulator')
+        self.assertEqual(info['mac'], 'C:3A:E8:18:0A:60')
+
+    def test_split_replies(self):
+        self.emulator.split = 3
+        self.my_line_us.connect(self.emulator.get_line_us())
+        replies = []
+        result = self.my_line_us.stream_gcode([f'G01 X{x} Y0 Z0' for x in range(1000, 1100)], window=8,
+                                              on_result=lambda gcode, reply: replies.append(reply))
+        self.assertEqual(result, {'sent': 100, 'errors': 0})
+        self.assertEqual(replies[-1], 'ok X:1099.00 Y:0.00 Z:0.00')
+
+    def test_dropped_reply_times_out(self):
+        self.emulator.drop_rate = 1
+        self.my_line_us.connect(self.emulator.get_line_us(), timeout=.2)
+        with self.assertRaises(socket.timeout):
+            self.my_line_us.send_gcode('M114')
+
+    def test_disconnect(self):
+        self.emulator.disconnect_after = 1
+        self.my_line_us.connect(self.emulator.get_line_us())
+        self.my_line_us.send_gcode('M114')
+        with self.assertRaises(OSError):
+            self.my_line_us.send_gcode('M114')
+            self.my_line_us.send_gcode('M114')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
+import asyncio
 import lineus
 import time
+import socket
+import threading
 
 
 class TestConnect(unittest.TestCase):
@@ -29,6 +32,13 @@ class TestConnect(unittest.TestCase):
         my_line_us.disconnect()
         self.assertTrue(success)
 
+    def test_wait_for(self):
+        my_line_us = lineus.LineUs()
+        line_us = my_line_us.wait_for('line-us', timeout=5)
+        my_line_us.close()
+        self.assertIsInstance(line_us, tuple)
+        self.assertEqual(line_us[0], 'line-us')
+
     def test_unsuccessful_connect(self):
         my_line_us = lineus.LineUs()
         success = my_line_us.connect('wgrhmftmf.local')
@@ -73,8 +83,10 @@ class TestConnect(unittest.TestCase):
 
     def test_get_line_us_list(self):
         my_line_us = lineus.LineUs()
+        my_line_us.start_discovery()
         time.sleep(.5)
         line_us_list = my_line_us.get_line_us_list()
+        my_line_us.close()
         self.assertIsInstance(line_us_list, list)
 
     def test_get_info(self):
@@ -125,6 +137,16 @@ class TestConnect(unittest.TestCase):
         self.assertGreater(len(reply), 0)
         self.assertIsInstance(reply, str)
 
+    def test_stream_gcode(self):
+        my_line_us = lineus.LineUs()
+        my_line_us.connect()
+        replies = []
+        result = my_line_us.stream_gcode(['G01 X1000 Y0 Z1000', 'G01 X1000 Y500 Z1000', 'M114'], window=2,
+                                         on_result=lambda gcode, reply: replies.append(reply))
+        my_line_us.disconnect()
+        self.assertEqual(result, {'sent': 3, 'errors': 0})
+        self.assertEqual(len(replies), 3)
+
     def test_ping(self):
         my_line_us = lineus.LineUs()
         ping_stats = my_line_us.ping('line-us.local')
@@ -157,5 +179,193 @@ class TestConnect(unittest.TestCase):
         self.assertIsInstance(line_us_list, list)
 
 
+class TestNetFinder(unittest.TestCase):
+
+    def setUp(self):
+        self.finder = lineus.lineus.NetFinder()
+        self.finder.network_list = [{'name': 'en0', 'addr': '192.168.1.3', 'netmask': '255.255.255.248',
+                                     'broadcast': '192.168.1.7', 'gateway': '192.168.1.4'},
+                                    {'name': 'en1', 'addr': '10.1.0.2', 'netmask': '255.255.255.252',
+                                     'broadcast': '10.1.0.3'}]
+
+    def _ips(self, *args, **kwargs):
+        return [str(ip) for ip in self.finder.get_all_ips(*args, **kwargs)]
+
+    def test_address_order(self):
+        self.assertEqual(self._ips(), ['192.168.1.1', '192.168.1.2', '192.168.1.3', '192.168.1.4', '192.168.1.5',
+                                       '192.168.1.6', '10.1.0.1', '10.1.0.2'])
+        self.assertEqual(self._ips(1), ['10.1.0.1', '10.1.0.2'])
+
+    def test_near(self):
+        self.assertEqual(self._ips(0, near='gateway'), ['192.168.1.4', '192.168.1.5', '192.168.1.3', '192.168.1.6',
+                                                        '192.168.1.2', '192.168.1.1'])
+        self.assertEqual(self._ips(0, near='192.168.1.1'), ['192.168.1.1', '192.168.1.2', '192.168.1.3',
+                                                            '192.168.1.4', '192.168.1.5', '192.168.1.6'])
+        # en1 has no gateway so the search starts from its own address
+        self.assertEqual(self._ips(1, near='gateway'), ['10.1.0.2', '10.1.0.1'])
+        self.assertEqual(self._ips(1, near='172.16.0.1'), ['10.1.0.1', '10.1.0.2'])
+
+    def test_prefer(self):
+        ips = self._ips(prefer=['192.168.1.5', '10.1.0.1', '192.168.1.5', '172.16.0.1', 'not an ip'], near='gateway')
+        self.assertEqual(ips, ['192.168.1.5', '10.1.0.1', '192.168.1.4', '192.168.1.3', '192.168.1.6', '192.168.1.2',
+                               '192.168.1.1', '10.1.0.2'])
+
+    def test_large_network_is_lazy(self):
+        self.finder.network_list = [{'name': 'en0', 'addr': '10.20.30.40', 'netmask': '255.0.0.0',
+                                     'broadcast': '10.255.255.255'}]
+        ips = self.finder.get_all_ips(near='10.20.30.40')
+        self.assertEqual([str(next(ips)) for i in range(0, 3)], ['10.20.30.40', '10.20.30.41', '10.20.30.39'])
+
+
+class TestDiscoveryService(unittest.TestCase):
+
+    def setUp(self):
+        # Start from no search, whatever other tests have left running
+        self.running = lineus.lineus.DiscoveryService._instance
+        lineus.lineus.DiscoveryService._instance = None
+
+    def tearDown(self):
+        lineus.lineus.DiscoveryService._instance = self.running
+
+    def test_shared_and_reference_counted(self):
+        first = lineus.LineUs()
+        second = lineus.LineUs()
+        self.assertIsNone(first._discovery)
+        first.start_discovery()
+        first.start_discovery()
+        second.start_discovery()
+        service = first._discovery
+        self.assertIs(second._discovery, service)
+        self.assertIs(lineus.lineus.DiscoveryService._instance, service)
+        self.assertEqual(service._references, 2)
+        first.close()
+        first.close()
+        self.assertEqual(service._references, 1)
+        self.assertFalse(service.zeroconf.done)
+        second.close()
+        self.assertIsNone(lineus.lineus.DiscoveryService._instance)
+        self.assertTrue(service.zeroconf.done)
+
+    def test_restarts_after_shutdown(self):
+        with lineus.LineUs() as my_line_us:
+            first = my_line_us.listener
+        with lineus.LineUs() as my_line_us:
+            self.assertIsNot(my_line_us.listener, first)
+
+
+class FakeServiceInfo:
+
+    def __init__(self, server, address, port=1337):
+        self.server = server
+        self.addresses = [socket.inet_aton(address)]
+        self.port = port
+
+
+class FakeZeroconf:
+
+    def __init__(self):
+        self.services = {}
+
+    def get_service_info(self, service_type, name):
+        return self.services.get(name)
+
+
+class TestListener(unittest.TestCase):
+
+    _service = 'line-us._lineus._tcp.local.'
+    _service_type = '_lineus._tcp.local.'
+
+    def setUp(self):
+        self.zeroconf = FakeZeroconf()
+        self.listener = lineus.lineus.LineUsListener()
+
+    def _announce(self, server, address, update=False, service=None):
+        service = service or self._service
+        self.zeroconf.services[service] = FakeServiceInfo(server, address)
+        if update:
+            self.listener.update_service(self.zeroconf, self._service_type, service)
+        else:
+            self.listener.add_service(self.zeroconf, self._service_type, service)
+
+    def test_lookup(self):
+        found = []
+        self.listener.on_found_line_us(found.append)
+        self._announce('line-us.local.', '192.168.1.20')
+        line_us = ('line-us', 'line-us.local.', '192.168.1.20', 1337)
+        for key in ('line-us', 'line-us.local.', 'line-us.local', '192.168.1.20', 0):
+            self.assertEqual(self.listener.get_line_us(key), line_us)
+        self.assertIsNone(self.listener.get_line_us('other'))
+        self.assertEqual(found, [line_us])
+        self._announce('line-us.local.', '192.168.1.20')
+        self.assertEqual(len(found), 1)
+
+    def test_update_reindexes(self):
+        self._announce('line-us.local.', '192.168.1.20')
+        self._announce('studio.local.', '192.168.1.21', update=True)
+        self.assertIsNone(self.listener.get_line_us('line-us'))
+        self.assertIsNone(self.listener.get_line_us('192.168.1.20'))
+        self.assertEqual(self.listener.get_line_us('192.168.1.21')[0], 'studio')
+        self.assertEqual(self.listener.get_line_us_list(), [('studio', 'studio.local.', '192.168.1.21', 1337)])
+        self.assertEqual(self.listener.line_us_list, self.listener.get_line_us_list())
+
+    def test_remove_after_address_change(self):
+        self._announce('line-us.local.', '192.168.1.20')
+        self._announce('line-us.local.', '192.168.1.30', update=True)
+        self.listener.remove_service(self.zeroconf, self._service_type, self._service)
+        for key in ('line-us', 'line-us.local', '192.168.1.20', '192.168.1.30'):
+            self.assertIsNone(self.listener.get_line_us(key))
+        self.assertEqual(self.listener._index, {})
+
+    def test_remove_keeps_other_service_keys(self):
+        # A second service takes over an address, removing the first must not lose the second
+        self._announce('line-us.local.', '192.168.1.20')
+        self._announce('studio.local.', '192.168.1.20', service='studio._lineus._tcp.local.')
+        self.listener.remove_service(self.zeroconf, self._service_type, self._service)
+        self.assertEqual(self.listener.get_line_us('192.168.1.20')[0], 'studio')
+
+    def test_snapshot(self):
+        self._announce('line-us.local.', '192.168.1.20')
+        self._announce('studio.local.', '192.168.1.21', service='studio._lineus._tcp.local.')
+        snapshot = self.listener.snapshot()
+        self.assertEqual([(line_us['name'], line_us['address'], line_us['port']) for line_us in snapshot],
+                         [('line-us', '192.168.1.20', 1337), ('studio', '192.168.1.21', 1337)])
+        self.assertLessEqual(snapshot[0]['last_seen'], time.time())
+        snapshot[0]['name'] = 'changed'
+        self.assertEqual(self.listener.snapshot()[0]['name'], 'line-us')
+
+    def test_wait_for(self):
+        self.assertIsNone(self.listener.wait_for('studio', timeout=.05))
+        timer = threading.Timer(.1, self._announce, ('studio.local.', '192.168.1.21'))
+        timer.start()
+        line_us = self.listener.wait_for('studio', timeout=5)
+        timer.join()
+        self.assertEqual(line_us[2], '192.168.1.21')
+        self.assertEqual(self.listener.wait_for(timeout=0)[0], 'studio')
+
+
+class TestAsync(unittest.TestCase):
+
+    def test_async_connect_and_g01(self):
+        async def run():
+            my_line_us = lineus.AsyncLineUs()
+            success = await my_line_us.connect('line-us.local')
+            reply = await my_line_us.g01(1000, 1000, 1000, timeout=5)
+            await my_line_us.disconnect()
+            return success, reply
+        success, reply = asyncio.run(run())
+        self.assertTrue(success)
+        self.assertTrue(reply.startswith('ok'))
+
+    def test_async_get_info(self):
+        async def run():
+            my_line_us = lineus.AsyncLineUs()
+            await my_line_us.connect('line-us.local')
+            info = await my_line_us.get_info()
+            await my_line_us.disconnect()
+            return info
+        info = asyncio.run(run())
+        self.assertIsInstance(info, dict)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import random
+from lineus.optimise import StrokeOptimiser, optimise_strokes, strokes_to_gcode
+
+
+class TestOptimise(unittest.TestCase):
+
+    def test_nearest_first(self):
+        strokes = [[(1500, 0), (1600, 0)], [(1000, 1000), (1100, 1000)], [(1100, 1000), (1200, 900)]]
+        optimised = optimise_strokes(strokes, reverse=False, start=(1000, 1000), time_budget=0)
+        self.assertEqual(optimised, [strokes[1], strokes[2], strokes[0]])
+
+    def test_reverse(self):
+        strokes = [[(1000, 0), (1000, 100)], [(1000, 500), (1000, 110)]]
+        optimised = optimise_strokes(strokes, start=(1000, 0), time_budget=0)
+        self.assertEqual(optimised, [strokes[0], strokes[1][::-1]])
+
+    def test_keeps_every_stroke_and_reduces_travel(self):
+        generator = random.Random(1)
+        strokes = []
+        for i in range(0, 2000):
+            x = generator.uniform(650, 1775)
+            y = generator.uniform(-1000, 1000)
+            strokes.append([(x, y), (x + generator.uniform(-30, 30), y + generator.uniform(-30, 30))])
+        optimiser = StrokeOptimiser(time_budget=.5)
+        optimised = optimiser.optimise(strokes)
+        self.assertEqual(sorted(tuple(sorted(stroke)) for stroke in optimised),
+                         sorted(tuple(sorted(stroke)) for stroke in strokes))
+        self.assertLessEqual(optimiser.stats['travel_after'], optimiser.stats['travel_greedy'])
+        self.assertLess(optimiser.stats['travel_greedy'], optimiser.stats['travel_before'] / 10)
+
+    def test_clustered_strokes(self):
+        # Two tight clusters inside a page frame, which a bounding box sized grid would put in a few cells
+        generator = random.Random(2)
+        strokes = [[(650, -1000), (1775, -1000)], [(1775, 1000), (650, 1000)]]
+        for i in range(0, 100000):
+            x, y = (900, -500) if i % 2 else (1500, 600)
+            x = generator.gauss(x, 20)
+            y = generator.gauss(y, 20)
+            strokes.append([(x, y), (x + generator.uniform(-3, 3), y + generator.uniform(-3, 3))])
+        optimiser = StrokeOptimiser(time_budget=.5)
+        optimised = optimiser.optimise(strokes)
+        self.assertEqual(len(optimised), len(strokes))
+        self.assertLess(optimiser.stats['seconds'], 60)
+        # The time budget starts after the greedy pass, so 2-opt always gets its turn
+        self.assertLess(optimiser.stats['travel_after'], optimiser.stats['travel_greedy'])
+
+    def test_gcode(self):
+        gcode = list(strokes_to_gcode([[(1000, 0), (1100, 0)]]))
+        self.assertEqual(gcode, ['G01  X1000 Y0 Z1000', 'G01  Z0', 'G01  X1100 Y0', 'G01  Z1000'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import os
+import socket
+import threading
+import time
+from lineus.emulator import LineUsEmulator
+from lineus.lineus import DiscoveryService
+from lineus.pool import LineUsPool
+
+
+class TestPool(unittest.TestCase):
+
+    def setUp(self):
+        self.emulators = [LineUsEmulator(name=f'line-us-{i}', processing=.001).start() for i in range(0, 3)]
+
+    def tearDown(self):
+        for emulator in self.emulators:
+            emulator.stop()
+
+    def test_jobs_shared_between_machines(self):
+        gcode = [f'G01 X{1000 + i} Y0 Z0' for i in range(0, 20)]
+        with LineUsPool([emulator.get_line_us() for emulator in self.emulators], discover=False) as pool:
+            futures = [pool.submit_gcode(gcode) for _ in range(0, 30)]
+        self.assertEqual([future.result() for future in futures], [{'sent': 20, 'errors': 0}] * 30)
+        self.assertEqual(sum(emulator.command_count for emulator in self.emulators), 600)
+        stats = pool.stats()
+        self.assertEqual(sum(machine['jobs'] for machine in stats.values()), 30)
+        for machine in stats.values():
+            self.assertGreater(machine['jobs'], 0)
+            self.assertTrue(0 < machine['utilisation'] <= 1)
+
+    def test_priority(self):
+        order = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocker(line_us):
+            started.set()
+            release.wait()
+
+        pool = LineUsPool([self.emulators[0].get_line_us()], discover=False)
+        try:
+            pool.submit(blocker)
+            started.wait()
+            for priority in (5, 1, 3, 1):
+                pool.submit(lambda line_us, priority=priority: order.append(priority), priority=priority)
+            release.set()
+            self.assertTrue(pool.join(timeout=5))
+        finally:
+            pool.close()
+        self.assertEqual(order, [1, 1, 3, 5])
+
+    def test_machine_drops_off(self):
+        pool = LineUsPool([emulator.get_line_us() for emulator in self.emulators[:2]], discover=False)
+        try:
+            lost = self.emulators[0]
+
+            def job(line_us):
+                if line_us.get_name() == lost.name and lost._running:
+                    lost.stop()
+                return line_us.send_gcode('M114')
+
+            futures = [pool.submit(job) for _ in range(0, 10)]
+            self.assertTrue(pool.join(timeout=10))
+            self.assertTrue(all(future.result().startswith('ok') for future in futures))
+            pool.add_machine(self.emulators[2].get_line_us())
+            self.assertEqual(pool.submit(lambda line_us: line_us.get_name(), priority=-1).result(timeout=5)[:8],
+                             'line-us-')
+        finally:
+            pool.close()
+
+    def test_no_machines_left(self):
+
+        class QuickPool(LineUsPool):
+            _default_reconnect_interval = .05
+
+        unreachable = self.emulators[0].get_line_us()
+        self.emulators[0].stop()
+        with QuickPool([unreachable], discover=False) as pool:
+            future = pool.submit(lambda line_us: line_us.send_gcode('M114'))
+        self.assertIsInstance(future.exception(timeout=5), ConnectionError)
+
+    def test_empty_pool(self):
+        with LineUsPool(discover=False) as pool:
+            future = pool.submit(lambda line_us: None)
+        self.assertIsInstance(future.exception(timeout=5), ConnectionError)
+
+    def test_job_errors_are_not_lost_connections(self):
+        def job(line_us):
+            open(os.path.join(os.path.dirname(__file__), 'missing.gcode'))
+
+        with LineUsPool([self.emulators[0].get_line_us()], discover=False) as pool:
+            failed = pool.submit(job)
+            self.assertIsInstance(failed.exception(timeout=5), FileNotFoundError)
+            self.assertEqual(pool.submit(lambda line_us: line_us.get_name()).result(timeout=5), 'line-us-0')
+        self.assertEqual(pool.stats()['line-us-0']['failed_jobs'], 1)
+
+    def test_exit_without_machines(self):
+
+        class QuickPool(LineUsPool):
+            _default_exit_wait = .2
+
+        running = DiscoveryService._instance
+        DiscoveryService._instance = None
+        try:
+            with QuickPool() as pool:
+                future = pool.submit(lambda line_us: None)
+        finally:
+            DiscoveryService._instance = running
+        self.assertTrue(future.cancelled())
+
+    def test_machine_comes_back(self):
+
+        class QuickPool(LineUsPool):
+            _default_reconnect_interval = .05
+
+        class ServiceInfo:
+            server = 'line-us-0.local.'
+            addresses = [socket.inet_aton(self.emulators[0].host)]
+            port = self.emulators[0].port
+
+        class Zeroconf:
+
+            @staticmethod
+            def get_service_info(service_type, name):
+                return ServiceInfo
+
+        running = DiscoveryService._instance
+        DiscoveryService._instance = None
+        pool = QuickPool()
+        try:
+            listener = pool._discovery.listener
+            listener.add_service(Zeroconf, '_lineus._tcp.local.', 'line-us-0._lineus._tcp.local.')
+            self.assertEqual(pool.submit(lambda line_us: line_us.get_name()).result(timeout=5), 'line-us-0')
+            self.emulators[0].stop()
+            # The job finds the connection gone, and the machine is dropped after failing to reconnect
+            future = pool.submit(lambda line_us: line_us.send_gcode('M114'), retries=5)
+            self.assertTrue(self._wait_for(lambda: 'line-us-0' not in pool.stats()))
+            self.emulators[0] = LineUsEmulator(name='line-us-0', port=ServiceInfo.port).start()
+            listener.update_service(Zeroconf, '_lineus._tcp.local.', 'line-us-0._lineus._tcp.local.')
+            self.assertEqual(future.result(timeout=5), 'ok X:1000.00 Y:1000.00 Z:1000.00')
+        finally:
+            pool.close()
+            DiscoveryService._instance = running
+
+    @staticmethod
+    def _wait_for(condition, timeout=5):
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            if time.perf_counter() > deadline:
+                return False
+            time.sleep(.01)
+        return True
+
+
+if __name__ == '__main__':
+    unittest.main()
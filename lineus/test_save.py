@@ -0,0 +1,96 @@
+import unittest
+import os
+import tempfile
+import lineus
+from lineus.emulator import LineUsEmulator
+
+
+class TestSave(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = LineUsEmulator().start()
+        self.my_line_us = lineus.LineUs()
+
+    def tearDown(self):
+        self.my_line_us.close()
+        self.emulator.stop()
+
+    def test_save_and_list_files(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        self.my_line_us.save_to_lineus('G28\nG01 X1000 Y0\n', 2)
+        files = self.my_line_us.list_lineus_files()
+        self.assertEqual(files, [('2', '17', '/0000002.txt')])
+
+    def test_save_with_progress(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        progress = []
+        gcode = [f'G01 X{x} Y0 Z0' for x in range(1000, 1050)]
+        reply = self.my_line_us.save_to_lineus(gcode, 3, window=8, verify=True,
+                                               progress=lambda saved, total: progress.append((saved, total)))
+        self.assertEqual(reply, 'ok')
+        self.assertEqual(progress[-1], (50, 50))
+        self.assertEqual(self.emulator.files[3], '\n'.join(gcode) + '\n')
+
+    def test_save_source_error(self):
+        self.my_line_us.connect(self.emulator.get_line_us(), timeout=2)
+
+        def gcode():
+            yield 'G28'
+            yield 'G01 X1000 Y0'
+            raise ValueError('bad artwork')
+
+        with self.assertRaises(ValueError):
+            self.my_line_us.save_to_lineus(gcode(), 5, window=1)
+        self.assertEqual(self.emulator.files[5], 'G28\nG01 X1000 Y0\n')
+        self.assertEqual(self.my_line_us.send_gcode('M114'), 'ok X:1000.00 Y:1000.00 Z:1000.00')
+
+    def test_save_error_reply(self):
+
+        class RejectingEmulator(LineUsEmulator):
+
+            def _reply(self, command, session):
+                if session['saving'] is not None and command == 'bad':
+                    return 'error Bad line'
+                return LineUsEmulator._reply(self, command, session)
+
+        rejecting = RejectingEmulator().start()
+        try:
+            self.my_line_us.connect(rejecting.get_line_us())
+            progress = []
+            reply = self.my_line_us.save_to_lineus('G28\nbad\nG01 X1000 Y0\n', 6,
+                                                   progress=lambda saved, total: progress.append(saved))
+        finally:
+            rejecting.stop()
+        self.assertIsNone(reply)
+        self.assertEqual(progress, [1, 2])
+
+    def test_save_retries_after_disconnect(self):
+        self.emulator.disconnect_after = 4
+        self.my_line_us.connect(self.emulator.get_line_us())
+        reopen = self.my_line_us._open
+
+        def reopen_without_disconnect(*args):
+            self.emulator.disconnect_after = None
+            return reopen(*args)
+
+        self.my_line_us._open = reopen_without_disconnect
+        reply = self.my_line_us.save_to_lineus('G28\nG01 X1000 Y0\nG01 X1000 Y500\nG28\n', 4, verify=True, retries=1)
+        self.assertEqual(reply, 'ok')
+        self.assertEqual(self.emulator.files[4], 'G28\nG01 X1000 Y0\nG01 X1000 Y500\nG28\n')
+
+    def test_sync_drawings(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = lineus.SlotManifest(os.path.join(directory, 'manifest.json'))
+            drawings = {1: 'G28\nG01 X1000 Y0\n', 2: ['G28', 'G01 X1200 Y0']}
+            self.assertEqual(self.my_line_us.sync_drawings(drawings, manifest), {'saved': [1, 2], 'unchanged': []})
+            commands = self.emulator.command_count
+            self.assertEqual(self.my_line_us.sync_drawings(drawings, manifest), {'saved': [], 'unchanged': [1, 2]})
+            self.assertEqual(self.emulator.command_count, commands + 1)
+            drawings[2] = ['G28', 'G01 X1300 Y0']
+            self.emulator.files[1] = 'G28\n'
+            self.assertEqual(self.my_line_us.sync_drawings(drawings, manifest), {'saved': [1, 2], 'unchanged': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+import errno
+from lineus.emulator import LineUsEmulator
+from lineus.lineus import LineUsScanner
+
+
+class TestScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = LineUsEmulator().start()
+
+    def tearDown(self):
+        self.emulator.stop()
+
+    def test_scanner(self):
+        scanner = LineUsScanner(timeout=.5, port=self.emulator.port)
+        found = list(scanner.scan(['127.0.0.1']))
+        self.assertEqual(found, [('line-us-emulator', 'line-us-emulator.local', '127.0.0.1', self.emulator.port)])
+
+    def test_scanner_out_of_file_descriptors(self):
+
+        class LimitedScanner(LineUsScanner):
+
+            def _start_probe(self, selector, ip):
+                if len(selector.get_map()) >= 2:
+                    raise OSError(errno.EMFILE, 'Too many open files')
+                LineUsScanner._start_probe(self, selector, ip)
+
+        scanner = LimitedScanner(timeout=.5, port=self.emulator.port)
+        found = list(scanner.scan(['127.0.0.1'] * 5))
+        self.assertEqual(len(found), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import numpy
+from lineus.simplify import simplify_polylines
+
+
+class TestSimplify(unittest.TestCase):
+
+    def test_straight_line(self):
+        line = numpy.array([(1000, 0), (1100, 1), (1200, 0), (1300, -1), (1400, 0)], dtype=numpy.int16)
+        simplified, stats = simplify_polylines([line], tolerance=2)
+        self.assertEqual(simplified[0].tolist(), [[1000, 0], [1400, 0]])
+        self.assertEqual(simplified[0].dtype, numpy.int16)
+        self.assertEqual(stats['points_removed'], 3)
+
+    def test_corner_kept(self):
+        corner = [(0, 0), (50, 0.5), (100, 0), (100, 50), (100, 100)]
+        simplified, stats = simplify_polylines([corner], tolerance=1)
+        self.assertEqual(simplified[0].tolist(), [[0, 0], [100, 0], [100, 100]])
+
+    def test_many_polylines_keep_z(self):
+        polylines = [[(0, 0, 0), (5, 0.1, 0), (10, 0, 0)], [], [(3, 3, 1000)], [(0, 0, 0), (10, 10, 0)]]
+        simplified, stats = simplify_polylines(polylines, tolerance=1)
+        self.assertEqual([len(polyline) for polyline in simplified], [2, 0, 1, 2])
+        self.assertEqual(simplified[2].tolist(), [[3, 3, 1000]])
+        self.assertEqual(stats, {'polylines': 4, 'points_before': 6, 'points_after': 5, 'points_removed': 1})
+
+    def test_mixed_dimensions(self):
+        polylines = [[(0, 0), (5, 0.1), (10, 0)], [(0, 0, 1000), (5, 5, 1000), (10, 0, 1000)]]
+        simplified, stats = simplify_polylines(polylines, tolerance=1)
+        self.assertEqual(simplified[0].tolist(), [[0, 0], [10, 0]])
+        self.assertEqual(simplified[1].tolist(), [[0, 0, 1000], [5, 5, 1000], [10, 0, 1000]])
+
+    def test_pen_changes_kept(self):
+        stroke = [(0, 0, 1000), (0, 0, 0), (10, 0, 0), (20, 0, 0), (20, 0, 1000), (30, 0, 1000)]
+        simplified, stats = simplify_polylines([stroke, [(0, 0), (5, 0), (10, 0)]], tolerance=1)
+        self.assertEqual(simplified[0].tolist(), [[0, 0, 1000], [0, 0, 0], [20, 0, 0], [20, 0, 1000],
+                                                  [30, 0, 1000]])
+        self.assertEqual(simplified[1].tolist(), [[0, 0], [10, 0]])
+
+    def test_bad_shape(self):
+        with self.assertRaises(ValueError):
+            simplify_polylines([[(0, 0), (10, 0)], [0, 1, 2]], tolerance=1)
+        with self.assertRaises(ValueError):
+            simplify_polylines([[(0, 0, 0, 0), (10, 0, 0, 0)]], tolerance=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
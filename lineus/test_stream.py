@@ -0,0 +1,85 @@
+import unittest
+import numpy
+import lineus
+from lineus.emulator import LineUsEmulator
+
+
+class TestStream(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = LineUsEmulator().start()
+        self.my_line_us = lineus.LineUs()
+
+    def tearDown(self):
+        self.my_line_us.close()
+        self.emulator.stop()
+
+    def test_skip_redundant(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        sent = []
+        gcode = ['G01 X1000 Y0 Z1000', 'G01 X1200 Y0', 'G01 X1200 Y300', 'G01 Z0', 'G01 Z0', 'G01 X1300 Y300',
+                 'G01 Z1000', 'G01 X1000.5 Y0', 'G01 X900 Y10', 'G01 Z0']
+        result = self.my_line_us.stream_gcode(gcode, skip_redundant=True,
+                                              on_result=lambda command, reply: sent.append(command))
+        self.assertEqual(result, {'sent': 7, 'errors': 0, 'saved': 3})
+        self.assertEqual(sent[1], 'G01  X1200 Y300 Z1000')
+        self.assertEqual(sent[5], 'G01  X900 Y10 Z1000')
+        self.assertEqual(self.my_line_us.get_position(), (900, 10, 0))
+        path = numpy.array([(900, 10, 0), (900, 10, 1000), (1000, 0, 1000), (1100, 0, 1000), (1100, 0, 1000),
+                            (1100, 0, 0)])
+        result = self.my_line_us.g01_path(path, skip_redundant=True)
+        self.assertEqual(result, {'sent': 3, 'errors': 0, 'saved': 3})
+        self.assertEqual(self.my_line_us.get_position(), (1100, 0, 0))
+
+    def test_g01_path(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        path = numpy.array([(x, x - 1000) for x in range(1000, 1200)])
+        replies = []
+        result = self.my_line_us.g01_path(path, z=0, window=16, on_result=lambda gcode, reply: replies.append(gcode))
+        self.assertEqual(result, {'sent': 200, 'errors': 0})
+        self.assertEqual(replies[1], 'G01 X1001 Y1 Z0')
+        self.assertEqual(self.my_line_us.send_gcode('M114'), 'ok X:1199.00 Y:199.00 Z:0.00')
+
+    def test_g01_path_float(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        result = self.my_line_us.g01_path([(1000.5, 10.25, 1000)])
+        self.assertEqual(result, {'sent': 1, 'errors': 0})
+        self.assertEqual(self.my_line_us.send_gcode('M114'), 'ok X:1000.50 Y:10.25 Z:1000.00')
+
+    def test_g01_path_float_z(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        replies = []
+        path = numpy.array([(1000, 10)])
+        result = self.my_line_us.g01_path(path, z=0.5, on_result=lambda gcode, reply: replies.append(gcode))
+        self.assertEqual(result, {'sent': 1, 'errors': 0})
+        self.assertEqual(replies, ['G01 X1000.00 Y10.00 Z0.50'])
+
+    def test_stream_errors(self):
+        self.my_line_us.connect(self.emulator.get_line_us())
+        errors = []
+        result = self.my_line_us.stream_gcode(['G28', 'bad', 'M114'],
+                                              on_error=lambda gcode, reply: errors.append(gcode))
+        self.assertEqual(result, {'sent': 3, 'errors': 1})
+        self.assertEqual(errors, ['bad'])
+
+    def test_stream_source_error(self):
+        self.my_line_us.connect(self.emulator.get_line_us(), timeout=2)
+
+        def gcode():
+            yield 'G28'
+            yield 'M114'
+            raise ValueError('bad artwork')
+
+        with self.assertRaises(ValueError):
+            self.my_line_us.stream_gcode(gcode())
+        self.assertEqual(self.my_line_us.send_gcode('M114'), 'ok X:1000.00 Y:1000.00 Z:1000.00')
+
+    def test_stream_rejects_non_strings(self):
+        self.my_line_us.connect(self.emulator.get_line_us(), timeout=2)
+        with self.assertRaises(TypeError):
+            self.my_line_us.stream_gcode(['G28', None, 'M114'])
+        self.assertEqual(self.my_line_us.send_gcode('M114'), 'ok X:1000.00 Y:1000.00 Z:1000.00')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import io
+import numpy
+import lineus
+from lineus.emulator import LineUsEmulator
+from lineus.svg import SvgImporter
+from lineus.transform import Transform
+
+_square = b'''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100">
+  <defs><path d="M0,0 L100,100"/></defs>
+  <g transform="translate(10 10)"><path d="M0,0 h80 v80 H0 Z"/></g>
+  <circle cx="50" cy="50" r="20" display="none"/>
+</svg>'''
+
+
+class TestSvg(unittest.TestCase):
+
+    def test_fit_and_flip(self):
+        drawings = list(SvgImporter().drawings(io.BytesIO(_square)))
+        self.assertEqual(len(drawings), 1)
+        # 100 units fit the 1125 unit width of the workspace and y is flipped
+        numpy.testing.assert_allclose(drawings[0].stroke(0), [(762.5, 450), (1662.5, 450), (1662.5, -450),
+                                                              (762.5, -450), (762.5, 450)], atol=1e-3)
+
+    def test_path_commands(self):
+        importer = SvgImporter(tolerance=.01, fit=False)
+        strokes = importer._flatten_path('M10 10 l10 0 10 10 Z m0 10 V 30 c0 10 10 10 10 0 s10 -10 10 0 '
+                                         'q5 5 10 0 t10 0 A5 5 0 0 1 60 20', .01)
+        self.assertEqual(len(strokes), 2)
+        numpy.testing.assert_allclose(strokes[0], [(10, 10), (20, 10), (30, 20), (10, 10)])
+        numpy.testing.assert_allclose(strokes[1][[0, 1, -1]], [(10, 20), (10, 30), (60, 20)], atol=1e-9)
+        # The arc is a semicircle that bulges downwards from (50, 30) to (60, 20) less than its radius
+        self.assertLess(numpy.hypot(*(strokes[1][-10:] - (55, 25)).T).max(), 5 * 2 ** .5 + 1e-6)
+
+    def test_transform_attribute(self):
+        transform = SvgImporter._parse_transform('translate(100, 0) scale(2) rotate(90)')
+        numpy.testing.assert_allclose(transform.apply([(10, 0)]), [(100, 20)], atol=1e-9)
+
+    def test_streams(self):
+        shapes = b''.join(b'<line x1="%d" y1="0" x2="%d" y2="100"/>' % (i, i) for i in range(0, 5000))
+        source = io.BytesIO(b'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 5000 100">' + shapes + b'</svg>')
+        drawings = SvgImporter().drawings(source)
+        next(drawings)
+        self.assertLess(source.tell(), len(source.getvalue()))
+        self.assertEqual(sum(1 for _ in drawings), 4999)
+
+    def test_draw_and_save(self):
+        with LineUsEmulator() as emulator, lineus.LineUs() as my_line_us:
+            my_line_us.connect(emulator.get_line_us())
+            importer = SvgImporter(transform=Transform().scale(2), margin=100)
+            self.assertEqual(importer.draw(my_line_us, io.BytesIO(_square)), 0)
+            self.assertEqual(emulator.command_count, 7)
+            self.assertEqual(my_line_us.save_to_lineus(importer.gcode(io.BytesIO(_square)), 3), 'ok')
+            self.assertEqual(emulator.files[3].count('\n'), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import lineus
+from lineus.emulator import LineUsEmulator
+from lineus.sync import SyncCoordinator
+
+
+class TestSync(unittest.TestCase):
+
+    def setUp(self):
+        self.emulators = [LineUsEmulator(name=f'line-us-{i}', latency=latency, processing=.01).start()
+                          for i, latency in enumerate((.001, .015, .03))]
+        self.connections = []
+        for emulator in self.emulators:
+            self.connections.append(lineus.LineUs())
+            self.connections[-1].connect(emulator.get_line_us())
+
+    def tearDown(self):
+        for connection in self.connections:
+            connection.close()
+        for emulator in self.emulators:
+            emulator.stop()
+
+    def test_synchronised_sections(self):
+        coordinator = SyncCoordinator(self.connections, window=8)
+        latency = coordinator.measure_latency()
+        self.assertLess(latency[0]['one_way'], latency[2]['one_way'])
+        sections = [[f'G01 X{1000 + i} Y{number} Z0' for i in range(0, 20)] for number in range(0, 2)]
+        report = coordinator.run([sections + ['G28\nM114']] * 3)
+        self.assertEqual(report['errors'], [0, 0, 0])
+        self.assertEqual(len(report['checkpoints']), 3)
+        # The slowest connection is about 30ms further away than the fastest, so without the early release the
+        # first command of each section would reach the machines about that far apart
+        for first_command in ('G01 X1000 Y0 Z0', 'G01 X1000 Y1 Z0', 'G28'):
+            arrivals = [next(arrival for arrival, command in emulator.arrivals if command == first_command)
+                        for emulator in self.emulators]
+            self.assertLess((max(arrivals) - min(arrivals)) * 1000, 15)
+        for checkpoint in report['checkpoints']:
+            self.assertLess(checkpoint['finish_skew_ms'], 20)
+        self.assertEqual([connection.get_position() for connection in self.connections], [(1000, 1000, 1000)] * 3)
+
+    def test_no_machines(self):
+        self.assertEqual(SyncCoordinator([]).run([]), {'latency': [], 'errors': [], 'checkpoints': []})
+
+    def test_sections_must_match(self):
+        with self.assertRaises(ValueError):
+            SyncCoordinator(self.connections).run([['G28'], ['G28'], ['G28', 'G28']])
+
+
+if __name__ == '__main__':
+    unittest.main()
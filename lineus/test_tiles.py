@@ -0,0 +1,64 @@
+import unittest
+import numpy
+import lineus
+from lineus.drawing import Drawing
+from lineus.emulator import LineUsEmulator
+from lineus.tiles import TilePartitioner, draw_tiles
+from lineus.transform import WORKSPACE
+
+
+def _drawing():
+    """Dense short strokes on the left of the page and a few long ones on the right"""
+    generator = numpy.random.default_rng(1)
+    strokes = []
+    for x, y in generator.uniform((0, 0), (1000, 2000), (600, 2)):
+        strokes.append([(x, y), (x + 5, y + 5), (x + 10, y)])
+    for y in range(0, 2000, 200):
+        strokes.append([(1000, y), (4000, y)])
+    return Drawing.from_strokes(strokes, dtype=numpy.float32)
+
+
+class TestTiles(unittest.TestCase):
+
+    def test_balanced_by_time(self):
+        drawing = _drawing()
+        partitioner = TilePartitioner(4, margin=20)
+        tiles = partitioner.partition(drawing)
+        self.assertEqual(len(tiles), 4)
+        times = [tile['estimated_seconds'] for tile in tiles]
+        self.assertLess(max(times) / min(times), 1.2)
+        # The busy left side gets more tiles than an even split by area would give it
+        self.assertGreater(sum(1 for tile in tiles if tile['bounds'][2] <= 1000), 1)
+        for tile in tiles:
+            low = tile['drawing'].points.min(axis=0)
+            high = tile['drawing'].points.max(axis=0)
+            self.assertTrue(low[0] >= WORKSPACE[0] + 19.9 and high[0] <= WORKSPACE[2] - 19.9)
+            self.assertTrue(low[1] >= WORKSPACE[1] + 19.9 and high[1] <= WORKSPACE[3] - 19.9)
+        # Every tile uses the same scale
+        scales = [numpy.linalg.norm(tile['transform'].matrix[:2, 0]) for tile in tiles]
+        self.assertAlmostEqual(min(scales), max(scales))
+
+    def test_draw_tiles(self):
+        tiles = TilePartitioner(3).partition(_drawing())
+        emulators = [LineUsEmulator(name=f'line-us-{i}').start() for i in range(0, 3)]
+        connections = []
+        try:
+            for emulator in emulators:
+                connections.append(lineus.LineUs())
+                connections[-1].connect(emulator.get_line_us())
+            reports = []
+            errors = draw_tiles(tiles, connections, progress=lambda done, total: reports.append((done, total)))
+            self.assertEqual(errors, [0, 0, 0])
+            total = sum(len(tile['drawing']) for tile in tiles)
+            self.assertEqual(reports[-1], (total, total))
+            self.assertEqual([emulator.command_count for emulator in emulators],
+                             [tile['drawing'].point_count() + 2 * len(tile['drawing']) for tile in tiles])
+        finally:
+            for connection in connections:
+                connection.close()
+            for emulator in emulators:
+                emulator.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import numpy
+from lineus.drawing import Drawing
+from lineus.transform import Transform, WORKSPACE, clip_drawing, fit_to_workspace
+
+
+class TestTransform(unittest.TestCase):
+
+    def test_chain(self):
+        transform = Transform().scale(2).rotate(90).translate(1000, 0)
+        numpy.testing.assert_allclose(transform.apply([(10, 0), (0, 10)]), [(1000, 20), (980, 0)], atol=1e-9)
+
+    def test_fit(self):
+        drawing = Drawing.from_strokes([[(0, 0), (100, 50)]])
+        fitted = fit_to_workspace(drawing, Transform().flip_y())
+        min_x, min_y, max_x, max_y = fitted.bounds()
+        self.assertAlmostEqual(min_x, WORKSPACE[0], places=3)
+        self.assertAlmostEqual(max_x, WORKSPACE[2], places=3)
+        self.assertAlmostEqual((min_y + max_y) / 2, 0, places=3)
+        self.assertGreater(fitted.stroke(0)[0][1], fitted.stroke(0)[1][1])
+
+    def test_clip(self):
+        drawing = Drawing.from_strokes([[(1000, 0), (2000, 0), (2000, 500), (1000, 500)],
+                                        [(3000, 0)], [(1000, 900)]])
+        clipped = clip_drawing(drawing)
+        self.assertEqual(len(clipped), 3)
+        numpy.testing.assert_allclose(clipped.stroke(0), [(1000, 0), (1775, 0)])
+        numpy.testing.assert_allclose(clipped.stroke(1), [(1775, 500), (1000, 500)])
+        numpy.testing.assert_allclose(clipped.stroke(2), [(1000, 900)])
+        self.assertEqual(len(clip_drawing(drawing, mode='drop')), 1)
+        with self.assertRaises(ValueError):
+            clip_drawing(drawing, mode='error')
+        self.assertIs(clip_drawing(clipped), clipped)
+        with self.assertRaises(ValueError):
+            clip_drawing(clipped, mode='crop')
+
+
+if __name__ == '__main__':
+    unittest.main()
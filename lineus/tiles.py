@@ -0,0 +1,161 @@
+import concurrent.futures
+import math
+import threading
+import numpy
+from lineus.transform import Transform, WORKSPACE, clip_drawing
+
+
+class TilePartitioner:
+    """
+    Split a large ``Drawing`` into ``count`` tiles, one for each Line-us, so that each machine draws its own
+    region on its own paper. The drawing is cut in two again and again across its longer side, with each cut
+    placed so the estimated drawing time, rather than the area, is shared out evenly. Strokes are clipped at
+    the tile edges::
+
+        >>> partitioner = TilePartitioner(4, margin=50)
+        >>> tiles = partitioner.partition(drawing)
+        >>> [round(tile['estimated_seconds']) for tile in tiles]
+        [1210, 1195, 1202, 1208]
+        >>> draw_tiles(tiles, [line_us_1, line_us_2, line_us_3, line_us_4])
+
+    Each tile is a ``dict`` with the ``bounds`` of its region in the original drawing, its ``drawing`` in the
+    machine coordinates of ``workspace``, the ``transform`` between the two and its ``estimated_seconds``. Every
+    tile uses the same ``scale`` so the pieces join up, and by default it is the largest scale at which every
+    tile fits in ``workspace`` less ``margin``.
+
+    The time estimate allows ``command_time`` seconds for each command sent and moves at ``draw_speed`` Line-us
+    units per second with the pen down. Measure them on your own machines (see ``lineus.benchmark``) for the best
+    balance. Pen up travel between strokes is not counted, as it depends on the order the strokes are drawn in
+    (see ``lineus.optimise``) rather than on where the tile edges are.
+    """
+
+    _default_command_time = 0.01
+    _default_draw_speed = 1500
+    _cut_iterations = 24
+
+    def __init__(self, count, workspace=WORKSPACE, margin=0, scale=None, command_time=None, draw_speed=None):
+        if count < 1:
+            raise ValueError('count must be at least 1')
+        self.count = count
+        self.workspace = workspace
+        self.margin = margin
+        self.scale = scale
+        self.command_time = command_time if command_time is not None else self._default_command_time
+        self.draw_speed = draw_speed if draw_speed is not None else self._default_draw_speed
+
+    def partition(self, drawing):
+        """Returns a list of ``count`` tiles for ``drawing``, as described above"""
+        bounds = drawing.bounds()
+        if bounds is None:
+            bounds = (0.0, 0.0, 0.0, 0.0)
+        scale = self.scale
+        if scale is None:
+            # Tiles are about 1 / sqrt(count) of the drawing across, which is close enough to balance the cuts
+            scale = self._fit_scale(bounds) * math.sqrt(self.count)
+        regions = self._split(drawing, bounds, self.count, scale)
+        if self.scale is None:
+            # Cut again at the scale the tiles will really be drawn at
+            scale = min(self._fit_scale(region_bounds) for region_bounds, region in regions)
+            regions = self._split(drawing, bounds, self.count, scale)
+            scale = min(self._fit_scale(region_bounds) for region_bounds, region in regions)
+        target = self._target()
+        tiles = []
+        for region_bounds, region in regions:
+            centre = ((region_bounds[0] + region_bounds[2]) / 2, (region_bounds[1] + region_bounds[3]) / 2)
+            transform = Transform().translate(-centre[0], -centre[1]).scale(scale).translate(
+                (target[0] + target[2]) / 2, (target[1] + target[3]) / 2)
+            tile_drawing = transform.apply_drawing(region)
+            tiles.append({'bounds': region_bounds, 'drawing': tile_drawing, 'transform': transform,
+                          'estimated_seconds': self.estimate_time(tile_drawing)})
+        return tiles
+
+    def estimate_time(self, drawing, scale=1):
+        """The estimated time in seconds to draw ``drawing``, with its coordinates multiplied by ``scale``"""
+        return float(self._point_costs(drawing, scale).sum())
+
+    def _point_costs(self, drawing, scale):
+        """The estimated time to draw each point, including the line to it and the pen moves around strokes"""
+        points = numpy.asarray(drawing.points, dtype=numpy.float64) * scale
+        if len(points) == 0:
+            return numpy.zeros(0)
+        starts = numpy.asarray(drawing.offsets[:-1])
+        starts = starts[starts < len(points)]
+        distance = numpy.zeros(len(points))
+        distance[1:] = numpy.hypot(*numpy.diff(points, axis=0).T)
+        distance[starts] = 0
+        costs = self.command_time + distance / self.draw_speed
+        # Each stroke also has a pen down and a pen up
+        costs[starts] += 2 * self.command_time
+        return costs
+
+    def _split(self, drawing, bounds, count, scale):
+        """Recursively cut the drawing into count regions of about equal time, returning (bounds, drawing) pairs"""
+        if count == 1:
+            return [(bounds, drawing)]
+        first_count = count // 2
+        axis = 0 if bounds[2] - bounds[0] >= bounds[3] - bounds[1] else 1
+        low, high = bounds[axis], bounds[axis + 2]
+        # Find the cut where each side's time per tile is equal, timing the clipped halves so that strokes
+        # crossing the cut are counted on both sides
+        halves = None
+        for _ in range(0, self._cut_iterations):
+            cut = (low + high) / 2
+            halves = self._halves(drawing, bounds, axis, cut)
+            first_time = self.estimate_time(halves[1], scale) / first_count
+            second_time = self.estimate_time(halves[3], scale) / (count - first_count)
+            if first_time < second_time:
+                low = cut
+            else:
+                high = cut
+        first_bounds, first, second_bounds, second = halves
+        return (self._split(first, first_bounds, first_count, scale)
+                + self._split(second, second_bounds, count - first_count, scale))
+
+    @staticmethod
+    def _halves(drawing, bounds, axis, cut):
+        """The bounds and clipped drawings either side of a cut across axis"""
+        first_bounds = list(bounds)
+        first_bounds[axis + 2] = cut
+        second_bounds = list(bounds)
+        second_bounds[axis] = cut
+        first_bounds = tuple(first_bounds)
+        second_bounds = tuple(second_bounds)
+        return first_bounds, clip_drawing(drawing, first_bounds), second_bounds, clip_drawing(drawing, second_bounds)
+
+    def _target(self):
+        return (self.workspace[0] + self.margin, self.workspace[1] + self.margin,
+                self.workspace[2] - self.margin, self.workspace[3] - self.margin)
+
+    def _fit_scale(self, bounds):
+        """The largest scale at which bounds fits in the workspace less the margin"""
+        target = self._target()
+        scales = [(target[2] - target[0]) / (bounds[2] - bounds[0]) if bounds[2] > bounds[0] else math.inf,
+                  (target[3] - target[1]) / (bounds[3] - bounds[1]) if bounds[3] > bounds[1] else math.inf]
+        return min(scales) if min(scales) != math.inf else 1.0
+
+
+def draw_tiles(tiles, line_us_list, pen_up=1000, pen_down=0, window=None, progress=None):
+    """
+    Draw each tile on its own connected ``LineUs``, all at the same time. ``progress(strokes_drawn,
+    total_strokes)`` is called with the totals across every tile as each machine makes progress. Returns a list
+    of the number of error replies for each tile, and raises the first exception if any of the machines failed.
+    """
+    if len(line_us_list) < len(tiles):
+        raise ValueError(f'{len(tiles)} tiles need {len(tiles)} Line-us connections')
+    lock = threading.Lock()
+    drawn = [0] * len(tiles)
+    total = sum(len(tile['drawing']) for tile in tiles)
+
+    def tile_progress(index, strokes_drawn, tile_strokes):
+        with lock:
+            drawn[index] = strokes_drawn
+            done = sum(drawn)
+        if progress is not None:
+            progress(done, total)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(tiles))) as executor:
+        futures = [executor.submit(tile['drawing'].draw, line_us, pen_up, pen_down, window,
+                                   lambda done, strokes, index=index: tile_progress(index, done, strokes))
+                   for index, (tile, line_us) in enumerate(zip(tiles, line_us_list))]
+        concurrent.futures.wait(futures)
+    return [future.result() for future in futures]
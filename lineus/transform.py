@@ -0,0 +1,176 @@
+import math
+import numpy
+from lineus.drawing import Drawing
+
+# The approximate rectangle that Line-us can reach, as (min_x, min_y, max_x, max_y) in Line-us units
+WORKSPACE = (650, -1000, 1775, 1000)
+
+
+class Transform:
+    """
+    A 2D affine transform. Transforms are combined by multiplying their 3x3 matrices, so a chain of any length
+    costs a single matrix multiply per point when it is applied::
+
+        >>> transform = Transform().scale(2).rotate(90).translate(1000, 0)
+        >>> transform.apply([(10, 0), (0, 10)])
+        array([[1000.,   20.],
+               [ 980.,    0.]])
+
+    Each function returns a new ``Transform`` that applies the existing transform first and then the new one.
+    """
+
+    __slots__ = ('matrix', )
+
+    def __init__(self, matrix=None):
+        self.matrix = numpy.identity(3) if matrix is None else numpy.asarray(matrix, dtype=numpy.float64)
+
+    def then(self, other):
+        """Returns a transform that applies this transform and then ``other``"""
+        return Transform(other.matrix @ self.matrix)
+
+    def translate(self, dx, dy):
+        return self.then(Transform([[1, 0, dx], [0, 1, dy], [0, 0, 1]]))
+
+    def scale(self, sx, sy=None, origin=(0, 0)):
+        if sy is None:
+            sy = sx
+        return self.translate(-origin[0], -origin[1]).then(
+            Transform([[sx, 0, 0], [0, sy, 0], [0, 0, 1]])).translate(origin[0], origin[1])
+
+    def rotate(self, degrees, origin=(0, 0)):
+        """Rotate anticlockwise by ``degrees`` around ``origin``"""
+        c = math.cos(math.radians(degrees))
+        s = math.sin(math.radians(degrees))
+        return self.translate(-origin[0], -origin[1]).then(
+            Transform([[c, -s, 0], [s, c, 0], [0, 0, 1]])).translate(origin[0], origin[1])
+
+    def flip_y(self):
+        """Mirror in the x axis, for artwork where y increases downwards"""
+        return self.scale(1, -1)
+
+    def is_identity(self):
+        return numpy.array_equal(self.matrix, numpy.identity(3))
+
+    def apply(self, points):
+        """Returns the transformed ``(N, 2)`` points as a ``float64`` array"""
+        points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+        return points @ self.matrix[:2, :2].T + self.matrix[:2, 2]
+
+    def apply_drawing(self, drawing):
+        """Returns a new ``Drawing`` with every point transformed"""
+        return Drawing(self.apply(drawing.points).astype(numpy.float32), numpy.array(drawing.offsets))
+
+    @classmethod
+    def fit(cls, bounds, workspace=WORKSPACE, margin=0, keep_aspect=True):
+        """
+        Returns the transform that scales and centres ``bounds`` (``(min_x, min_y, max_x, max_y)``) to fill
+        ``workspace`` less ``margin`` on each side, keeping the aspect ratio unless ``keep_aspect`` is ``False``.
+        """
+        min_x, min_y, max_x, max_y = bounds
+        target = (workspace[0] + margin, workspace[1] + margin, workspace[2] - margin, workspace[3] - margin)
+        width = max_x - min_x
+        height = max_y - min_y
+        scale_x = (target[2] - target[0]) / width if width > 0 else math.inf
+        scale_y = (target[3] - target[1]) / height if height > 0 else math.inf
+        if keep_aspect:
+            scale_x = scale_y = min(scale_x, scale_y)
+        if math.isinf(scale_x):
+            scale_x = 1 if math.isinf(scale_y) else scale_y
+        if math.isinf(scale_y):
+            scale_y = scale_x
+        centre = ((min_x + max_x) / 2, (min_y + max_y) / 2)
+        target_centre = ((target[0] + target[2]) / 2, (target[1] + target[3]) / 2)
+        return cls().translate(-centre[0], -centre[1]).scale(scale_x, scale_y).translate(*target_centre)
+
+
+def fit_to_workspace(drawing, transform=None, workspace=WORKSPACE, margin=0, keep_aspect=True, clip='clip'):
+    """
+    Prepare a ``Drawing`` for Line-us. The optional ``transform`` is applied first, then the result is scaled
+    and centred to fill ``workspace`` (see ``Transform.fit()``), and finally anything outside the workspace is
+    handled by ``clip_drawing()``. Returns a new ``Drawing``::
+
+        >>> drawing = fit_to_workspace(drawing, Transform().flip_y(), margin=50)
+
+    """
+    if drawing.point_count() == 0:
+        return drawing
+    if transform is None or transform.is_identity():
+        # The bounds are known without touching the points, so fitting costs one pass
+        fit = Transform.fit(drawing.bounds(), workspace, margin, keep_aspect)
+        return clip_drawing(fit.apply_drawing(drawing), workspace, clip)
+    points = transform.apply(drawing.points)
+    bounds = (points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max())
+    points = Transform.fit(bounds, workspace, margin, keep_aspect).apply(points)
+    return clip_drawing(Drawing(points.astype(numpy.float32), numpy.array(drawing.offsets)), workspace, clip)
+
+
+def clip_drawing(drawing, workspace=WORKSPACE, mode='clip'):
+    """
+    Make sure a ``Drawing`` stays within ``workspace`` before anything is sent to Line-us. With ``mode``
+    ``'clip'`` each line segment is cut at the edge of the workspace (Liang-Barsky, vectorised over all
+    segments) and strokes are split where they leave and re-enter it. ``'drop'`` removes any stroke that goes
+    outside, and ``'error'`` raises ``ValueError``. Returns a new ``Drawing``.
+    """
+    if mode not in ('clip', 'drop', 'error'):
+        raise ValueError(f'Unknown clip mode {mode}')
+    min_x, min_y, max_x, max_y = workspace
+    points = numpy.asarray(drawing.points, dtype=numpy.float64)
+    offsets = numpy.asarray(drawing.offsets)
+    inside = ((points[:, 0] >= min_x) & (points[:, 0] <= max_x) & (points[:, 1] >= min_y) & (points[:, 1] <= max_y))
+    if inside.all():
+        return drawing
+    if mode == 'error':
+        raise ValueError(f'{int((~inside).sum())} points are outside the workspace {workspace}')
+    lengths = numpy.diff(offsets)
+    if mode == 'drop':
+        stroke = numpy.repeat(numpy.arange(len(lengths)), lengths)
+        stroke_inside = numpy.ones(len(lengths), dtype=bool)
+        stroke_inside[stroke[~inside]] = False
+        keep_points = stroke_inside[stroke]
+        new_lengths = lengths[stroke_inside]
+        new_offsets = numpy.zeros(len(new_lengths) + 1, dtype=numpy.int64)
+        numpy.cumsum(new_lengths, out=new_offsets[1:])
+        return Drawing(numpy.asarray(drawing.points)[keep_points], new_offsets)
+
+    # A segment runs from each point to the next one in the same stroke, and a single point stroke is a
+    # segment from the point to itself
+    is_last = numpy.zeros(len(points), dtype=bool)
+    is_last[offsets[1:][lengths > 0] - 1] = True
+    is_single = numpy.zeros(len(points), dtype=bool)
+    is_single[offsets[:-1][lengths == 1]] = True
+    start_index = numpy.flatnonzero(~is_last | is_single)
+    end_index = numpy.where(is_single[start_index], start_index, start_index + 1)
+    a = points[start_index]
+    d = points[end_index] - a
+    t0 = numpy.zeros(len(a))
+    t1 = numpy.ones(len(a))
+    rejected = numpy.zeros(len(a), dtype=bool)
+    for p, q in ((-d[:, 0], a[:, 0] - min_x), (d[:, 0], max_x - a[:, 0]),
+                 (-d[:, 1], a[:, 1] - min_y), (d[:, 1], max_y - a[:, 1])):
+        parallel = p == 0
+        rejected |= parallel & (q < 0)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            t = numpy.where(parallel, 0, q / numpy.where(parallel, 1, p))
+        t0 = numpy.where(~parallel & (p < 0), numpy.maximum(t0, t), t0)
+        t1 = numpy.where(~parallel & (p > 0), numpy.minimum(t1, t), t1)
+    kept = ~rejected & (t0 <= t1)
+    clipped_start = a + t0[:, None] * d
+    clipped_end = a + t1[:, None] * d
+
+    # A kept segment carries on the previous stroke if it starts where the previous kept segment ended unclipped
+    continues = numpy.zeros(len(a), dtype=bool)
+    continues[1:] = (kept[1:] & kept[:-1] & (start_index[1:] == end_index[:-1]) & (t0[1:] == 0) & (t1[:-1] == 1)
+                     & ~is_single[start_index[1:]])
+    kept_index = numpy.flatnonzero(kept)
+    new_stroke = ~continues[kept_index]
+    single = is_single[start_index[kept_index]]
+    emit_start = new_stroke
+    emit_end = ~single
+    counts = emit_start.astype(numpy.int64) + emit_end
+    new_points = numpy.empty((int(counts.sum()), 2))
+    position = numpy.cumsum(counts) - counts
+    new_points[position[emit_start]] = clipped_start[kept_index[emit_start]]
+    new_points[(position + emit_start)[emit_end]] = clipped_end[kept_index[emit_end]]
+    stroke_starts = position[new_stroke]
+    new_offsets = numpy.append(stroke_starts, len(new_points)).astype(numpy.int64)
+    return Drawing(new_points.astype(numpy.float32), new_offsets)
@@ -17,6 +17,9 @@ setup(
         'netifaces>=0.10.9',
         'ipaddress>=1.0.22',
     ],
+    extras_require={
+        'numpy': ['numpy>=1.17'],
+    },
     keywords='Line-us lineus drawing robot',
 
 )